@@ -0,0 +1,77 @@
+import json
+import os
+import subprocess
+import sys
+
+# Run in a fresh interpreter per backend: import time, peak memory and whether numpy got imported
+CHILD_CODE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import rls_assimilation
+import_time = time.perf_counter() - start
+import_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+is_numpy_imported = "numpy" in sys.modules
+
+start = time.perf_counter()
+assimilator = rls_assimilation.RLSAssimilation("hourly", "hourly", "obs", "model", "hourly", "obs")
+for i in range(N_STEPS):
+    assimilator.assimilate(float(i % 24), float(i % 24) + 1.5)
+step_time = (time.perf_counter() - start) / N_STEPS
+print(json.dumps({
+    "backend": rls_assimilation.BACKEND,
+    "import_time": import_time,
+    "import_rss": import_rss,
+    "run_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "is_numpy_imported": is_numpy_imported or "numpy" in sys.modules,
+    "step_time": step_time,
+}))
+"""
+N_STEPS = 10000
+N_REPEATS = 5
+# Upper bounds for the Python backend on a gateway device
+MAX_IMPORT_TIME = 0.1  # s
+MAX_IMPORT_RSS = 20 * 1024  # KiB
+
+
+def run_child(backend):
+    env = dict(os.environ, RLS_ASSIMILATION_BACKEND=backend)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH", "")]
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE.replace("N_STEPS", str(N_STEPS))],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def benchmark_backend(backend):
+    # The best of several runs, the first one also warms up the file cache
+    results = [run_child(backend) for _ in range(N_REPEATS)]
+    best = min(results, key=lambda result: result["import_time"])
+    print(
+        f"{backend}: import {best['import_time'] * 1000:.1f} ms, "
+        f"peak RSS after import {best['import_rss'] / 1024:.1f} MiB, "
+        f"after {N_STEPS} steps {best['run_rss'] / 1024:.1f} MiB, "
+        f"{best['step_time'] * 1e6:.1f} us per step, "
+        f"numpy imported: {best['is_numpy_imported']}"
+    )
+    return best
+
+
+if __name__ == "__main__":
+    benchmark_backend("numpy")
+    result = benchmark_backend("python")
+
+    errors = []
+    if result["is_numpy_imported"]:
+        errors.append("the Python backend imports numpy")
+    if result["import_time"] > MAX_IMPORT_TIME:
+        errors.append(f"import takes more than {MAX_IMPORT_TIME} s")
+    if result["import_rss"] > MAX_IMPORT_RSS:
+        errors.append(f"peak RSS after import exceeds {MAX_IMPORT_RSS / 1024} MiB")
+    if errors:
+        sys.exit("Startup cost regression: " + ", ".join(errors))
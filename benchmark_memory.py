@@ -0,0 +1,251 @@
+import argparse
+import gc
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+import types
+
+# DA4 scenario of example2.generate_tests(True, "model"): hourly stations, daily model, output in the model scale
+CONFIG = ("hourly", "daily", "obs", "model", "hourly", "model")
+CHECKPOINTS = [1000, 10000, 100000]  # steps
+TRIM_EVERY = 1000  # steps between trim_history calls in the "trimmed" mode
+N_BANK_STREAMS = 1000  # streams of the vectorised bank
+
+# Objects shared by all streams, not counted in their footprints
+SHARED_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+)
+
+# Upper bounds of the footprint in bytes per stream after the last checkpoint
+# (about twice the measured values, with tracemalloc for the trimmed histories)
+MAX_BYTES = {
+    ("RLSAssimilation", "trimmed"): 16 * 1024,
+    ("SequentialRLSAssimilationTwoSources", "trimmed"): 16 * 1024,
+    ("MultiSourceRLSAssimilation", "float64"): 1024,
+    ("MultiSourceRLSAssimilation", "float32"): 512,
+}
+# Upper bound of the growth of the full history, in bytes per stream and step
+MAX_BYTES_PER_STEP = 512
+
+
+def get_observations(i):
+    # Hourly station values with a missing value every 50 hours, and a model value constant over each day
+    obs1 = math.nan if i % 50 == 49 else 20.0 + (i * 7 % 24) + 0.1 * (i % 11)
+    obs2 = 25.0 + (i // 24 * 5 % 13)
+    return obs1, obs2
+
+
+def get_reachable_bytes(obj):
+    """
+    Size of the objects reachable from an object (sys.getsizeof of each object once), without the classes,
+    modules and functions shared by all streams
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return total
+
+
+class Footprint:
+    """
+    Memory of an assimilator: the size of its reachable objects, or with trace the memory allocated
+    since creation as traced by tracemalloc (all allocations, but several times slower)
+    """
+
+    def __init__(self, trace):
+        self.trace = trace
+        if trace:
+            tracemalloc.start()
+            self.start = tracemalloc.get_traced_memory()[0]
+
+    def get_bytes(self, assimilator):
+        if self.trace:
+            return tracemalloc.get_traced_memory()[0] - self.start
+        return get_reachable_bytes(assimilator)
+
+    def stop(self):
+        if self.trace:
+            tracemalloc.stop()
+
+
+def measure_stream(make_assimilator, checkpoints, trim, trace):
+    """
+    Footprint of one stream at startup and after each checkpoint number of steps,
+    with the history trimmed every TRIM_EVERY steps if trim
+
+    Returns bytes per stream (dict: "startup" and the checkpoints -> int)
+    """
+    footprint = Footprint(trace)
+    assimilator = make_assimilator()
+    result = {"startup": footprint.get_bytes(assimilator)}
+    for i in range(max(checkpoints)):
+        assimilator.assimilate(*get_observations(i))
+        if trim and (i + 1) % TRIM_EVERY == 0:
+            assimilator.trim_history()
+        if i + 1 in checkpoints:
+            result[i + 1] = footprint.get_bytes(assimilator)
+    footprint.stop()
+    return result
+
+
+def measure_bank(dtype, checkpoints, trace):
+    """
+    Footprint of a vectorised bank of N_BANK_STREAMS streams, in bytes per stream, at startup and after
+    the first checkpoint (a bank keeps no history, see BatchDataSource)
+    """
+    import numpy as np
+    from rls_assimilation import MultiSourceRLSAssimilation
+
+    t_in1, t_in2, s_in1, s_in2, t_out, s_out = CONFIG
+    rows = np.empty((N_BANK_STREAMS, 2))
+
+    footprint = Footprint(trace)
+    bank = MultiSourceRLSAssimilation(
+        [t_in1, t_in2], [s_in1, s_in2], t_out, s_out, (N_BANK_STREAMS,), dtype
+    )
+    result = {"startup": footprint.get_bytes(bank) // N_BANK_STREAMS}
+    for i in range(min(checkpoints)):
+        rows[:] = get_observations(i)
+        bank.assimilate(rows)
+    result[min(checkpoints)] = footprint.get_bytes(bank) // N_BANK_STREAMS
+    footprint.stop()
+    return result
+
+
+def measure_backend(checkpoints, trace):
+    """
+    Footprints of the classes and storage modes with the backend of this interpreter (run in a child process)
+
+    Returns (list of dict: class, mode, footprint)
+    """
+    import rls_assimilation
+    from rls_assimilation.SequentialRLSAssimilation import (
+        SequentialRLSAssimilationTwoSources,
+    )
+
+    results = []
+    for cls in [rls_assimilation.RLSAssimilation, SequentialRLSAssimilationTwoSources]:
+        for mode in ["full", "trimmed"]:
+            footprint = measure_stream(
+                lambda: cls(*CONFIG), checkpoints, mode == "trimmed", trace
+            )
+            results.append(dict(cls=cls.__name__, mode=mode, footprint=footprint))
+    if rls_assimilation.BACKEND == "numpy":
+        for dtype in ["float64", "float32"]:
+            footprint = measure_bank(dtype, checkpoints, trace)
+            results.append(
+                dict(cls="MultiSourceRLSAssimilation", mode=dtype, footprint=footprint)
+            )
+    return results
+
+
+def run_child(backend, checkpoints, trace):
+    env = dict(os.environ, RLS_ASSIMILATION_BACKEND=backend)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__)), env.get("PYTHONPATH", "")]
+    )
+    output = subprocess.run(
+        [
+            sys.executable,
+            __file__,
+            "--child",
+            "trace" if trace else "reachable",
+            *map(str, checkpoints),
+        ],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output)
+
+
+def check_footprints(results):
+    """
+    Errors of the footprints past the thresholds (list of str)
+    """
+    errors = []
+    for result in results["classes"]:
+        footprint = result["footprint"]
+        n_steps = max(int(key) for key in footprint if key != "startup")
+        last = footprint[str(n_steps)]
+        if result["mode"] == "full":
+            bytes_per_step = (last - footprint["startup"]) / n_steps
+            if bytes_per_step > MAX_BYTES_PER_STEP:
+                errors.append(
+                    f"{result['cls']} ({results['backend']}, full history) grows by "
+                    f"{bytes_per_step:.0f} bytes per step, more than {MAX_BYTES_PER_STEP}"
+                )
+        else:
+            max_bytes = MAX_BYTES[(result["cls"], result["mode"])]
+            if last > max_bytes:
+                errors.append(
+                    f"{result['cls']} ({results['backend']}, {result['mode']}) takes "
+                    f"{last} bytes per stream after {n_steps} steps, more than {max_bytes}"
+                )
+    return errors
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        import rls_assimilation
+
+        results = measure_backend(
+            [int(arg) for arg in sys.argv[3:]], sys.argv[2] == "trace"
+        )
+        print(
+            json.dumps(
+                {
+                    "backend": rls_assimilation.BACKEND,
+                    "classes": results,
+                    "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                }
+            )
+        )
+        sys.exit()
+
+    parser = argparse.ArgumentParser(
+        description="Memory footprint per stream of the assimilators, fails on regressions"
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        nargs="+",
+        default=CHECKPOINTS,
+        help="numbers of steps the footprint is measured after",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="measure the memory allocated with tracemalloc instead of the reachable objects (slower)",
+    )
+    args = parser.parse_args()
+
+    errors = []
+    for backend in ["numpy", "python"]:
+        results = run_child(backend, args.steps, args.trace)
+        print(f"{results['backend']} (peak RSS {results['peak_rss'] / 1024:.1f} MiB)")
+        for result in results["classes"]:
+            footprint = ", ".join(
+                f"{key} {value / 1024:.1f}"
+                for key, value in result["footprint"].items()
+            )
+            print(f"  {result['cls']} ({result['mode']}), KiB per stream: {footprint}")
+        errors.extend(check_footprints(results))
+
+    if errors:
+        sys.exit("Memory footprint regression: " + "; ".join(errors))
@@ -0,0 +1,74 @@
+import gc
+import sys
+import time
+
+import numpy as np
+
+from rls_assimilation import RLSAssimilation, StationRLSAssimilation
+from benchmark_step import SCENARIOS, generate_observations
+
+VARIABLES = ["CO", "NO2", "O3", "SO2", "PM25", "PM10"]
+N_STEPS = 2000
+N_REPEATS = 10
+# Smallest accepted ratio of the time of one RLSAssimilation object per variable to the time of the station bank
+# (1.8x-2.1x measured with the numpy backend)
+MIN_SPEEDUP = 1.5
+
+
+def generate_station_observations(n_steps):
+    # One series of benchmark_step.py per variable, with its own gaps and noise
+    series = [generate_observations(n_steps, seed) for seed in range(len(VARIABLES))]
+    obs = np.array(series).transpose(1, 2, 0)  # (n_steps, 2 sources, n_variables)
+    return [(obs1, obs2, obs1.tolist(), obs2.tolist()) for obs1, obs2 in obs]
+
+
+def time_bank(config, obs):
+    bank = StationRLSAssimilation(VARIABLES, *config)
+    out = np.empty(len(VARIABLES))
+    err_out = np.empty(len(VARIABLES))
+    gc.disable()
+    start = time.perf_counter()
+    for obs1, obs2, _, _ in obs:
+        bank.assimilate(obs1, obs2, out, err_out)
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    return elapsed / len(obs)
+
+
+def time_objects(config, obs):
+    assimilators = [RLSAssimilation(*config) for _ in VARIABLES]
+    gc.disable()
+    start = time.perf_counter()
+    for _, _, obs1, obs2 in obs:
+        for assimilator, x1, x2 in zip(assimilators, obs1, obs2):
+            assimilator.assimilate(x1, x2)
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    return elapsed / len(obs)
+
+
+if __name__ == "__main__":
+    obs = generate_station_observations(N_STEPS)
+    print(
+        f"{len(VARIABLES)} variables, {N_STEPS} steps, best of {N_REPEATS} (numpy backend)"
+    )
+    slower = []
+    for scenario, config in SCENARIOS.items():
+        # Runs of the objects and the bank are interleaved, the best of each is reported
+        objects_times = []
+        bank_times = []
+        for _ in range(N_REPEATS):
+            objects_times.append(time_objects(config, obs))
+            bank_times.append(time_bank(config, obs))
+        objects_time, bank_time = min(objects_times), min(bank_times)
+        print(
+            f"{scenario}: objects {objects_time * 1e6:.1f} us, "
+            f"bank {bank_time * 1e6:.1f} us per step ({objects_time / bank_time:.2f}x)"
+        )
+        if objects_time / bank_time < MIN_SPEEDUP:
+            slower.append(scenario)
+    if slower:
+        sys.exit(
+            f"The station bank is less than {MIN_SPEEDUP:.2f}x faster than one object per variable: "
+            f"{', '.join(slower)}"
+        )
@@ -0,0 +1,75 @@
+import gc
+import math
+import random
+import sys
+import time
+
+from rls_assimilation import BACKEND, RLSAssimilation
+from rls_assimilation.AssimilationStep import make_assimilation_step
+
+# Scenarios of example1.py (DA2, DA3) and example2.py (DA4)
+SCENARIOS = {
+    "DA2": ("hourly", "hourly", "obs", "obs", "hourly", "obs"),
+    "DA3 (Model -> Station)": ("hourly", "hourly", "obs", "model", "hourly", "obs"),
+    "DA3 (Station -> Model)": ("hourly", "hourly", "obs", "model", "hourly", "model"),
+    "DA4 (Model -> Station)": ("hourly", "daily", "obs", "model", "hourly", "obs"),
+    "DA4 (Station -> Model)": ("daily", "hourly", "obs", "model", "hourly", "model"),
+}
+N_STEPS = 2000
+N_REPEATS = 25
+# Smallest accepted ratio of the generic to the specialised time per step (1.4x-1.6x measured with the python backend,
+# 9x-14x with the numpy backend)
+MIN_SPEEDUP = 1.2
+
+
+def generate_observations(n_steps, seed=0):
+    # Hourly station values with a daily cycle and gaps, and a biased model whose daily values repeat for a day
+    rng = random.Random(seed)
+    obs = []
+    day_x = 20
+    for i in range(n_steps):
+        x = 20 + 10 * math.sin(2 * math.pi * i / 24) + rng.gauss(0, 2)
+        if i % 24 == 0:
+            day_x = 20 + rng.gauss(0, 1)
+        obs.append((x if rng.random() > 0.05 else math.nan, 1.3 * day_x + 4))
+    return obs
+
+
+def time_run(assimilate, obs):
+    gc.disable()
+    start = time.perf_counter()
+    for obs1, obs2 in obs:
+        assimilate(obs1, obs2)
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    return elapsed / len(obs)
+
+
+def benchmark_scenario(config, obs):
+    # Runs of the generic and the specialised steps are interleaved, the best of each is reported
+    generic_times = []
+    pipeline_times = []
+    for _ in range(N_REPEATS):
+        generic_times.append(time_run(RLSAssimilation(*config).assimilate, obs))
+        pipeline_times.append(time_run(make_assimilation_step(*config)[1], obs))
+    return min(generic_times), min(pipeline_times)
+
+
+if __name__ == "__main__":
+    obs = generate_observations(N_STEPS)
+    print(f"Backend: {BACKEND}, {N_STEPS} steps, best of {N_REPEATS}")
+    slower = []
+    for scenario, config in SCENARIOS.items():
+        generic_time, pipeline_time = benchmark_scenario(config, obs)
+        print(
+            f"{scenario}: generic {generic_time * 1e6:.2f} us, "
+            f"specialised {pipeline_time * 1e6:.2f} us per step "
+            f"({generic_time / pipeline_time:.2f}x)"
+        )
+        if generic_time / pipeline_time < MIN_SPEEDUP:
+            slower.append(scenario)
+    if slower:
+        sys.exit(
+            f"The specialised step is less than {MIN_SPEEDUP:.2f}x faster than the generic one: "
+            f"{', '.join(slower)}"
+        )
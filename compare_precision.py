@@ -0,0 +1,96 @@
+import os
+import numpy as np
+
+from rls_assimilation import MultiSourceRLSAssimilation
+from helpers import read_data
+
+
+def get_state_nbytes(assimilator):
+    # Memory of all state arrays of the bank
+    sources = assimilator.sources
+    models = [
+        sources.ar_model,
+        sources.spatial_r_model,
+        sources.temporal_model.r_model,
+    ]
+    arrays = [
+        sources.x_past,
+        sources.temporal_model.current_average,
+        sources.temporal_model.current_average_err,
+        sources.temporal_model.latest_daily_average,
+        sources.temporal_model.latest_daily_average_err,
+    ]
+    for model in models:
+        arrays += [model.P, model.w, model.error]
+    return sum(array.nbytes for array in arrays)
+
+
+def load_stations(variable):
+    """
+    Observations and model values of all stations of a variable as one bank
+
+    Stations are independent lanes, so their series are aligned by position and padded with NaN.
+    Returns obs (numpy array, shape (n_steps, n_stations, 2))
+    """
+    data_path_dir = f"data/Europe_AQ/combined_{variable}"
+    station_series = []
+    for filename in sorted(os.listdir(data_path_dir)):
+        df = read_data(f"{data_path_dir}/{filename}")
+        station_series.append(df[[variable, f"{variable}_model"]].values)
+
+    n_steps = max(len(series) for series in station_series)
+    obs = np.full((n_steps, len(station_series), 2), np.nan)
+    for i, series in enumerate(station_series):
+        obs[: len(series), i] = series
+    return obs
+
+
+def run_bank(obs, t_in1, t_in2, s_in1, s_in2, t_out, s_out, dtype):
+    assimilator = MultiSourceRLSAssimilation(
+        [t_in1, t_in2],
+        [s_in1, s_in2],
+        t_out,
+        s_out,
+        shape=obs.shape[1:-1],
+        dtype=dtype,
+    )
+    assimilated = np.empty(obs.shape[:-1], dtype=dtype)
+    err_assimilated = np.empty(obs.shape[:-1], dtype=dtype)
+    for i, row in enumerate(obs):
+        assimilated[i], err_assimilated[i] = assimilator.assimilate(row)
+    return assimilated, err_assimilated, get_state_nbytes(assimilator)
+
+
+def compare_variable(variable, t_in1, t_in2, s_in1, s_in2, t_out, s_out):
+    obs = load_stations(variable)
+    is_valid = ~np.isnan(obs).any(axis=-1)
+    reference = obs[..., 0 if s_out == s_in1 else 1]
+
+    results = {}
+    for dtype in [np.float64, np.float32]:
+        results[dtype] = run_bank(obs, t_in1, t_in2, s_in1, s_in2, t_out, s_out, dtype)
+    assimilated64, err64, nbytes64 = results[np.float64]
+    assimilated32, err32, nbytes32 = results[np.float32]
+
+    abs_diff = np.abs(assimilated32 - assimilated64)[is_valid]
+    rel_diff = abs_diff / np.maximum(np.abs(assimilated64[is_valid]), 1e-12)
+    # Uncertainties close to zero are compared relative to their mean level
+    err_diff = np.abs(err32 - err64)[is_valid] / np.mean(err64[is_valid])
+    rmse64 = np.sqrt(np.mean((assimilated64 - reference)[is_valid] ** 2))
+    rmse32 = np.sqrt(np.mean((assimilated32 - reference)[is_valid] ** 2))
+
+    print(
+        f"{variable}: {obs.shape[1]} stations, "
+        f"max abs diff {abs_diff.max():.1e}, "
+        f"rel diff median {np.median(rel_diff):.1e} / p99 {np.quantile(rel_diff, 0.99):.1e}, "
+        f"uncertainty diff p99 {np.quantile(err_diff, 0.99):.1e} of mean uncertainty, "
+        f"RMSE float64 {rmse64:.4f} / float32 {rmse32:.4f}, "
+        f"state {nbytes64} / {nbytes32} bytes"
+    )
+
+
+# Accuracy of the float32 mode against float64 on the Europe_AQ datasets
+# (hourly station observations and the SILAM model, the output in the scale of the observations)
+if __name__ == "__main__":
+    for variable in ["CO", "NO2", "O3", "SO2", "PM25", "PM10"]:
+        compare_variable(variable, "hourly", "hourly", "obs", "model", "hourly", "obs")
@@ -0,0 +1,94 @@
+import argparse
+import os
+import numpy as np
+
+from rls_assimilation import MultiSourceRLSAssimilation
+from rls_assimilation.GriddedCorrection import GriddedCorrection
+from compare_precision import load_stations
+
+
+def get_station_coordinates(variable):
+    """
+    Latitudes and longitudes of the stations of a variable, from the names of their files ("lat;lon.csv"),
+    in the order of compare_precision.load_stations
+
+    Returns (lats (numpy array), lons (numpy array))
+    """
+    data_path_dir = f"data/Europe_AQ/combined_{variable}"
+    coordinates = [
+        [float(value) for value in filename[: -len(".csv")].split(";")]
+        for filename in sorted(os.listdir(data_path_dir))
+    ]
+    lats, lons = np.array(coordinates).T
+    return lats, lons
+
+
+def learn_station_maps(variable):
+    """
+    Run the assimilation of all stations of a variable (hourly observations and the SILAM model,
+    output in the scale of the observations) and return the learned model-to-station maps
+
+    Returns (w - weights of the R(1) models (numpy array, shape (n_stations, 2)),
+    error - their latest errors (numpy array, shape (n_stations,)))
+    """
+    obs = load_stations(variable)
+    assimilator = MultiSourceRLSAssimilation(
+        ["hourly", "hourly"], ["obs", "model"], "hourly", "obs", shape=obs.shape[1:-1]
+    )
+    for row in obs:
+        assimilator.assimilate(row)
+    spatial_r_model = assimilator.sources.spatial_r_model
+    return spatial_r_model.w[:, 1], spatial_r_model.error[:, 1]
+
+
+def correct_field(field, corrector, w, error):
+    """
+    Correct a SILAM field timestep by timestep
+
+    :param field: model values (xarray DataArray with dimensions time, lat, lon)
+    :param corrector: the correction for the grid of the field (GriddedCorrection)
+    :param w: weights of the station maps (numpy array, shape (n_stations, 2))
+    :param error: errors of the station maps (numpy array, shape (n_stations,))
+    Returns (corrected - corrected values (xarray DataArray), err - their uncertainties (xarray DataArray))
+    """
+    corrected = np.empty(field.shape)
+    err = np.empty(field.shape)
+    for i in range(field.sizes["time"]):
+        corrected[i], err[i] = corrector.correct(field.isel(time=i).values, w, error)
+    return field.copy(data=corrected), field.copy(data=err)
+
+
+# Corrected maps of a SILAM forecast, with the maps between the model and the stations learned
+# on the Europe_AQ datasets (needs the packages of download/requirements.txt)
+if __name__ == "__main__":
+    from download.download import get_forecast_from_silam_zarr
+
+    parser = argparse.ArgumentParser(
+        description="Correct a SILAM forecast with the calibration models of the stations"
+    )
+    parser.add_argument("variable")
+    parser.add_argument("date", help="date of the forecast, YYYYMMDD")
+    parser.add_argument("output_path", help="zarr directory of the corrected fields")
+    parser.add_argument("--day", type=int, default=0)
+    parser.add_argument("--method", default="idw")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--max-distance", type=float, default=None)
+    args = parser.parse_args()
+
+    ds = get_forecast_from_silam_zarr(args.date, args.variable, args.day)
+    field = ds[args.variable]
+    lats, lons = get_station_coordinates(args.variable)
+    corrector = GriddedCorrection(
+        lats,
+        lons,
+        field.lat.values,
+        field.lon.values,
+        method=args.method,
+        k=args.k,
+        max_distance=args.max_distance,
+    )
+    w, error = learn_station_maps(args.variable)
+    corrected, err = correct_field(field, corrector, w, error)
+    corrected.to_dataset(name=args.variable).assign(
+        {f"{args.variable}_err": err}
+    ).to_zarr(args.output_path, mode="w")
@@ -0,0 +1,577 @@
+"""
+Per-station experiments of the Europe AQ datasets (see example2.py) without plotting, shared by example2.py,
+run_chunked.py and the batch runner (python -m rls_assimilation)
+
+Kept out of the package: it needs pandas, and importing it neither imports matplotlib nor changes the numpy error
+settings (unlike example2.py).
+"""
+
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+from rls_assimilation.Metrics import RunningRMSE
+from rls_assimilation.RLSAssimilation import RLSAssimilation
+from rls_assimilation.SequentialRLSAssimilation import (
+    SequentialRLSAssimilationOneSource,
+    SequentialRLSAssimilationTwoSources,
+)
+
+
+def read_data(data_path):
+    all_data_df = pd.read_csv(data_path, index_col=0)
+    all_data_df.index = pd.to_datetime(
+        list(all_data_df.index), format="%Y-%m-%d %H:%M:%S"
+    )
+    all_data_df = all_data_df.sort_index()
+    return all_data_df
+
+
+def prepare_daily_data(variable, data_path):
+    all_data_df = read_data(data_path)
+    daily_means1 = all_data_df[f"{variable}"].resample("D").mean()
+    daily_means1.index = daily_means1.index + timedelta(days=1)
+    observations_source1_daily_and_hourly = pd.concat(
+        [all_data_df[f"{variable}"][23:], daily_means1], axis=1
+    ).ffill()
+    observations_source1_daily_and_hourly.columns = [
+        f"{variable}_obs_hourly",
+        f"{variable}_obs_daily",
+    ]
+
+    daily_means2 = all_data_df[f"{variable}_model"].resample("D").mean()
+    daily_means2.index = daily_means2.index + timedelta(days=1)
+    observations_source2_daily_and_hourly = pd.concat(
+        [all_data_df[f"{variable}_model"][23:], daily_means2], axis=1
+    ).ffill()
+    observations_source2_daily_and_hourly.columns = [
+        f"{variable}_model_hourly",
+        f"{variable}_model_daily",
+    ]
+
+    concatenated_sources_daily_and_hourly = pd.concat(
+        [observations_source1_daily_and_hourly, observations_source2_daily_and_hourly],
+        axis=1,
+    )
+
+    return concatenated_sources_daily_and_hourly
+
+
+def read_data_chunks(data_path, chunksize):
+    """
+    The same as read_data, in blocks of chunksize rows, so that only one block is in memory at a time
+
+    The file is not sorted out of core: its rows must already be in time order.
+
+    :param data_path: path to the CSV file (str)
+    :param chunksize: number of rows per block (int)
+    :return: blocks of the data (iterator of pandas DataFrame)
+    """
+    last_time = None
+    for chunk in pd.read_csv(data_path, index_col=0, chunksize=chunksize):
+        chunk.index = pd.to_datetime(list(chunk.index), format="%Y-%m-%d %H:%M:%S")
+        if not chunk.index.is_monotonic_increasing or (
+            last_time is not None and chunk.index[0] < last_time
+        ):
+            raise ValueError(f"Rows of {data_path} are not sorted by time")
+        last_time = chunk.index[-1]
+        yield chunk
+
+
+def prepare_daily_data_chunks(variable, chunks):
+    """
+    The same as prepare_daily_data, for blocks of the data (e.g. from read_data_chunks)
+
+    Blocks are prepared by whole days: the rows of the latest day of a block are held back until the next day
+    starts. The number of skipped first rows, the daily mean dated after the block and the latest values
+    (for forward filling) are carried over to the next block.
+
+    :param variable: variable name (str)
+    :param chunks: blocks of the data in time order (iterable of pandas DataFrame)
+    :return: blocks of the hourly and daily data (iterator of pandas DataFrame)
+    """
+    sources = [(f"{variable}", "obs"), (f"{variable}_model", "model")]
+    columns = [column for column, _ in sources]
+    n_skipped_rows = 0
+    next_day = None  # the first day without a daily mean
+    next_daily_means = None  # the daily means dated after the latest block
+    last_row = None
+
+    def prepare_days(days_df):
+        nonlocal n_skipped_rows, next_day, next_daily_means, last_row
+
+        daily_means = days_df.resample("D").mean()
+        if next_day is not None:
+            # Days without data between the blocks
+            daily_means = daily_means.reindex(
+                pd.date_range(next_day, daily_means.index[-1], freq="D")
+            )
+        next_day = daily_means.index[-1] + timedelta(days=1)
+        daily_means.index = daily_means.index + timedelta(days=1)
+        if next_daily_means is not None:
+            daily_means = pd.concat([next_daily_means, daily_means])
+        next_daily_means = daily_means.iloc[-1:]
+
+        n_skipped = min(23 - n_skipped_rows, len(days_df))
+        n_skipped_rows += n_skipped
+        return prepare_rows(days_df.iloc[n_skipped:], daily_means.iloc[:-1])
+
+    def prepare_rows(hourly_df, daily_means):
+        nonlocal last_row
+
+        observations_sources = []
+        for column, source in sources:
+            observations_source = pd.concat(
+                [hourly_df[column], daily_means[column]], axis=1
+            )
+            observations_source.columns = [
+                f"{variable}_{source}_hourly",
+                f"{variable}_{source}_daily",
+            ]
+            observations_sources.append(observations_source)
+        block = pd.concat(observations_sources, axis=1)
+        if last_row is not None:
+            block = pd.concat([last_row, block]).ffill().iloc[1:]
+        else:
+            block = block.ffill()
+        if len(block):
+            last_row = block.iloc[-1:]
+        return block
+
+    held_back = None
+    for chunk in chunks:
+        days_df = chunk[columns]
+        if held_back is not None:
+            days_df = pd.concat([held_back, days_df])
+        # The latest day may continue in the next chunk
+        latest_day = days_df.index[-1].normalize()
+        held_back = days_df[days_df.index >= latest_day]
+        days_df = days_df[days_df.index < latest_day]
+        if len(days_df):
+            block = prepare_days(days_df)
+            if len(block):
+                yield block
+
+    if held_back is not None:
+        block = prepare_days(held_back)
+        # The mean of the latest day
+        yield pd.concat([block, prepare_rows(held_back.iloc[:0], next_daily_means)])
+
+
+def print_stats_from_accumulator(stats, title):
+    """
+    The same as helpers.print_stats_from_array, but for streaming statistics (rls_assimilation.Metrics.RunningStats)
+    """
+    arr_mean = round(stats.mean, 3)
+    arr_sd = round(stats.std, 3)
+    arr_min = round(stats.min, 3)
+    arr_max = round(stats.max, 3)
+    print(f"{title}: {arr_mean} ± {arr_sd} [{arr_min};{arr_max}]")
+
+
+def _get_columns(variable, t_in1, t_in2, s_in1, s_in2, t_out, s_out):
+    # Columns of the sources, of the source of the one-source sequential DA (None for multi-temporal DA)
+    # and of the reference
+    if t_in1 == t_out and t_in2 == t_out:
+        source1_col = f"{variable}"
+        source2_col = f"{variable}_model"
+        seq_source_col = source1_col if s_out == s_in1 else source2_col
+        return source1_col, source2_col, seq_source_col, seq_source_col
+
+    source1_col = f"{variable}_{s_in1}_{t_in1}"
+    source2_col = f"{variable}_{s_in2}_{t_in2}"
+    return source1_col, source2_col, None, f"{variable}_{s_out}_hourly"
+
+
+def _get_ratios(metrics, seq_metrics, rmse_da, rmse_seq, rmse_daily=None):
+    """
+    Ratios of the experiments from the metrics of DA and sequential DA and the RMSEs from the reference
+
+    :param rmse_daily: RMSE of the daily values from the hourly reference (RunningRMSE, None for DA of a single
+    temporal scale)
+    Returns (RMSE ratio - sequential/non-sequential, or non-sequential/daily for multi-temporal DA,
+    RMSE ratio sequential/daily - None for DA of a single temporal scale, MAU ratio sequential/non-sequential)
+    """
+    # Uncertainties
+    mean_unc_da = metrics.err_assimilated.mean
+    mean_unc_seq = seq_metrics.err_assimilated.mean
+
+    # Get a ratio of mean uncertainties for DA and sequential DA
+    try:
+        err_seq_da_ratio = mean_unc_seq / mean_unc_da
+    except (ZeroDivisionError, FloatingPointError):
+        err_seq_da_ratio = 1
+
+    # RMSE between values
+    if rmse_daily is None:
+        try:
+            seq_da_ratio = np.round(rmse_seq.rmse, 2) / np.round(rmse_da.rmse, 2)
+        except (ZeroDivisionError, FloatingPointError):
+            seq_da_ratio = 1
+
+        return seq_da_ratio, None, err_seq_da_ratio
+
+    # Compare errors of assimilated from actual hourly reference
+    rmse_da_h = np.round(rmse_da.rmse, 2)
+    rmse_seq_h = np.round(rmse_seq.rmse, 2)
+    rmse_dh = np.round(rmse_daily.rmse, 2)
+
+    try:
+        da_dh_ratio = rmse_da_h / rmse_dh
+    except (ZeroDivisionError, FloatingPointError):
+        da_dh_ratio = 1
+
+    try:
+        seq_dh_ratio = rmse_seq_h / rmse_dh
+    except (ZeroDivisionError, FloatingPointError):
+        seq_dh_ratio = 1
+
+    return da_dh_ratio, seq_dh_ratio, err_seq_da_ratio
+
+
+def run_assimilation(
+    df,
+    variable,
+    t_in1,
+    t_in2,
+    s_in1,
+    s_in2,
+    t_out,
+    s_out,
+    keep_series=True,
+    output_path=None,
+):
+    """
+    Run DA and sequential DA on the data of a station
+
+    The data can also be given in blocks (e.g. from read_data_chunks or prepare_daily_data_chunks),
+    the state of the assimilators is carried over from block to block. The series are not kept then: the values
+    stored for plotting are dropped after each block, and the results can be written to output_path instead,
+    so that memory is bounded by the block size rather than the file size.
+
+    :param df: data (pandas DataFrame, or iterable of its blocks)
+    :param keep_series: return the series for plotting (bool, only for a DataFrame)
+    :param output_path: CSV file the results are written to, block by block (str or None)
+    """
+    is_blocks = not isinstance(df, pd.DataFrame)
+    if is_blocks and keep_series:
+        raise ValueError("Series cannot be kept for data in blocks")
+
+    is_multi_t = t_in1 != t_out or t_in2 != t_out  # multi-temporal data assimilation
+    is_one_seq_source = not is_multi_t
+
+    assimilator = RLSAssimilation(
+        t_in1=t_in1,
+        t_in2=t_in2,
+        s_in1=s_in1,
+        s_in2=s_in2,
+        t_out=t_out,
+        s_out=s_out,
+    )
+    if is_one_seq_source:
+        seq_assimilator = SequentialRLSAssimilationOneSource()
+    else:
+        seq_assimilator = SequentialRLSAssimilationTwoSources(
+            t_in1=t_in1,
+            t_in2=t_in2,
+            s_in1=s_in1,
+            s_in2=s_in2,
+            t_out=t_out,
+            s_out=s_out,
+        )
+
+    source1_col, source2_col, seq_source_col, reference_col = _get_columns(
+        variable, t_in1, t_in2, s_in1, s_in2, t_out, s_out
+    )
+
+    # per-step series are only kept for plotting or written to output_path
+    assimilated = []
+    err_assimilated = []
+    seq_assimilated = []
+    seq_err_assimilated = []
+
+    # RMSE from the reference, computed on the rows without missing values
+    rmse_da = RunningRMSE()
+    rmse_seq = RunningRMSE()
+    rmse_daily = RunningRMSE()
+
+    for block_idx, block in enumerate(df if is_blocks else [df]):
+        has_missing_values = block.isna().any(axis=1).values
+
+        for k in range(len(block)):
+            # Step 1: Obtain raw observations from 2 sources
+            latest_observation_source1 = block[source1_col].values[k]
+            latest_observation_source2 = block[source2_col].values[k]
+
+            # Step 2: Assimilate
+            analysis, err_analysis = assimilator.assimilate(
+                latest_observation_source1,
+                latest_observation_source2,
+            )
+
+            if is_one_seq_source:
+                latest_observation_source = block[seq_source_col].values[k]
+                seq_analysis, seq_err_analysis = seq_assimilator.assimilate(
+                    latest_observation_source
+                )
+            else:
+                seq_analysis, seq_err_analysis = seq_assimilator.assimilate(
+                    latest_observation_source1,
+                    latest_observation_source2,
+                )
+
+            if keep_series or output_path:
+                assimilated.append(analysis)
+                err_assimilated.append(err_analysis)
+                seq_assimilated.append(seq_analysis)
+                seq_err_assimilated.append(seq_err_analysis)
+
+            if not has_missing_values[k]:
+                reference = block[reference_col].values[k]
+                rmse_da.update(analysis, reference)
+                rmse_seq.update(seq_analysis, reference)
+                if is_multi_t:
+                    rmse_daily.update(
+                        block[f"{variable}_{s_out}_daily"].values[k], reference
+                    )
+
+        if output_path:
+            pd.DataFrame(
+                {
+                    "Assimilated": assimilated[-len(block) :],
+                    "Err_Assimilated": err_assimilated[-len(block) :],
+                    "Seq_Assimilated": seq_assimilated[-len(block) :],
+                    "Seq_Err_Assimilated": seq_err_assimilated[-len(block) :],
+                },
+                index=block.index,
+            ).to_csv(
+                output_path, mode="w" if block_idx == 0 else "a", header=block_idx == 0
+            )
+
+        if is_blocks:
+            assimilated.clear()
+            err_assimilated.clear()
+            seq_assimilated.clear()
+            seq_err_assimilated.clear()
+            assimilator.trim_history()
+            seq_assimilator.trim_history()
+
+    if keep_series:
+        df["Assimilated"] = assimilated
+        df["Seq_Assimilated"] = seq_assimilated
+        df["Err_Assimilated"] = err_assimilated
+        df["Seq_Err_Assimilated"] = seq_err_assimilated
+        df = df.dropna()
+    else:
+        df = None
+        err_assimilated = None
+        seq_err_assimilated = None
+
+    # Step 3: Get metrics
+    ratios = _get_ratios(
+        assimilator.metrics,
+        seq_assimilator.metrics,
+        rmse_da,
+        rmse_seq,
+        rmse_daily if is_multi_t else None,
+    )
+    return (*ratios, df, err_assimilated, seq_err_assimilated)
+
+
+def run_assimilation_sweep(df, variable, configs, keep_series=True):
+    """
+    Run DA and sequential DA of several scale configurations on the data of a station in one pass
+    (rls_assimilation.RLSAssimilationSweep, which estimates the AR(1) uncertainty once per source series),
+    with the same results as run_assimilation for each configuration (the MAU ratio up to rounding: the metrics
+    of the sweep are accumulated in batches)
+
+    :param df: data (pandas DataFrame, see run_assimilation)
+    :param configs: configurations (list of tuples (t_in1, t_in2, s_in1, s_in2, t_out, s_out)), which read the same
+    column for the same source and temporal scale, e.g. all of a single temporal scale or all multi-temporal
+    :param keep_series: return the series for plotting (bool)
+    Returns a list with the results of run_assimilation for every configuration
+    """
+    from rls_assimilation.RLSAssimilationSweep import RLSAssimilationSweep
+
+    # Series of the sources by temporal scale
+    obs1 = {}
+    obs2 = {}
+    for config in configs:
+        t_in1, t_in2 = config[:2]
+        source1_col, source2_col, _, _ = _get_columns(variable, *config)
+        for obs, t_in, column in [
+            (obs1, t_in1, source1_col),
+            (obs2, t_in2, source2_col),
+        ]:
+            if obs.setdefault(t_in, column) != column:
+                raise ValueError(
+                    f"Configurations read the columns {obs[t_in]} and {column} for the same source"
+                )
+    obs1 = {t_in: df[column].values for t_in, column in obs1.items()}
+    obs2 = {t_in: df[column].values for t_in, column in obs2.items()}
+
+    # RMSE from the reference, computed on the rows without missing values
+    has_missing_values = df.isna().any(axis=1).values
+
+    results = []
+    sweep = RLSAssimilationSweep(configs, sequential=True)
+    for config, (
+        assimilated,
+        err_assimilated,
+        assimilator,
+        seq_assimilated,
+        seq_err_assimilated,
+        seq_assimilator,
+    ) in zip(sweep.configs, sweep.run(obs1, obs2)):
+        _, _, _, _, t_out, s_out = config
+        is_multi_t = config[0] != t_out or config[1] != t_out
+        _, _, _, reference_col = _get_columns(variable, *config)
+        reference = df[reference_col].values[~has_missing_values]
+        rmse_da = RunningRMSE()
+        rmse_da.update_many(assimilated[~has_missing_values], reference)
+        rmse_seq = RunningRMSE()
+        rmse_seq.update_many(seq_assimilated[~has_missing_values], reference)
+        rmse_daily = None
+        if is_multi_t:
+            rmse_daily = RunningRMSE()
+            rmse_daily.update_many(
+                df[f"{variable}_{s_out}_daily"].values[~has_missing_values], reference
+            )
+
+        ratios = _get_ratios(
+            assimilator.metrics, seq_assimilator.metrics, rmse_da, rmse_seq, rmse_daily
+        )
+        if keep_series:
+            results.append(
+                (
+                    *ratios,
+                    df.assign(
+                        Assimilated=assimilated,
+                        Seq_Assimilated=seq_assimilated,
+                        Err_Assimilated=err_assimilated,
+                        Seq_Err_Assimilated=seq_err_assimilated,
+                    ).dropna(),
+                    list(err_assimilated),
+                    list(seq_err_assimilated),
+                )
+            )
+        else:
+            results.append((*ratios, None, None, None))
+
+    return results
+
+
+def run_station_Europe_AQ(
+    data_path, variable, t_in1, t_in2, s_in1, s_in2, t_out, s_out, store=None
+):
+    """
+    Run the assimilation for one station file, returns the ratios (dict, see run_station_sweep_Europe_AQ,
+    which runs it as a sweep of one configuration)
+    """
+    return run_station_sweep_Europe_AQ(
+        data_path, variable, [(t_in1, t_in2, s_in1, s_in2, t_out, s_out)], store
+    )[0]
+
+
+def run_station_sweep_Europe_AQ(data_path, variable, configs, store=None):
+    """
+    Run the assimilation for one station file with several scale configurations in one pass
+    (see run_assimilation_sweep), returns the ratios of every configuration (list of dict)
+
+    With a results store, completed configurations are skipped and new results are saved.
+    Floating point errors of numpy raise, as in the experiments (e.g. ratios of zero RMSEs are 1).
+
+    :param configs: configurations (list of tuples (t_in1, t_in2, s_in1, s_in2, t_out, s_out)), all of a single
+    temporal scale or all multi-temporal
+    """
+    configs = [tuple(config) for config in configs]
+    is_multi_t = {
+        config[0] != config[4] or config[1] != config[4] for config in configs
+    }
+    if len(is_multi_t) > 1:
+        raise ValueError(
+            "Configurations of a single temporal scale and multi-temporal ones use different data"
+        )
+
+    station_ratios = []
+    entries = []
+    for t_in1, t_in2, s_in1, s_in2, t_out, s_out in configs:
+        entry_name = f"{data_path}:{t_in1},{t_in2},{s_in1},{s_in2},{t_out},{s_out}"
+        key = None
+        ratios = None
+        if store is not None:
+            config = dict(
+                variable=variable,
+                t_in1=t_in1,
+                t_in2=t_in2,
+                s_in1=s_in1,
+                s_in2=s_in2,
+                t_out=t_out,
+                s_out=s_out,
+            )
+            key = store.get_key(data_path, config)
+            ratios = store.get_scalars(entry_name, key)
+        entries.append((entry_name, key))
+        station_ratios.append(ratios)
+
+    pending = [idx for idx, ratios in enumerate(station_ratios) if ratios is None]
+    if not pending:
+        return station_ratios
+
+    df = (
+        read_data(data_path)
+        if not is_multi_t.pop()
+        else prepare_daily_data(variable, data_path)
+    )
+    with np.errstate(all="raise"):
+        results = run_assimilation_sweep(
+            df,
+            variable,
+            [configs[idx] for idx in pending],
+            keep_series=store is not None,
+        )
+
+    for idx, (da_ratio, seq_ratio, err_seq_da_ratio, df, _, _) in zip(pending, results):
+        ratios = dict(
+            da_ratio=float(da_ratio),
+            seq_ratio=float(seq_ratio) if seq_ratio is not None else None,
+            err_seq_da_ratio=float(err_seq_da_ratio),
+        )
+        station_ratios[idx] = ratios
+        if store is not None:
+            entry_name, key = entries[idx]
+            store.put(
+                entry_name,
+                key,
+                dict(
+                    time=df.index.values,
+                    assimilated=df["Assimilated"].values,
+                    seq_assimilated=df["Seq_Assimilated"].values,
+                    err_assimilated=df["Err_Assimilated"].values,
+                    seq_err_assimilated=df["Seq_Err_Assimilated"].values,
+                ),
+                ratios,
+            )
+
+    return station_ratios
+
+
+def print_ratio_stats(is_multi_t, da_ratios, seq_ratios, unc_ratios):
+    """
+    Print the statistics of the ratios of the stations of a dataset (RunningStats accumulators)
+    """
+    if not is_multi_t:
+        print_stats_from_accumulator(
+            da_ratios, "RMSE ratio (Sequential/Non-sequential)"
+        )
+    else:
+        print_stats_from_accumulator(
+            da_ratios,
+            "RMSE ratio from hourly reference (Non-sequential assimilated / Daily reference)",
+        )
+        print_stats_from_accumulator(
+            seq_ratios,
+            "RMSE ratio from hourly reference (Sequential assimilated / Daily reference)",
+        )
+
+    print_stats_from_accumulator(unc_ratios, "MAU ratio (Sequential/Non-Sequential)")
@@ -1,8 +1,16 @@
-from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
+# Moved to experiments.py for the batch runner (python -m rls_assimilation), still imported from here by the scripts
+from experiments import (
+    prepare_daily_data,
+    prepare_daily_data_chunks,
+    print_stats_from_accumulator,
+    read_data,
+    read_data_chunks,
+)
 
 plt.rcParams.update({"font.size": 22})
 
@@ -34,8 +42,8 @@ def print_metrics(
     scenario,
     obs_source_title="Station",
 ):
-    s1[np.isnan(s1)] = 0
-    s2[np.isnan(s2)] = 0
+    s1 = np.where(np.isnan(s1), 0, s1)
+    s2 = np.where(np.isnan(s2), 0, s2)
 
     # Root Mean Squared Errors
     print(f"RMSE ({obs_source_title} and Model): {get_rmse(s1, s2)}")
@@ -54,6 +62,56 @@ def print_metrics(
     print(f"MAU ({scenario}): {np.mean(np.abs(err_assimilated)).round(2)}")
 
 
+def downsample_minmax(values, n_buckets):
+    """
+    Select samples to draw: the minimum and the maximum of each of n_buckets equal buckets,
+    so that peaks stay visible after downsampling
+
+    :param values: data values (numpy array, may contain NaNs)
+    :param n_buckets: number of buckets, e.g. the plot width in pixels (int)
+    :return: sorted positions of the selected samples (numpy array of int)
+    """
+
+    n = len(values)
+    bucket_size = int(np.ceil(n / n_buckets))
+    if bucket_size <= 1:
+        return np.arange(n)
+
+    n_buckets = int(np.ceil(n / bucket_size))
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = values
+    buckets = padded.reshape(n_buckets, bucket_size)
+    is_missing = np.isnan(buckets)
+    offsets = np.arange(n_buckets) * bucket_size
+
+    positions = np.concatenate(
+        [
+            offsets + np.argmin(np.where(is_missing, np.inf, buckets), axis=1),
+            offsets + np.argmax(np.where(is_missing, -np.inf, buckets), axis=1),
+        ]
+    )
+    has_data = np.tile(~is_missing.all(axis=1), 2)
+    return np.unique(positions[has_data])
+
+
+def downsample_series(series, max_points):
+    """
+    Downsample a series to at most max_points samples keeping the bucket minimums and maximums
+
+    :param series: time series (pandas series)
+    :param max_points: maximum number of samples to draw (int or None - no downsampling)
+    :return: downsampled time series (pandas series)
+    """
+
+    if max_points is None or len(series) <= max_points:
+        return series
+
+    positions = downsample_minmax(
+        np.asarray(series.values, dtype=float), max(max_points // 2, 1)
+    )
+    return series.iloc[positions]
+
+
 def plot_data(
     s1,
     s2,
@@ -64,7 +122,12 @@ def plot_data(
     obs_source_title="Station",
     obs_source_color="red",
     with_legend=True,
+    max_points=None,
 ):
+    s1, s2, assimilated = (
+        downsample_series(series, max_points) for series in (s1, s2, assimilated)
+    )
+
     ax_data.set_title(f"{variable}")
     ax_data.plot(
         s1.index,
@@ -109,45 +172,6 @@ def plot_data(
     return ax_data
 
 
-def read_data(data_path):
-    all_data_df = pd.read_csv(data_path, index_col=0)
-    all_data_df.index = pd.to_datetime(
-        list(all_data_df.index), format="%Y-%m-%d %H:%M:%S"
-    )
-    all_data_df = all_data_df.sort_index()
-    return all_data_df
-
-
-def prepare_daily_data(variable, data_path):
-    all_data_df = read_data(data_path)
-    daily_means1 = all_data_df[f"{variable}"].resample("D").mean()
-    daily_means1.index = daily_means1.index + timedelta(days=1)
-    observations_source1_daily_and_hourly = pd.concat(
-        [all_data_df[f"{variable}"][23:], daily_means1], axis=1
-    ).ffill()
-    observations_source1_daily_and_hourly.columns = [
-        f"{variable}_obs_hourly",
-        f"{variable}_obs_daily",
-    ]
-
-    daily_means2 = all_data_df[f"{variable}_model"].resample("D").mean()
-    daily_means2.index = daily_means2.index + timedelta(days=1)
-    observations_source2_daily_and_hourly = pd.concat(
-        [all_data_df[f"{variable}_model"][23:], daily_means2], axis=1
-    ).ffill()
-    observations_source2_daily_and_hourly.columns = [
-        f"{variable}_model_hourly",
-        f"{variable}_model_daily",
-    ]
-
-    concatenated_sources_daily_and_hourly = pd.concat(
-        [observations_source1_daily_and_hourly, observations_source2_daily_and_hourly],
-        axis=1,
-    )
-
-    return concatenated_sources_daily_and_hourly
-
-
 def plot_data_seq(
     s1,
     s2,
@@ -158,7 +182,13 @@ def plot_data_seq(
     da_scenario,
     seq_scenario,
     location_label,
+    max_points=None,
 ):
+    s1, s2, da_assimilated, seq_assimilated = (
+        downsample_series(series, max_points)
+        for series in (s1, s2, da_assimilated, seq_assimilated)
+    )
+
     ax_data.set_title(f"{variable} - {location_label}")
     ax_data.plot(
         s1.index,
@@ -221,8 +251,8 @@ def print_metrics_seq(
     da_scenario,
     seq_scenario,
 ):
-    s1[np.isnan(s1)] = 0
-    s2[np.isnan(s2)] = 0
+    s1 = np.where(np.isnan(s1), 0, s1)
+    s2 = np.where(np.isnan(s2), 0, s2)
 
     # Root Mean Squared Errors
     print(f"RMSE (Station and Model): {get_rmse(s1, s2)}")
@@ -234,3 +264,31 @@ def print_metrics_seq(
     # Mean Absolute Uncertainties
     print(f"MAU ({da_scenario}): {np.mean(np.abs(da_err_assimilated)).round(2)}")
     print(f"MAU ({seq_scenario}): {np.mean(np.abs(seq_err_assimilated)).round(2)}")
+
+
+def _render_figure(job):
+    output_path, figsize, nrows, ncols, panels = job
+
+    # Off-screen rendering without pyplot: the figure is not registered in any GUI state
+    fig_data = Figure(figsize=figsize)
+    axs_data = np.atleast_1d(fig_data.subplots(nrows=nrows, ncols=ncols)).ravel()
+    for ax_data, (plot_function, kwargs) in zip(axs_data, panels):
+        plot_function(ax_data=ax_data, **kwargs)
+    fig_data.savefig(output_path)
+
+    return output_path
+
+
+def render_figures(jobs, n_workers=None):
+    """
+    Render figures off-screen in a process pool
+
+    :param jobs: figures to render, each is a tuple (output_path, figsize, nrows, ncols, panels),
+    where panels is a list of (plot_function, kwargs) filling the axes row by row;
+    plot_function is a module-level function (e.g. plot_data, plot_data_seq) that receives the axes as ax_data
+    :param n_workers: number of worker processes (int, None - the number of CPUs)
+    :return: paths to the saved figures (list of str)
+    """
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(_render_figure, jobs))
@@ -0,0 +1,151 @@
+import functools
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+import numpy as np
+
+import experiments
+import rls_assimilation
+from rls_assimilation import __version__
+
+
+def get_file_hash(data_path):
+    """
+    SHA-256 of the content of a data file
+    """
+    file_hash = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def get_source_hash():
+    """
+    SHA-256 of the sources the results depend on: the modules of the package and the experiment code
+    (experiments.py), so any change of the code invalidates the stored results
+    """
+    package_dir = os.path.dirname(rls_assimilation.__file__)
+    source_paths = sorted(
+        os.path.join(package_dir, filename)
+        for filename in os.listdir(package_dir)
+        if filename.endswith(".py")
+    )
+    source_paths.append(experiments.__file__)
+    source_hash = hashlib.sha256()
+    for source_path in source_paths:
+        source_hash.update(os.path.basename(source_path).encode())
+        source_hash.update(bytes.fromhex(get_file_hash(source_path)))
+    return source_hash.hexdigest()
+
+
+class ResultsStore:
+    """
+    Memoized per-station experiment results
+
+    An entry is keyed by the content hash of the data file, the assimilation configuration,
+    the library version and the hash of the sources of the library and the experiments (see get_source_hash),
+    so a changed file, configuration or code invalidates it, also when the version is not bumped.
+    Per-station series are saved as compressed columnar arrays (<key>.npz) and the scalar results
+    (e.g. RMSE and MAU ratios) in the index (index.json). Files are replaced atomically after each entry,
+    so an interrupted run resumes from the last completed entry.
+
+    :param root: directory of the store (str)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, "index.json")
+        self.index: Dict[str, Dict] = {}  # entry name -> {"key": ..., "scalars": ...}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    @staticmethod
+    def get_key(data_path, config):
+        """
+        Key of the results of a data file with a configuration
+
+        Besides the version, the key includes the hash of the sources (get_source_hash): the version is set by hand
+        and must be bumped with every release that changes results, the hash also covers unreleased changes.
+
+        :param data_path: path to the data file (str)
+        :param config: assimilation configuration (JSON-serialisable dict)
+        :return: key (str)
+        """
+        key = json.dumps(
+            {
+                "data": get_file_hash(data_path),
+                "config": config,
+                "version": __version__,
+                "sources": get_source_hash(),
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _write_atomically(self, path, write):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def get_scalars(self, name, key) -> Optional[Dict]:
+        """
+        Scalar results of a completed entry, or None if the entry is missing or outdated
+
+        :param name: entry name, e.g. the data file path and the scenario (str)
+        :param key: current key of the entry (str, see get_key)
+        """
+        entry = self.index.get(name)
+        if (
+            entry is None
+            or entry["key"] != key
+            or not os.path.exists(os.path.join(self.root, f"{key}.npz"))
+        ):
+            return None
+        return entry["scalars"]
+
+    def get_series(self, key) -> Dict[str, np.ndarray]:
+        """
+        Per-station series of an entry
+
+        :param key: key of the entry (str)
+        :return: arrays by column name (dict)
+        """
+        with np.load(os.path.join(self.root, f"{key}.npz")) as data:
+            return dict(data)
+
+    def put(self, name, key, series: Dict[str, np.ndarray], scalars: Dict):
+        """
+        Save a completed entry, replacing an outdated one of the same name
+
+        :param name: entry name (str)
+        :param key: key of the entry (str, see get_key)
+        :param series: per-station arrays by column name, of the same length (dict)
+        :param scalars: scalar results (JSON-serialisable dict)
+        """
+        lengths = {column: len(values) for column, values in series.items()}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f"Columns of {name} have different lengths: {lengths}")
+
+        self._write_atomically(
+            os.path.join(self.root, f"{key}.npz"),
+            lambda f: np.savez_compressed(f, **series),
+        )
+
+        previous = self.index.get(name)
+        self.index[name] = {"key": key, "scalars": scalars}
+        self._write_atomically(
+            self.index_path, lambda f: f.write(json.dumps(self.index).encode())
+        )
+
+        # Remove series that are no longer referenced
+        if previous is not None and previous["key"] != key:
+            if all(entry["key"] != previous["key"] for entry in self.index.values()):
+                previous_path = os.path.join(self.root, f"{previous['key']}.npz")
+                if os.path.exists(previous_path):
+                    os.remove(previous_path)
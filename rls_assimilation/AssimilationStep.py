@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from rls_assimilation.CalendarAverage import is_finer
+from rls_assimilation.DataSource import DataSource, DataSourceAR1, RLSDailyAverage
+from rls_assimilation.Metrics import RunningStats
+from rls_assimilation.PureRLS import PureRLS
+from rls_assimilation.RLSAssimilation import RLSAssimilation
+
+# A stage of the scale alignment: (obs1, err1, obs2, err2, timestamp) -> (obs1, err1, obs2, err2)
+Stage = Callable[
+    [float, float, float, float, Optional[datetime]], Tuple[float, float, float, float]
+]
+# An assimilation step: (obs1, obs2, timestamp) -> (assimilated_obs, err_assimilated_obs)
+Step = Callable[
+    [Optional[float], Optional[float], Optional[datetime]], Tuple[float, float]
+]
+# AR(1) estimation of a source: obs -> (x_corr, err)
+Estimate = Callable[[Optional[float]], Tuple[float, float]]
+
+
+def _to_scalar_model(model):
+    # The same model as PureRLS, whose scalar updates give the same results as the numpy RLS at a fraction of the cost
+    if model is None or isinstance(model, PureRLS):
+        return model
+    scalar_model = PureRLS()
+    scalar_model.P = [[float(p) for p in row] for row in model.P]
+    scalar_model.w = [float(w) for w in model.w.ravel()]
+    scalar_model.error = float(model.error)
+    return scalar_model
+
+
+def _use_scalar_models(source: DataSource):
+    # Convert the RLS models of a source to PureRLS, and create its later models as PureRLS
+    source.model_class = PureRLS
+    source.ar_model = _to_scalar_model(source.ar_model)
+    source.spatial_r_model = _to_scalar_model(source.spatial_r_model)
+    if source.temporal_model is not None:
+        source.temporal_model.model_class = PureRLS
+        source.temporal_model.r_model = _to_scalar_model(source.temporal_model.r_model)
+
+
+def _update_stats(stats: RunningStats, x: float):
+    # RunningStats.update for a number that is not None (e.g. the integer 0 of the first uncertainty)
+    if math.isnan(x):
+        return
+
+    x = float(x)
+    count = stats.count + 1
+    stats.count = count
+    if count == 1:
+        stats.mean = x
+        stats.min = x
+        stats.max = x
+        return
+
+    delta = x - stats.mean
+    mean = stats.mean + delta / count
+    stats.mean = mean
+    stats.m2 += delta * (x - mean)
+    if x < stats.min:
+        stats.min = x
+    if x > stats.max:
+        stats.max = x
+
+
+def _make_estimate(source: DataSourceAR1) -> Estimate:
+    # DataSourceAR1.estimate for a scalar AR(1) model
+    isnan = math.isnan
+    nan = math.nan
+
+    def estimate(x_new):
+        x_corr_all = source.x_corr_all
+        # x_corr_all holds one value less than x_all before the new value is saved
+        x_past = x_corr_all[-1] if x_corr_all else nan
+        source.x_all.append(x_new)
+        ar_model = source.ar_model
+        if isnan(x_new):
+            x_corr = source.impute(x_past)
+        else:
+            x_corr = x_new
+            if not isnan(x_past):
+                if not ar_model:
+                    ar_model = source.ar_model = PureRLS(source.P_init, source.w_init)
+                # PureRLS.update(x_past, x_corr), inlined
+                (P00, P01), (P10, P11) = ar_model.P
+                w0, w1 = ar_model.w
+                x = x_past
+                alpha = float(x_corr - (w0 + x * w1))
+                denominator = 1 + ((P00 + x * P10) + (P01 + x * P11) * x)
+                g0 = (P00 + P01 * x) / denominator
+                g1 = (P10 + P11 * x) / denominator
+                ar_model.error = abs(alpha)
+                ar_model.w = [w0 + g0 * alpha, w1 + g1 * alpha]
+                ar_model.P = [
+                    [P00 - g0 * P00, P01 - g0 * x * P01],
+                    [P10 - g1 * P10, P11 - g1 * x * P11],
+                ]
+        err = ar_model.error if ar_model else 0
+        x_corr_all.append(x_corr)
+        source.ar_errors.append(err)
+        return x_corr, err
+
+    return estimate
+
+
+def _make_calibrate(source: DataSource):
+    # DataSource.calibrate for a scalar R(1) model
+    def calibrate(x_corr, err, x_ref):
+        if not source.x_calibrated_all:
+            source.x_calibrated_all.append(x_corr)
+            source.r_errors.append(err)
+            return x_corr, err
+
+        r_model = source.spatial_r_model
+        x_calibrated = r_model.predict(x_corr)
+        source.x_calibrated_all.append(x_calibrated)
+        sign_factor = -1 if err < 0 else 1
+        r_err = float(abs(r_model.w[1]) * err) + sign_factor * abs(r_model.error)
+        source.r_errors.append(r_err)
+        r_model.update(x_corr, x_ref)
+        return x_calibrated, r_err
+
+    return calibrate
+
+
+def _make_downscale(source: DataSource):
+    # DataSource.downscale_other_source for a scalar R(1) model
+    temporal_model = source.temporal_model
+
+    def downscale(x_hourly, other_x_daily, other_err_daily):
+        r_model = temporal_model.r_model
+        if not r_model:
+            return other_x_daily, other_err_daily
+
+        r_model.update(temporal_model.latest_daily_average, x_hourly)
+        other_x_hourly = r_model.predict(other_x_daily)
+        sign_factor = -1 if other_err_daily < 0 else 1
+        other_err_hourly = float(
+            abs(r_model.w[1]) * other_err_daily
+        ) + sign_factor * abs(r_model.error)
+        return other_x_hourly, other_err_hourly
+
+    return downscale
+
+
+def _make_calibration_stage(source: DataSource, is_first: bool) -> Stage:
+    calibrate = _make_calibrate(source)
+    if is_first:
+
+        def calibrate_source1(x1, e1, x2, e2, timestamp):
+            x1, e1 = calibrate(x1, e1, x2)
+            return x1, e1, x2, e2
+
+        return calibrate_source1
+
+    def calibrate_source2(x1, e1, x2, e2, timestamp):
+        x2, e2 = calibrate(x2, e2, x1)
+        return x1, e1, x2, e2
+
+    return calibrate_source2
+
+
+def _make_daily_average(average: RLSDailyAverage):
+    # RLSDailyAverage.update for a scalar R(1) model
+    def update(x_new_hourly, x_new_hourly_err, timestamp):
+        counter = average.counter
+        if counter == 24:
+            if average.r_model is None:
+                average.r_model = PureRLS(average.P_init, average.w_init)
+
+            average.latest_daily_average = average.current_average
+            average.latest_daily_average_err = average.current_average_err
+            average.current_average = 0
+            average.current_average_err = 0
+            counter = 0
+
+        average.current_average = (average.current_average * counter + x_new_hourly) / (
+            counter + 1
+        )
+        average.current_average_err = (
+            average.current_average_err * counter + x_new_hourly_err
+        ) / (counter + 1)
+        average.counter = counter + 1
+
+    return update
+
+
+def _make_average_stage(source: DataSource, is_first: bool) -> Stage:
+    # Calendar averages (timestamped data) keep their own update
+    if type(source.temporal_model) is RLSDailyAverage:
+        update = _make_daily_average(source.temporal_model)
+    else:
+        update = source.temporal_model.update
+    if is_first:
+
+        def update_average1(x1, e1, x2, e2, timestamp):
+            update(x1, e1, timestamp)
+            return x1, e1, x2, e2
+
+        return update_average1
+
+    def update_average2(x1, e1, x2, e2, timestamp):
+        update(x2, e2, timestamp)
+        return x1, e1, x2, e2
+
+    return update_average2
+
+
+def _make_scaling_stage(source1: DataSource, source2: DataSource) -> Optional[Stage]:
+    # The same precedence as RLSAssimilation._align_scales_of_sources: source1 is scaled first
+    if source1.t_in != source1.t_out:
+        if is_finer(source1.t_in, source1.t_out):
+            average1 = source1.temporal_model
+
+            def upscale_source1(x1, e1, x2, e2, timestamp):
+                # DataSource.upscale
+                return (
+                    average1.latest_daily_average,
+                    average1.latest_daily_average_err,
+                    x2,
+                    e2,
+                )
+
+            return upscale_source1
+
+        downscale = _make_downscale(source2)
+
+        def downscale_source1(x1, e1, x2, e2, timestamp):
+            x1, e1 = downscale(x2, x1, e1)
+            return x1, e1, x2, e2
+
+        return downscale_source1
+
+    if source2.t_in != source2.t_out:
+        if is_finer(source2.t_in, source2.t_out):
+            average2 = source2.temporal_model
+
+            def upscale_source2(x1, e1, x2, e2, timestamp):
+                # DataSource.upscale
+                return (
+                    x1,
+                    e1,
+                    average2.latest_daily_average,
+                    average2.latest_daily_average_err,
+                )
+
+            return upscale_source2
+
+        downscale = _make_downscale(source1)
+
+        def downscale_source2(x1, e1, x2, e2, timestamp):
+            x2, e2 = downscale(x1, x2, e2)
+            return x1, e1, x2, e2
+
+        return downscale_source2
+
+    return None
+
+
+def build_step(assimilator: RLSAssimilation) -> Step:
+    """
+    Compose the assimilation step of an assimilator from the stages its configuration needs
+
+    Spatial calibration, daily averages and temporal scaling are fixed when the assimilator is created,
+    so the returned step does not re-check them on every call. The AR(1) estimation, the R(1) calibration
+    and the downscaling run on scalar RLS models (PureRLS, also with the numpy backend: the models
+    of the assimilator are converted), with the AR(1) update and the daily averages inlined, and the metrics
+    accumulators are updated in place. Calling the step is the same as calling assimilator.assimilate, with the same results
+    (the state and the metrics of the assimilator are updated).
+
+    :param assimilator: the assimilator whose state is updated (RLSAssimilation)
+    :return: step function (obs1, obs2, timestamp=None) -> (assimilated_obs, err_assimilated_obs)
+    """
+
+    source1 = assimilator.source1
+    source2 = assimilator.source2
+    _use_scalar_models(source1)
+    _use_scalar_models(source2)
+
+    stages: List[Stage] = []
+    calibrated_source = None
+    if source1.is_spatially_calibrated() and not source2.is_spatially_calibrated():
+        calibrated_source = source1
+        stages.append(_make_calibration_stage(source1, True))
+    elif source2.is_spatially_calibrated() and not source1.is_spatially_calibrated():
+        calibrated_source = source2
+        stages.append(_make_calibration_stage(source2, False))
+    if source1.has_daily_average():
+        stages.append(_make_average_stage(source1, True))
+    if source2.has_daily_average():
+        stages.append(_make_average_stage(source2, False))
+    scaling_stage = _make_scaling_stage(source1, source2)
+    if scaling_stage is not None:
+        stages.append(scaling_stage)
+
+    estimate1 = _make_estimate(source1)
+    estimate2 = _make_estimate(source2)
+
+    metrics = assimilator.metrics
+    rmse_sources = metrics.rmse_sources
+    rmse_source1 = metrics.rmse_source1
+    rmse_source2 = metrics.rmse_source2
+    err_source1 = metrics.err_source1
+    err_source2 = metrics.err_source2
+    err_calibrated = metrics.err_calibrated if calibrated_source else None
+    err_assimilated = metrics.err_assimilated
+    isnan = math.isnan
+    sqrt = math.sqrt
+
+    def step(
+        obs1: Optional[float],
+        obs2: Optional[float],
+        timestamp: Optional[datetime] = None,
+    ) -> (float, float):
+        # Step 1: Pre-process observations and estimate AR(1) errors
+        x1, ar_e1 = estimate1(obs1)
+        x2, ar_e2 = estimate2(obs2)
+
+        # Step 2: Temporal and spatial calibration
+        e1 = ar_e1
+        e2 = ar_e2
+        for stage in stages:
+            x1, e1, x2, e2 = stage(x1, e1, x2, e2, timestamp)
+
+        # Step 3: Assimilation, in Python floats (faster than numpy scalars, with the same rounding)
+        x1 = float(x1)
+        e1 = float(e1)
+        x2 = float(x2)
+        e2 = float(e2)
+        err_sum = e1**2 + e2**2
+        k = e2**2 / err_sum if err_sum != 0 else 1
+        assimilated_obs = k * x1 + (1 - k) * x2
+        err_assimilated_obs = sqrt((k * e1) ** 2 + ((1 - k) * e2) ** 2)
+
+        # AssimilationMetrics.update, with the RunningRMSE updates inlined
+        if not isnan(obs1):
+            if not isnan(obs2):
+                rmse_sources.count += 1
+                rmse_sources.sum_sq += (float(obs1) - float(obs2)) ** 2
+            if not isnan(assimilated_obs):
+                rmse_source1.count += 1
+                rmse_source1.sum_sq += (float(obs1) - assimilated_obs) ** 2
+        if not isnan(obs2) and not isnan(assimilated_obs):
+            rmse_source2.count += 1
+            rmse_source2.sum_sq += (float(obs2) - assimilated_obs) ** 2
+        _update_stats(err_source1, abs(ar_e1))
+        _update_stats(err_source2, abs(ar_e2))
+        if err_calibrated is not None:
+            _update_stats(err_calibrated, abs(calibrated_source.r_errors[-1]))
+        _update_stats(err_assimilated, abs(err_assimilated_obs))
+
+        return assimilated_obs, err_assimilated_obs
+
+    return step
+
+
+def make_assimilation_step(
+    t_in1: str,
+    t_in2: str,
+    s_in1: str,
+    s_in2: str,
+    t_out: str,
+    s_out: str,
+    use_timestamps: bool = False,
+    P_init: float = 1.0,
+    w_init: Sequence[float] = (0.0, 0.0),
+) -> (RLSAssimilation, Step):
+    """
+    Create an assimilator of 2 data sources (see RLSAssimilation, whose validation rules apply)
+    together with its assimilation step specialised for the scales of the sources
+
+    :param t_in1: temporal scale of source1 (str, "hourly" or "daily")
+    :param t_in2: temporal scale of source2 (str, "hourly" or "daily")
+    :param s_in1: spatial scale of source1 (str)
+    :param s_in2: spatial scale of source2 (str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param use_timestamps: assimilate timestamped data with calendar averages (bool, see RLSAssimilation)
+    :param P_init: initial state matrix of all RLS models as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of all RLS models (constant and coefficient)
+
+    Returns (assimilator - the state, sources and metrics of the step (RLSAssimilation), step - see build_step)
+    """
+
+    assimilator = RLSAssimilation(
+        t_in1, t_in2, s_in1, s_in2, t_out, s_out, use_timestamps, P_init, w_init
+    )
+    return assimilator, build_step(assimilator)
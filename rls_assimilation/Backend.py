@@ -0,0 +1,37 @@
+"""
+Scalar math backend of the per-stream classes (RLS, DataSource, RLSAssimilation and the sequential assimilators)
+
+The backend is selected once, at import, by the environment variable RLS_ASSIMILATION_BACKEND:
+"numpy" (the default if numpy is installed) or "python" (plain Python floats, the default without numpy).
+Both backends give the same results; the Python one starts faster and needs less memory on small devices.
+The vectorised classes and the methods working on series (e.g. fast_forward) always import numpy on use.
+"""
+
+import importlib.util
+import os
+
+BACKEND_VARIABLE = "RLS_ASSIMILATION_BACKEND"
+BACKENDS = ["numpy", "python"]
+
+
+def _select_backend() -> str:
+    backend = os.environ.get(BACKEND_VARIABLE)
+    if backend is None:
+        return "numpy" if importlib.util.find_spec("numpy") is not None else "python"
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Backend {backend} is not supported. Supported backends are {BACKENDS}."
+        )
+    return backend
+
+
+BACKEND: str = _select_backend()
+
+if BACKEND == "numpy":
+    from numpy import abs as absolute, isnan, sqrt
+    from rls_assimilation.RLS import RLS
+else:
+    from math import isnan, sqrt
+    from rls_assimilation.PureRLS import PureRLS as RLS
+
+    absolute = abs
@@ -0,0 +1,302 @@
+from typing import Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+from rls_assimilation.BatchRLS import BatchRLS, predict_with_weights
+from rls_assimilation.Forecast import forecast_trajectory
+
+
+def _propagate_error(w1: np.ndarray, model_error: np.ndarray, err: np.ndarray):
+    # |w1| * err + sign(err) * |model error|, as in DataSource.calibrate
+    abs_model_error = np.abs(model_error)
+    return np.abs(w1) * err + np.where(err < 0, -abs_model_error, abs_model_error)
+
+
+class BatchRLSDailyAverage:
+    """
+    Vectorised RLSDailyAverage: daily average upscaling of hourly estimates for a bank of lanes
+
+    :param shape: shape of the bank (tuple of int)
+    :param dtype: floating point type of the state (numpy dtype, float64 or float32)
+    :param P_init: initial state matrices of the RLS models as multiples of the identity (float, or numpy array
+    broadcastable to the bank shape; see BatchRLS)
+    :param w_init: initial weights of the RLS models (numpy array broadcastable to (*shape, 2))
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...] = (),
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        self.current_average = np.zeros(shape, dtype=dtype)
+        self.current_average_err = np.zeros(shape, dtype=dtype)
+        self.latest_daily_average = np.zeros(shape, dtype=dtype)
+        self.latest_daily_average_err = np.zeros(shape, dtype=dtype)
+        self.counter = np.zeros(shape, dtype=np.int64)
+        self.has_r_model = np.zeros(shape, dtype=bool)  # r_model is initialised
+        self.r_model: BatchRLS = BatchRLS(shape, dtype, P_init, w_init)
+
+    def update(
+        self,
+        x_new_hourly: np.ndarray,
+        x_new_hourly_err: np.ndarray,
+        mask: Optional[np.ndarray] = None,
+    ):
+        """
+        Update the running daily averages
+
+        :param x_new_hourly: hourly data values (numpy array)
+        :param x_new_hourly_err: hourly uncertainties (numpy array)
+        :param mask: lanes to update (numpy bool array or None - all lanes)
+        """
+
+        mask = np.broadcast_to(True if mask is None else mask, self.counter.shape)
+        is_day_closed = mask & (self.counter == 24)
+        self.has_r_model |= is_day_closed
+        np.copyto(self.latest_daily_average, self.current_average, where=is_day_closed)
+        np.copyto(
+            self.latest_daily_average_err, self.current_average_err, where=is_day_closed
+        )
+        np.copyto(self.counter, 0, where=is_day_closed)
+        np.copyto(self.current_average, 0, where=is_day_closed)
+        np.copyto(self.current_average_err, 0, where=is_day_closed)
+
+        prev_counter = self.counter.astype(self.current_average.dtype)
+        counter = prev_counter + 1
+        prev_sum = self.current_average * prev_counter
+        prev_sum_err = self.current_average_err * prev_counter
+        np.copyto(self.counter, self.counter + 1, where=mask)
+        np.copyto(self.current_average, (prev_sum + x_new_hourly) / counter, where=mask)
+        np.copyto(
+            self.current_average_err,
+            (prev_sum_err + x_new_hourly_err) / counter,
+            where=mask,
+        )
+
+
+class BatchDataSourceAR1:
+    """
+    Vectorised DataSourceAR1: AR(1) uncertainty estimation for a bank of data sources
+
+    Only the latest values are kept (no history).
+
+    :param shape: shape of the bank (tuple of int)
+    :param dtype: floating point type of the state and the estimates (numpy dtype, float64 or float32)
+    :param P_init: initial state matrices of the RLS models as multiples of the identity (float, or numpy array
+    broadcastable to the bank shape; see BatchRLS)
+    :param w_init: initial weights of the RLS models (numpy array broadcastable to (*shape, 2))
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...] = (),
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        # AR(1) models
+        self.ar_model: BatchRLS = BatchRLS(shape, dtype, P_init, w_init)
+        self.has_ar_model = np.zeros(shape, dtype=bool)  # ar_model is initialised
+        self.x_past = np.full(shape, np.nan, dtype=dtype)  # the latest x_corr
+
+    def impute(self, x_past: np.ndarray) -> np.ndarray:
+        """
+        Imputes missing data values with AR(1) predictions
+
+        :param: x_past - the past values used as input for AR(1) models (numpy array)
+        Returns: imputed data values (numpy array)
+        """
+
+        return np.where(
+            self.has_ar_model,
+            self.ar_model.predict(x_past),
+            np.where(np.isnan(x_past), 0, x_past),
+        )
+
+    def estimate(self, x_new: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Runs AR(1) uncertainty estimation for all lanes
+
+        :param: x_new - the latest values from the data sources (numpy array, NaN if missing)
+        Returns: (x_corr - imputed or raw data values (numpy array), err - AR(1) uncertainties of x_corr (numpy array))
+        """
+
+        x_new = np.broadcast_to(
+            np.asarray(x_new, dtype=self.x_past.dtype), self.x_past.shape
+        )
+        is_missing = np.isnan(x_new)
+        x_corr = np.where(is_missing, self.impute(self.x_past), x_new)
+
+        is_updated = ~is_missing & ~np.isnan(self.x_past)
+        self.has_ar_model |= is_updated
+        self.ar_model.update(self.x_past, x_corr, mask=is_updated)
+
+        err = np.where(self.has_ar_model, self.ar_model.error, 0)
+        self.x_past[...] = x_corr
+
+        return x_corr, err
+
+    def fast_forward(self, n_steps: int) -> (np.ndarray, np.ndarray):
+        """
+        Runs AR(1) uncertainty estimation of all lanes over a gap of n_steps missing values in closed form
+        (the same as calling estimate with NaNs n_steps times)
+
+        :param: n_steps - the number of missing data points (int)
+        Returns: (x_corr - imputed data values (numpy array, shape (n_steps, *bank shape)),
+        err - AR(1) uncertainties of x_corr (numpy array, shape (n_steps, *bank shape)))
+        """
+
+        x_start = self.impute(self.x_past)
+        x_corr = np.where(
+            self.has_ar_model,
+            self.ar_model.predict_ahead(self.x_past, n_steps),
+            x_start,
+        )
+        err = np.broadcast_to(
+            np.where(self.has_ar_model, self.ar_model.error, 0), x_corr.shape
+        ).copy()
+        if n_steps > 0:
+            self.x_past[...] = x_corr[-1]
+
+        return x_corr, err
+
+    def forecast(self, n_steps: int) -> (np.ndarray, np.ndarray):
+        """
+        Forecasts all lanes n_steps ahead with the AR(1) models, with the propagated uncertainty
+        (the state is not changed; see Forecast.forecast_trajectory)
+
+        :param: n_steps - the number of steps ahead (int)
+        Returns: (mean - forecast values (numpy array, shape (n_steps, *bank shape)),
+        err - uncertainties of the forecast values (numpy array, shape (n_steps, *bank shape)))
+        """
+
+        x = np.where(self.has_ar_model, self.x_past, self.impute(self.x_past))
+        err = np.where(self.has_ar_model, self.ar_model.error, 0)
+        return forecast_trajectory(
+            self.ar_model.w, self.ar_model.error, self.has_ar_model, x, err, n_steps
+        )
+
+
+class BatchDataSource(BatchDataSourceAR1):
+    """
+    Vectorised DataSource: AR(1) and R(1) algorithms for a bank of data sources
+
+    Sources are stacked along the last axis. Scales are handled by the assimilator owning the bank,
+    so every lane has a daily average and an R(1) model; they are only updated for the lanes that need them.
+
+    :param shape: shape of the bank (tuple of int)
+    :param dtype: floating point type of the state and the estimates (numpy dtype, float64 or float32)
+    :param P_init: initial state matrices of the RLS models as multiples of the identity (float, or numpy array
+    broadcastable to the bank shape; see BatchRLS)
+    :param w_init: initial weights of the RLS models (numpy array broadcastable to (*shape, 2))
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...] = (),
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        BatchDataSourceAR1.__init__(self, shape, dtype, P_init, w_init)
+        self.temporal_model: BatchRLSDailyAverage = BatchRLSDailyAverage(
+            shape, dtype, P_init, w_init
+        )
+        # R(1) models
+        self.spatial_r_model: BatchRLS = BatchRLS(shape, dtype, P_init, w_init)
+        self.is_calibration_started = np.zeros(shape, dtype=bool)
+
+    def upscale(self) -> (np.ndarray, np.ndarray):
+        """
+        Upscaled (daily) data values and uncertainties of all lanes
+        """
+
+        return (
+            self.temporal_model.latest_daily_average,
+            self.temporal_model.latest_daily_average_err,
+        )
+
+    def downscale_other_sources(
+        self,
+        lane: int,
+        x_hourly: np.ndarray,
+        other_x_daily: np.ndarray,
+        other_err_daily: np.ndarray,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Downscale daily data of the other sources (lanes along the last axis) using the relationship
+        between hourly and daily data of the reference lane
+
+        :param: lane - index of the reference hourly source along the last axis (int)
+        :param: x_hourly - hourly data values of all sources, only the reference lane is used (numpy array)
+        :param: other_x_daily - daily data values (numpy array)
+        :param: other_err_daily - daily uncertainties (numpy array)
+        Returns (other_x_hourly - downscaled data values (numpy array), other_err_hourly - downscaled uncertainties (numpy array))
+        """
+
+        temporal_model = self.temporal_model
+        is_reference = np.arange(self.x_past.shape[-1]) == lane
+        temporal_model.r_model.update(
+            temporal_model.latest_daily_average,
+            x_hourly,
+            mask=temporal_model.has_r_model & is_reference,
+        )
+
+        has_r_model = temporal_model.has_r_model[..., lane, None]
+        w = temporal_model.r_model.w[..., lane, None, :]
+        other_x_hourly = np.where(
+            has_r_model, predict_with_weights(w, other_x_daily), other_x_daily
+        )
+        other_err_hourly = np.where(
+            has_r_model,
+            _propagate_error(
+                w[..., 1],
+                temporal_model.r_model.error[..., lane, None],
+                other_err_daily,
+            ),
+            other_err_daily,
+        )
+
+        return other_x_hourly, other_err_hourly
+
+    def calibrate(
+        self,
+        x_corr: np.ndarray,
+        err: np.ndarray,
+        x_ref: np.ndarray,
+        mask: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Run spatial R(1) calibration
+
+        :param: x_corr - values being calibrated (numpy array)
+        :param: err - uncertainties of the values being calibrated (numpy array)
+        :param: x_ref - reference values for calibration (numpy array)
+        :param: mask - calibrated lanes, the others are returned unchanged (numpy bool array or None - all lanes)
+        Returns (x_calibrated - calibrated data values (numpy array), r_err - uncertainties of x_calibrated (numpy array))
+        """
+
+        mask = np.broadcast_to(
+            True if mask is None else mask, self.is_calibration_started.shape
+        )
+        is_predicted = mask & self.is_calibration_started
+
+        # Step 1: Predict
+        x_calibrated = np.where(
+            is_predicted, self.spatial_r_model.predict(x_corr), x_corr
+        )
+        r_err = np.where(
+            is_predicted,
+            _propagate_error(
+                self.spatial_r_model.w[..., 1], self.spatial_r_model.error, err
+            ),
+            err,
+        )
+
+        # Step 2: Update
+        self.spatial_r_model.update(x_corr, x_ref, mask=is_predicted)
+        self.is_calibration_started |= mask
+
+        return x_calibrated, r_err
@@ -0,0 +1,176 @@
+from typing import Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+
+def predict_with_weights(w: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Predict observations with linear models given by their weights (see RLS.predict)
+
+    :param w: weights of the models (numpy array, shape (..., 2))
+    :param x: past observations (numpy array broadcastable to w.shape[:-1])
+    :return: predicted observations (numpy array)
+    """
+
+    all_zeros = (w[..., 0] == 0) & (w[..., 1] == 0)
+    return np.where(all_zeros, x, w[..., 0] + x * w[..., 1])
+
+
+def iterate_linear(
+    w0: np.ndarray, w1: np.ndarray, x: np.ndarray, n_steps: int
+) -> np.ndarray:
+    """
+    Iterate linear recursions x_k = w0 + w1 * x_(k-1) n_steps ahead in closed form
+
+    The iterates form a geometric sequence: x_k = w1^k * x + w0 * (1 + w1 + ... + w1^(k-1)).
+
+    :param w0: constants (numpy array)
+    :param w1: coefficients (numpy array broadcastable to w0)
+    :param x: initial values (numpy array broadcastable to w0)
+    :param n_steps: number of steps ahead (int)
+    :return: iterates for steps 1..n_steps (numpy array, shape (n_steps, ...))
+    """
+
+    w1 = np.asarray(w1)
+    steps = np.arange(1, n_steps + 1, dtype=w1.dtype).reshape((-1,) + (1,) * w1.ndim)
+    with np.errstate(under="ignore", over="ignore", invalid="ignore"):
+        powers = w1**steps
+        geometric_sums = np.cumsum(
+            np.concatenate([np.ones_like(powers[:1]), powers[:-1]]), axis=0
+        )
+        return powers * x + w0 * geometric_sums
+
+
+def predict_trajectory(w: np.ndarray, x: np.ndarray, n_steps: int) -> np.ndarray:
+    """
+    Iterate predictions of linear models n_steps ahead in closed form (see iterate_linear)
+
+    :param w: weights of the models (numpy array, shape (..., 2))
+    :param x: the latest observations (numpy array broadcastable to w.shape[:-1])
+    :param n_steps: number of steps ahead (int)
+    :return: predicted observations for steps 1..n_steps (numpy array, shape (n_steps, ...))
+    """
+
+    x = np.asarray(x, dtype=w.dtype)
+    w0, w1 = w[..., 0], w[..., 1]
+    trajectory = iterate_linear(w0, w1, x, n_steps)
+
+    all_zeros = (w0 == 0) & (w1 == 0)
+    return np.where(all_zeros, x, trajectory)
+
+
+class BatchRLS:
+    """
+    Vectorised RLS: a bank of independent RLS models (lanes) of the given shape updated at once
+
+    Each lane follows exactly the same recursion as RLS. The state is updated in place,
+    so it can live in externally provided arrays.
+
+    :param shape: shape of the bank of models (tuple of int)
+    :param dtype: floating point type of the state (numpy dtype, float64 or float32)
+    :param P_init: initial state matrices as multiples of the identity (float, or numpy array broadcastable
+    to the bank shape for a value per lane; see RLS)
+    :param w_init: initial weights (numpy array broadcastable to (*shape, 2))
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, ...] = (),
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        self.P = np.zeros((*shape, 2, 2), dtype=dtype)  # state matrices, (..., 2, 2)
+        self.P[..., 0, 0] = P_init
+        self.P[..., 1, 1] = P_init
+        # weights (constant and coefficient), (..., 2)
+        self.w = np.zeros((*shape, 2), dtype=dtype)
+        self.w[...] = w_init
+        self.error = np.zeros(shape, dtype=dtype)
+
+    def update(self, x: np.ndarray, y: np.ndarray, mask: Optional[np.ndarray] = None):
+        """
+        RLS state update of all lanes
+
+        :param x: past/input observations (numpy array broadcastable to the bank shape)
+        :param y: current/output observations (numpy array broadcastable to the bank shape)
+        :param mask: lanes to update, the others keep their state (numpy bool array or None - all lanes)
+        """
+
+        x = np.asarray(x, dtype=self.w.dtype)
+        y = np.asarray(y, dtype=self.w.dtype)
+        if mask is not None:
+            # masked lanes get zero gain and zero innovation, which keeps their state
+            x = np.where(mask, x, 0)
+            y = np.where(mask, y, 0)
+
+        P00, P01, P10, P11 = (self.P[..., i, j] for i in (0, 1) for j in (0, 1))
+        w0, w1 = self.w[..., 0], self.w[..., 1]
+
+        alpha = y - (w0 + x * w1)
+        denominator = 1 + ((P00 + x * P10) + (P01 + x * P11) * x)
+        g0 = (P00 + P01 * x) / denominator
+        g1 = (P10 + P11 * x) / denominator
+
+        if mask is None:
+            self.error[...] = np.abs(alpha)
+        else:
+            np.copyto(self.error, np.abs(alpha), where=mask)
+            alpha = np.where(mask, alpha, 0)
+            g0 = np.where(mask, g0, 0)
+            g1 = np.where(mask, g1, 0)
+
+        w0 += g0 * alpha
+        w1 += g1 * alpha
+        P00 -= g0 * P00
+        P01 -= g0 * x * P01
+        P10 -= g1 * P10
+        P11 -= g1 * x * P11
+
+    def update_repeated(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        n_updates: np.ndarray,
+        mask: Optional[np.ndarray] = None,
+    ):
+        """
+        RLS state update of all lanes with the same (x, y) repeated, e.g. for runs of equal values
+        (the same as calling update n_updates times, with a number of updates per lane)
+
+        :param x: past/input observations (numpy array broadcastable to the bank shape)
+        :param y: current/output observations (numpy array broadcastable to the bank shape)
+        :param n_updates: number of updates (int, or numpy int array broadcastable to the bank shape)
+        :param mask: lanes to update, the others keep their state (numpy bool array or None - all lanes)
+        """
+
+        x = np.asarray(x, dtype=self.w.dtype)
+        y = np.asarray(y, dtype=self.w.dtype)
+        n_updates = np.asarray(n_updates)
+        for i in range(int(n_updates.max(initial=0))):
+            # Lanes with fewer updates drop out of the later ones
+            lanes = None if n_updates.ndim == 0 else n_updates > i
+            if mask is not None:
+                lanes = mask if lanes is None else lanes & mask
+            self.update(x, y, mask=lanes)
+
+    def predict(self, x: np.ndarray) -> np.ndarray:
+        """
+        Predict observations of all lanes
+
+        :param x: past observations (numpy array broadcastable to the bank shape)
+        :return: predicted observations (numpy array)
+        """
+
+        return predict_with_weights(self.w, x)
+
+    def predict_ahead(self, x: np.ndarray, n_steps: int) -> np.ndarray:
+        """
+        Iterated predictions of all lanes n_steps ahead (see predict_trajectory)
+
+        :param x: the latest observations (numpy array broadcastable to the bank shape)
+        :param n_steps: number of steps ahead (int)
+        :return: predicted observations (numpy array, shape (n_steps, *bank shape))
+        """
+
+        return predict_trajectory(self.w, x, n_steps)
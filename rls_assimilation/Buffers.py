@@ -0,0 +1,107 @@
+from array import array
+from typing import Tuple
+
+# Formats of the floating point buffers read and written element by element (float64 and float32)
+FLOAT_FORMATS = ("d", "f")
+
+
+def _get_view(buffer, name: str) -> memoryview:
+    view = memoryview(buffer)
+    if view.format not in FLOAT_FORMATS:
+        raise TypeError(
+            f"{name} must be a buffer of float64 or float32 values, got format {view.format!r}"
+        )
+    if view.ndim != 1:
+        if not view.c_contiguous:
+            raise ValueError(f"{name} must be C-contiguous")
+        view = view.cast("B").cast(view.format)
+    return view
+
+
+def get_input_view(buffer, name: str = "obs") -> memoryview:
+    """
+    Flat view of a buffer of values (e.g. a numpy array, memoryview or array.array), without copying
+
+    :param buffer: float64 or float32 values, NaN if missing (object supporting the buffer protocol)
+    :param name: name of the buffer in error messages (str)
+    Returns the values (memoryview, 1-dimensional)
+    """
+
+    return _get_view(buffer, name)
+
+
+def get_output_view(buffer, size: int, name: str = "out") -> (object, memoryview):
+    """
+    Flat writable view of an output buffer, or a new float64 buffer
+
+    :param buffer: writable float64 or float32 buffer of size values (object supporting the buffer protocol)
+    or None - a new array.array
+    :param size: number of values (int)
+    :param name: name of the buffer in error messages (str)
+    Returns (the buffer, or the new array.array, its writable view (memoryview, 1-dimensional))
+    """
+
+    if buffer is None:
+        buffer = array("d", bytes(8 * size))
+    view = _get_view(buffer, name)
+    if view.readonly:
+        raise ValueError(f"{name} must be writable")
+    if len(view) != size:
+        raise ValueError(f"{name} must have {size} values, got {len(view)}")
+    return buffer, view
+
+
+def as_input_array(buffer, shape: Tuple[int, ...]):
+    """
+    Numpy view of a buffer of values (e.g. a memoryview), reshaped to shape if it holds as many values
+    (other shapes are kept for broadcasting); a contiguous buffer is not copied
+
+    :param buffer: values (object supporting the buffer protocol, or array-like)
+    :param shape: shape of the values (tuple of int)
+    Returns the values (numpy array)
+    """
+    import numpy as np
+
+    values = np.asarray(buffer)
+    if values.shape != shape and values.size == np.prod(shape, dtype=int):
+        values = values.reshape(shape)
+    return values
+
+
+def as_output_array(buffer, shape: Tuple[int, ...], name: str = "out"):
+    """
+    Writable numpy view of an output buffer (e.g. a memoryview or a numpy array), in the given shape
+
+    The results are written into the memory of the buffer: objects without the buffer protocol (e.g. lists),
+    which numpy would copy, are rejected.
+
+    :param buffer: writable float buffer of the values (object supporting the buffer protocol) or None
+    :param shape: shape of the values (tuple of int)
+    :param name: name of the buffer in error messages (str)
+    Returns the view (numpy array, or None without a buffer)
+    """
+    import numpy as np
+
+    if buffer is None:
+        return None
+    try:
+        view = memoryview(buffer)
+    except TypeError:
+        raise TypeError(
+            f"{name} must support the buffer protocol (e.g. a numpy array or memoryview), "
+            f"got {type(buffer).__name__}"
+        )
+    if view.readonly:
+        raise ValueError(f"{name} must be writable")
+    values = np.asarray(view)
+    if values.dtype.kind != "f":
+        raise TypeError(f"{name} must be a buffer of float values, got {values.dtype}")
+    values = values.view()
+    try:
+        # Setting the shape never copies, unlike reshape
+        values.shape = shape
+    except (AttributeError, ValueError):
+        raise ValueError(
+            f"{name} must be a contiguous buffer of shape {shape}, got {values.shape}"
+        )
+    return values
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+from rls_assimilation.Backend import RLS
+
+# Supported temporal scales of timestamped data, from the finest
+TEMPORAL_SCALES = ["hourly", "daily", "weekly"]
+
+
+def is_finer(t1: str, t2: str) -> bool:
+    """
+    Whether temporal scale t1 is finer than t2
+    """
+
+    return TEMPORAL_SCALES.index(t1) < TEMPORAL_SCALES.index(t2)
+
+
+def get_bucket_start(timestamp: datetime, scale: str) -> datetime:
+    """
+    Start of the calendar bucket (hour, day or ISO week starting on Monday) of a timestamp
+
+    :param timestamp: time of a data value (datetime, e.g. pandas Timestamp)
+    :param scale: temporal scale of the bucket (str, "hourly", "daily" or "weekly")
+    :return: start of the bucket (datetime)
+    """
+
+    hour_start = timestamp.replace(minute=0, second=0, microsecond=0)
+    if scale == "hourly":
+        return hour_start
+    day_start = hour_start.replace(hour=0)
+    if scale == "daily":
+        return day_start
+    return day_start - timedelta(days=day_start.weekday())
+
+
+class CalendarAggregate:
+    """
+    Running averages of a series of values and their uncertainties over calendar buckets of several temporal scales
+
+    A bucket is closed when the first value of a later bucket arrives, so missing values and streams
+    that do not start at the beginning of a bucket are handled; the average is over the values received.
+    Every update is O(1): only the running sums of the open buckets are kept.
+
+    :param scales: temporal scales of the buckets (list of str, see TEMPORAL_SCALES)
+    """
+
+    def __init__(self, scales: List[str]):
+        for scale in scales:
+            if scale not in TEMPORAL_SCALES:
+                raise NotImplementedError(
+                    f"Temporal scale {scale} is not supported. Supported temporal scales are {TEMPORAL_SCALES}."
+                )
+        self.scales: List[str] = list(scales)
+        # Open buckets
+        self.bucket_starts: Dict[str, Optional[datetime]] = {s: None for s in scales}
+        self.sums: Dict[str, float] = {s: 0 for s in scales}
+        self.sums_err: Dict[str, float] = {s: 0 for s in scales}
+        self.counters: Dict[str, int] = {s: 0 for s in scales}
+        # The latest closed buckets
+        self.latest_bucket_starts: Dict[str, Optional[datetime]] = {
+            s: None for s in scales
+        }
+        self.latest_averages: Dict[str, float] = {s: 0 for s in scales}
+        self.latest_averages_err: Dict[str, float] = {s: 0 for s in scales}
+
+    def update(self, timestamp: datetime, x: float, err: float) -> List[str]:
+        """
+        Add a value to the buckets of its timestamp
+
+        :param timestamp: time of the value, not earlier than the previous one (datetime)
+        :param x: data value (float)
+        :param err: uncertainty of the value (float)
+        :return: scales whose bucket has been closed by this value (list of str)
+        """
+
+        closed_scales = []
+        for scale in self.scales:
+            bucket_start = get_bucket_start(timestamp, scale)
+            current_start = self.bucket_starts[scale]
+            if current_start is not None and bucket_start < current_start:
+                raise ValueError(
+                    f"Timestamp {timestamp} is earlier than the current {scale} bucket {current_start}"
+                )
+
+            if current_start is not None and bucket_start > current_start:
+                self.latest_bucket_starts[scale] = current_start
+                self.latest_averages[scale] = self.sums[scale] / self.counters[scale]
+                self.latest_averages_err[scale] = (
+                    self.sums_err[scale] / self.counters[scale]
+                )
+                self.sums[scale] = 0
+                self.sums_err[scale] = 0
+                self.counters[scale] = 0
+                closed_scales.append(scale)
+
+            self.bucket_starts[scale] = bucket_start
+            self.sums[scale] += x
+            self.sums_err[scale] += err
+            self.counters[scale] += 1
+
+        return closed_scales
+
+    def get_current_average(self, scale: str) -> (float, float):
+        """
+        Average of the values received so far in the open bucket of a scale
+
+        Returns (average (float), average uncertainty (float)), NaN before the first value
+        """
+
+        if self.counters[scale] == 0:
+            return float("nan"), float("nan")
+        return (
+            self.sums[scale] / self.counters[scale],
+            self.sums_err[scale] / self.counters[scale],
+        )
+
+    def get_latest_average(self, scale: str) -> (float, float):
+        """
+        Average of the latest closed bucket of a scale
+
+        Returns (average (float), average uncertainty (float)), 0 before the first bucket is closed
+        """
+
+        return self.latest_averages[scale], self.latest_averages_err[scale]
+
+
+class RLSCalendarAverage:
+    """
+    Implements RLS-based upscaling of estimates to calendar buckets (timestamped counterpart of RLSDailyAverage)
+
+    The averages of the latest closed bucket are in latest_daily_average and latest_daily_average_err
+    (named after RLSDailyAverage, for buckets of any scale), and the RLS model relating them to the data
+    of the source is initialised when the first bucket is closed.
+
+    :param scale: temporal scale of the buckets (str, "daily" or "weekly")
+    :param P_init: initial state matrix of the RLS model as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of the RLS model (constant and coefficient)
+    """
+
+    # Class of the RLS model, e.g. PureRLS for scalar models with the numpy backend (see AssimilationStep)
+    model_class: type = RLS
+
+    def __init__(
+        self,
+        scale: str = "daily",
+        P_init: float = 1.0,
+        w_init: Sequence[float] = (0.0, 0.0),
+    ):
+        self.scale: str = scale
+        self.P_init: float = P_init
+        self.w_init: Sequence[float] = w_init
+        self.aggregate: CalendarAggregate = CalendarAggregate([scale])
+        self.latest_daily_average: float = 0
+        self.latest_daily_average_err: float = 0
+        self.r_model: Optional[RLS] = None
+
+    def update(self, x_new: float, x_new_err: float, timestamp: Optional[datetime]):
+        if timestamp is None:
+            raise ValueError("Timestamps are required for calendar averages")
+
+        if self.aggregate.update(timestamp, x_new, x_new_err):
+            if self.r_model is None:
+                self.r_model = self.model_class(self.P_init, self.w_init)
+
+            (
+                self.latest_daily_average,
+                self.latest_daily_average_err,
+            ) = self.aggregate.get_latest_average(self.scale)
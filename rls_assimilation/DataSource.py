@@ -1,15 +1,31 @@
-from typing import List, Optional
-import numpy as np
+from __future__ import annotations
 
-from rls_assimilation.RLS import RLS
+import copy
+import math
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Sequence, Union
+
+from rls_assimilation.Backend import RLS, absolute, isnan
+from rls_assimilation.CalendarAverage import RLSCalendarAverage, is_finer
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class RLSDailyAverage:
     """
     Implements RLS-based daily average upscaling of hourly estimates
+
+    :param P_init: initial state matrix of the RLS model as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of the RLS model (constant and coefficient)
     """
 
-    def __init__(self):
+    # Class of the RLS model, e.g. PureRLS for scalar models with the numpy backend (see AssimilationStep)
+    model_class: type = RLS
+
+    def __init__(self, P_init: float = 1.0, w_init: Sequence[float] = (0.0, 0.0)):
+        self.P_init: float = P_init
+        self.w_init: Sequence[float] = w_init
         self.current_average: float = 0
         self.current_average_err: float = 0
         self.latest_daily_average: float = 0
@@ -22,10 +38,16 @@ class RLSDailyAverage:
         self.current_average = 0
         self.current_average_err = 0
 
-    def update(self, x_new_hourly: float, x_new_hourly_err: float):
+    def update(
+        self,
+        x_new_hourly: float,
+        x_new_hourly_err: float,
+        timestamp: Optional[datetime] = None,
+    ):
+        # The timestamp is not used: a day is closed after 24 values (see RLSCalendarAverage)
         if self.counter == 24:
             if self.r_model is None:
-                self.r_model = RLS()
+                self.r_model = self.model_class(self.P_init, self.w_init)
 
             self.latest_daily_average = self.current_average
             self.latest_daily_average_err = self.current_average_err
@@ -37,13 +59,52 @@ class RLSDailyAverage:
         prev_sum_err = self.current_average_err * (self.counter - 1)
         self.current_average_err = (prev_sum_err + x_new_hourly_err) / self.counter
 
+    def update_many(self, x_new_hourly: np.ndarray, x_new_hourly_err: np.ndarray):
+        """
+        The same as calling update for each value, summing whole days at once
+
+        :param x_new_hourly: hourly data values (numpy array)
+        :param x_new_hourly_err: hourly uncertainties (numpy array)
+        """
+        import numpy as np
+
+        start = 0
+        while start < len(x_new_hourly):
+            if self.counter == 24:
+                if self.r_model is None:
+                    self.r_model = self.model_class(self.P_init, self.w_init)
+
+                self.latest_daily_average = self.current_average
+                self.latest_daily_average_err = self.current_average_err
+                self.daily_reset()
+
+            end = min(start + 24 - self.counter, len(x_new_hourly))
+            prev_counter = self.counter
+            self.counter += end - start
+            self.current_average = (
+                self.current_average * prev_counter + np.sum(x_new_hourly[start:end])
+            ) / self.counter
+            self.current_average_err = (
+                self.current_average_err * prev_counter
+                + np.sum(x_new_hourly_err[start:end])
+            ) / self.counter
+            start = end
+
 
 class DataSourceAR1:
     """
     Implements AR(1) model of a data source
+
+    :param P_init: initial state matrix of the RLS models as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of the RLS models (constant and coefficient)
     """
 
-    def __init__(self):
+    # Class of the RLS models, e.g. PureRLS for scalar models with the numpy backend (see AssimilationStep)
+    model_class: type = RLS
+
+    def __init__(self, P_init: float = 1.0, w_init: Sequence[float] = (0.0, 0.0)):
+        self.P_init: float = P_init
+        self.w_init: Sequence[float] = w_init
         self.ar_model: Optional[RLS] = None  # AR(1) model
         # stored for plotting
         self.x_all = []  # raw values
@@ -59,7 +120,7 @@ class DataSourceAR1:
         """
 
         if not self.ar_model:
-            if np.isnan(x_past):
+            if isnan(x_past):
                 return 0
             else:
                 return x_past
@@ -78,14 +139,15 @@ class DataSourceAR1:
         t = len(self.x_all)  # the number of acquired data points
 
         # Run AR(1) estimation
-        x_past = self.x_corr_all[-1] if t > 1 else np.nan
-        if np.isnan(x_new):
+        x_past = self.x_corr_all[-1] if t > 1 else math.nan
+        if isnan(x_new):
             x_corr = self.impute(x_past)  # impute (predict) if missing
         else:
             x_corr = x_new
-            if not np.isnan(x_past):
+            if not isnan(x_past):
                 if not self.ar_model:
-                    self.ar_model = RLS()  # initialise when data gets available
+                    # initialise when data gets available
+                    self.ar_model = self.model_class(self.P_init, self.w_init)
 
                 self.ar_model.update(x_past, x_corr)
 
@@ -97,18 +159,148 @@ class DataSourceAR1:
 
         return x_corr, err
 
+    def estimate_many(self, x_new: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Runs AR(1) uncertainty estimation for a series of values (the same as calling estimate for each value)
+
+        A run of k equal values (e.g. forward-filled daily values) updates the AR(1) model k - 1 times
+        with the same input and output, which is done at once (RLS.update_repeated).
+
+        :param: x_new - the latest values from the data source (array-like of floats, NaN if missing)
+        Returns: (x_corr - imputed or raw data values (numpy array), err - AR(1) uncertainties of x_corr (numpy array))
+        """
+        import numpy as np
+
+        x_new = np.asarray(x_new, dtype=float)
+        n_steps = len(x_new)
+        x_corr = np.empty(n_steps)
+        err = np.empty(n_steps)
+
+        # Starts of runs of equal values (every missing value is a run of its own, as NaN != NaN)
+        run_starts = np.flatnonzero(np.r_[True, x_new[1:] != x_new[:-1]])
+        run_ends = np.r_[run_starts[1:], n_steps]
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            x_corr[start], err[start] = self.estimate(x_new[start])
+            n_repeats = end - start - 1
+            if n_repeats == 0:
+                continue
+
+            # Within the run the past value equals the new one
+            x = x_new[start]
+            if not self.ar_model:
+                self.ar_model = self.model_class(self.P_init, self.w_init)
+            errors = self.ar_model.update_repeated(x, x, n_repeats)
+            x_corr[start + 1 : end] = x
+            err[start + 1 : end] = errors
+
+            self.x_all.extend([x] * n_repeats)
+            self.x_corr_all.extend([x] * n_repeats)
+            self.ar_errors.extend(errors)
+
+        return x_corr, err
+
+    def load_estimation(self, other: "DataSourceAR1"):
+        """
+        Take over the AR(1) estimation results of another source run on the same data
+
+        :param: other - the source the estimation is copied from (DataSourceAR1)
+        """
+
+        self.ar_model = copy.deepcopy(other.ar_model)
+        self.x_all = list(other.x_all)
+        self.x_corr_all = list(other.x_corr_all)
+        self.ar_errors = list(other.ar_errors)
+
+    def get_forecast_state(self) -> (np.ndarray, float, bool, float, float):
+        """
+        State the AR(1) forecast starts from (see Forecast.forecast_streams), needs numpy
+
+        Returns (w - weights of the AR(1) model (numpy array), model_error - its latest error (float),
+        has_model - the model is initialised (bool), x - the latest value (float), err - its uncertainty (float))
+        """
+        from rls_assimilation.Forecast import get_model_state
+
+        x_past = self.x_corr_all[-1] if len(self.x_all) > 0 else math.nan
+        w, model_error, has_model = get_model_state(self.ar_model)
+        # Without a model the imputed value persists
+        x = x_past if has_model else self.impute(x_past)
+        err = self.ar_errors[-1] if len(self.ar_errors) > 0 else 0
+        return w, model_error, has_model, x, err
+
+    def forecast(self, n_steps: int) -> (np.ndarray, np.ndarray):
+        """
+        Forecasts the data source n_steps ahead with the AR(1) model, with the propagated uncertainty
+        (the state is not changed; see Forecast.forecast_trajectory)
+
+        :param: n_steps - the number of steps ahead (int)
+        Returns: (mean - forecast values (numpy array), err - uncertainties of the forecast values (numpy array))
+        """
+        from rls_assimilation.Forecast import forecast_streams
+
+        mean, err = forecast_streams([self], n_steps)
+        return mean[:, 0], err[:, 0]
+
+    def trim_history(self):
+        """
+        Drop the values stored for plotting, except the latest ones the estimation continues from
+        (bounds the memory of long runs)
+        """
+
+        del self.x_all[:-1]
+        del self.x_corr_all[:-1]
+        del self.ar_errors[:-1]
+
+    def fast_forward(self, n_steps: int) -> (np.ndarray, np.ndarray):
+        """
+        Runs AR(1) uncertainty estimation over a gap of n_steps missing values in closed form
+        (the same as calling estimate(np.nan) n_steps times)
+
+        The AR(1) model is not updated during a gap, so the imputed values form a geometric sequence
+        and the uncertainty stays constant.
+
+        :param: n_steps - the number of missing data points (int)
+        Returns: (x_corr - imputed data values (numpy array), err - AR(1) uncertainties of x_corr (numpy array))
+        """
+        import numpy as np
+
+        x_past = self.x_corr_all[-1] if len(self.x_all) > 0 else np.nan
+        if self.ar_model:
+            x_corr = self.ar_model.predict_ahead(x_past, n_steps)
+        else:
+            x_corr = np.full(n_steps, self.impute(x_past), dtype=float)
+        err = np.full(n_steps, self.ar_model.error if self.ar_model else 0, dtype=float)
+
+        self.x_all.extend([np.nan] * n_steps)
+        self.x_corr_all.extend(x_corr.tolist())
+        self.ar_errors.extend(err.tolist())
+
+        return x_corr, err
+
 
 class DataSource(DataSourceAR1):
     """
     Implements AR(1) and R(1) algorithms
     """
 
-    def __init__(self, t_in: str, t_out: str, s_in: str, s_out: str):
+    def __init__(
+        self,
+        t_in: str,
+        t_out: str,
+        s_in: str,
+        s_out: str,
+        t_aggregate: Optional[str] = None,
+        P_init: float = 1.0,
+        w_init: Sequence[float] = (0.0, 0.0),
+    ):
         """
-        :param t_in: input temporal scale (str, "hourly" or "daily")
-        :param t_out: output temporal scale (str, "hourly" or "daily")
+        :param t_in: input temporal scale (str, "hourly" or "daily"; also "weekly" with t_aggregate)
+        :param t_out: output temporal scale (str, "hourly" or "daily"; also "weekly" with t_aggregate)
         :param s_in: input spatial scale (str)
         :param s_out: output spatial scale (str)
+        :param t_aggregate: temporal scale of calendar averages of timestamped data (str or None - averages
+        of 24 hourly values)
+        :param P_init: initial state matrix of all RLS models as a multiple of the identity (float, see RLS)
+        :param w_init: initial weights of all RLS models (constant and coefficient)
         """
 
         # resolutions
@@ -118,18 +310,31 @@ class DataSource(DataSourceAR1):
         self.s_out: str = s_out
 
         # models
-        DataSourceAR1.__init__(self)
-        self.temporal_model: Optional[RLSDailyAverage] = (
-            RLSDailyAverage() if t_in == "hourly" else None
-        )
+        DataSourceAR1.__init__(self, P_init, w_init)
+        self.temporal_model: Optional[Union[RLSDailyAverage, RLSCalendarAverage]]
+        if t_aggregate is None:
+            self.temporal_model = (
+                RLSDailyAverage(P_init, w_init) if t_in == "hourly" else None
+            )
+        else:
+            self.temporal_model = (
+                RLSCalendarAverage(t_aggregate, P_init, w_init)
+                if is_finer(t_in, t_aggregate)
+                else None
+            )
         self.spatial_r_model: Optional[RLS] = (
-            RLS() if s_in != s_out else None
+            self.model_class(P_init, w_init) if s_in != s_out else None
         )  # R(1) model
 
         # stored for plotting
         self.x_calibrated_all = []  # R(1) model predictions
         self.r_errors = []  # R(1) modelling errors
 
+    def trim_history(self):
+        DataSourceAR1.trim_history(self)
+        del self.x_calibrated_all[:-1]
+        del self.r_errors[:-1]
+
     def has_daily_average(self) -> bool:
         return self.temporal_model is not None
 
@@ -161,7 +366,7 @@ class DataSource(DataSourceAR1):
 
     def upscale(self) -> (float, float):
         """
-        Upscale the data of this source (get daily from hourly)
+        Upscale the data of this source (get daily from hourly, or to the scale of t_aggregate for timestamped data)
 
         Returns (upscaled data value (float), upscaled uncertainty (float))
         """
@@ -180,6 +385,7 @@ class DataSource(DataSourceAR1):
         """
         Downscale the data of the second source (get an hourly estimate from a daily one)
         using the relationship between hourly and daily of this source
+        (for timestamped data, between the scale of this source and its calendar averages)
 
         :param: x_hourly - hourly data value of this source (float)
         :param: other_x_daily - daily data value of the other source (float)
@@ -200,8 +406,8 @@ class DataSource(DataSourceAR1):
         sign_factor = -1 if other_err_daily < 0 else 1
         if self.temporal_model.r_model:
             other_err_hourly = float(
-                np.abs(self.temporal_model.r_model.w[1]) * other_err_daily
-            ) + sign_factor * np.abs(self.temporal_model.r_model.error)
+                absolute(self.temporal_model.r_model.w[1]) * other_err_daily
+            ) + sign_factor * absolute(self.temporal_model.r_model.error)
         else:
             other_err_hourly = other_err_daily
 
@@ -226,9 +432,9 @@ class DataSource(DataSourceAR1):
         x_calibrated = self.spatial_r_model.predict(x_corr)
         self.x_calibrated_all.append(x_calibrated)
         sign_factor = -1 if err < 0 else 1
-        r_err = float(np.abs(self.spatial_r_model.w[1]) * err) + sign_factor * np.abs(
-            self.spatial_r_model.error
-        )
+        r_err = float(
+            absolute(self.spatial_r_model.w[1]) * err
+        ) + sign_factor * absolute(self.spatial_r_model.error)
         self.r_errors.append(r_err)
 
         # Step 2: Update
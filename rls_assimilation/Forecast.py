@@ -0,0 +1,76 @@
+from typing import Sequence, Tuple
+import numpy as np
+
+from rls_assimilation.BatchRLS import iterate_linear, predict_trajectory
+
+
+def forecast_trajectory(
+    w: np.ndarray,
+    model_error: np.ndarray,
+    has_model: np.ndarray,
+    x: np.ndarray,
+    err: np.ndarray,
+    n_steps: int,
+) -> (np.ndarray, np.ndarray):
+    """
+    Forecast AR(1) models n_steps ahead with the propagated uncertainty, for all models at once
+
+    The mean follows the iterated predictions (see predict_trajectory) and the uncertainty the recursion
+    err_k = |w1| * err_(k-1) + |model error| (as in SequentialRLSAssimilationOneSource), both in closed form.
+    Without a model the latest value and its uncertainty persist.
+
+    :param w: weights of the models (numpy array, shape (..., 2))
+    :param model_error: the latest errors of the models (numpy array, shape w.shape[:-1])
+    :param has_model: the models are initialised (numpy bool array, shape w.shape[:-1])
+    :param x: the latest values (numpy array, shape w.shape[:-1])
+    :param err: uncertainties of the latest values (numpy array, shape w.shape[:-1])
+    :param n_steps: number of steps ahead (int)
+    Returns (mean - forecast values (numpy array, shape (n_steps, ...)),
+    err - forecast uncertainties (numpy array, shape (n_steps, ...)))
+    """
+
+    x = np.asarray(x, dtype=w.dtype)
+    err = np.asarray(err, dtype=w.dtype)
+    mean = np.where(has_model, predict_trajectory(w, x, n_steps), x)
+    forecast_err = np.where(
+        has_model,
+        iterate_linear(np.abs(model_error), np.abs(w[..., 1]), err, n_steps),
+        err,
+    )
+
+    return mean, forecast_err
+
+
+def forecast_streams(streams: Sequence, n_steps: int) -> (np.ndarray, np.ndarray):
+    """
+    Forecast the AR(1) models of many streams n_steps ahead in one vectorised computation
+
+    :param streams: data sources or sequential assimilators (sequence of objects with get_forecast_state,
+    e.g. DataSourceAR1, DataSource or SequentialRLSAssimilationOneSource)
+    :param n_steps: number of steps ahead (int)
+    Returns (mean - forecast values (numpy array, shape (n_steps, len(streams))),
+    err - forecast uncertainties (numpy array, shape (n_steps, len(streams))))
+    """
+
+    states = [stream.get_forecast_state() for stream in streams]
+    w, model_error, has_model, x, err = (
+        np.array(values, dtype=dtype)
+        for values, dtype in zip(
+            zip(*states) if states else [[]] * 5,
+            [float, float, bool, float, float],
+        )
+    )
+
+    return forecast_trajectory(
+        w.reshape(len(states), 2), model_error, has_model, x, err, n_steps
+    )
+
+
+def get_model_state(ar_model) -> Tuple[np.ndarray, float, bool]:
+    """
+    Weights, error and whether the model is initialised of an RLS model or None (see get_forecast_state)
+    """
+
+    if ar_model is None:
+        return np.zeros(2), 0.0, False
+    return np.ravel(np.asarray(ar_model.w, dtype=float)), float(ar_model.error), True
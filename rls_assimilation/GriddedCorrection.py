@@ -0,0 +1,283 @@
+from typing import Optional, Sequence
+import numpy as np
+
+from rls_assimilation.Forecast import get_model_state
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def get_central_angles(
+    lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray
+) -> np.ndarray:
+    """
+    Great-circle distances between points as central angles (haversine formula)
+
+    :param lat1: latitudes of the first points in degrees (numpy array)
+    :param lon1: longitudes of the first points in degrees (numpy array)
+    :param lat2: latitudes of the second points in degrees (numpy array broadcastable to lat1)
+    :param lon2: longitudes of the second points in degrees (numpy array broadcastable to lon1)
+    :return: central angles in degrees (numpy array)
+    """
+
+    lat1, lon1, lat2, lon2 = (np.radians(values) for values in (lat1, lon1, lat2, lon2))
+    h = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return np.degrees(2 * np.arcsin(np.sqrt(np.minimum(h, 1))))
+
+
+def get_unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Points on the unit sphere, whose dot products are the cosines of the central angles between them
+
+    :param lats: latitudes in degrees (numpy array)
+    :param lons: longitudes in degrees (numpy array broadcastable to lats)
+    :return: unit vectors (numpy array, shape (..., 3))
+    """
+
+    lats, lons = np.radians(lats), np.radians(lons)
+    return np.stack(
+        np.broadcast_arrays(
+            np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)
+        ),
+        axis=-1,
+    )
+
+
+class StationIndex:
+    """
+    Spatial index of stations for nearest-neighbour queries of whole rows (equal latitude) of a lat x lon grid
+
+    The stations are sorted by latitude. The distance to a station is at least the difference of latitudes,
+    so only the stations in a band of latitudes around the row are candidates; the band is widened until
+    it contains the k nearest stations of every cell of the row, which makes the queries exact.
+    Candidates are ranked by the dot products of unit vectors (one matrix product per row),
+    and the haversine formula is only evaluated for the neighbours found.
+
+    :param lats: latitudes of the stations in degrees (array-like)
+    :param lons: longitudes of the stations in degrees (array-like)
+    """
+
+    def __init__(self, lats: Sequence[float], lons: Sequence[float]):
+        lats = np.asarray(lats, dtype=float)
+        self.order: np.ndarray = np.argsort(lats, kind="stable")
+        self.lats: np.ndarray = lats[self.order]
+        self.lons: np.ndarray = np.asarray(lons, dtype=float)[self.order]
+        self.vectors: np.ndarray = get_unit_vectors(self.lats, self.lons)
+
+    def query_row(
+        self,
+        lat: float,
+        lons: np.ndarray,
+        k: int,
+        max_angle: Optional[float] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        The k nearest stations of the cells of a grid row
+
+        :param lat: latitude of the row in degrees (float)
+        :param lons: longitudes of the cells in degrees (numpy array)
+        :param k: number of neighbours (int)
+        :param max_angle: only stations within this central angle in degrees are neighbours (float or None - any)
+        Returns (angles - central angles to the neighbours in degrees, nearest first, inf if there are fewer than k
+        (numpy array, shape (len(lons), k)), indices - the neighbours, -1 if missing (numpy array, same shape))
+        """
+
+        lons = np.asarray(lons, dtype=float)
+        cell_vectors = get_unit_vectors(lat, lons)
+        n_stations = len(self.lats)
+        # Half-width of the band of candidate latitudes
+        band = max_angle if max_angle is not None else 1.0
+        while True:
+            start, end = np.searchsorted(self.lats, [lat - band, lat + band])
+            n_candidates = end - start
+            is_complete = n_candidates == n_stations or max_angle is not None
+            if n_candidates < k and not is_complete:
+                band *= 2
+                continue
+
+            # Minus cosines of the central angles, ascending with the distance
+            keys = -(cell_vectors @ self.vectors[start:end].T)
+            if n_candidates > k:
+                nearest = np.argpartition(keys, k - 1, axis=-1)[:, :k]
+                keys = np.take_along_axis(keys, nearest, axis=-1)
+            else:
+                nearest = np.broadcast_to(np.arange(n_candidates), keys.shape)
+
+            # Stations outside the band are farther than the band half-width
+            # (compared with a margin for the rounding of the cosines)
+            if is_complete or n_candidates == 0:
+                break
+            farthest = np.degrees(np.arccos(np.clip(-keys.max(), -1, 1)))
+            if farthest + 1e-6 <= band:
+                break
+            band = farthest + 1e-6
+
+        by_distance = np.argsort(keys, axis=-1, kind="stable")
+        nearest = np.take_along_axis(nearest, by_distance, axis=-1)
+        angles = get_central_angles(
+            lat, lons[:, None], self.lats[start + nearest], self.lons[start + nearest]
+        )
+        indices = self.order[start + nearest]
+        if max_angle is not None:
+            is_far = angles > max_angle
+            angles[is_far] = np.inf
+            indices[is_far] = -1
+
+        # Pad to k neighbours
+        n_missing = k - angles.shape[-1]
+        angles = np.pad(angles, ((0, 0), (0, n_missing)), constant_values=np.inf)
+        indices = np.pad(indices, ((0, 0), (0, n_missing)), constant_values=-1)
+        return angles, indices
+
+
+class GriddedCorrection:
+    """
+    Correction of gridded model fields (e.g. SILAM) with the R(1) calibration models of stations
+
+    DataSource.calibrate learns a linear map from the model to the station values at each station.
+    The weights and errors of these maps are spread over the grid by nearest-station or inverse-distance
+    weighting and applied to every cell. The neighbours of the cells and their weights are found once
+    with a spatial index (StationIndex), so a field is corrected with a few vectorised operations per timestep.
+
+    Cells without a station within max_distance keep the model values, with NaN uncertainty.
+
+    :param station_lats: latitudes of the stations in degrees (array-like)
+    :param station_lons: longitudes of the stations in degrees (array-like)
+    :param grid_lats: latitudes of the grid rows in degrees (array-like)
+    :param grid_lons: longitudes of the grid columns in degrees (array-like)
+    :param method: "nearest" - the map of the nearest station, or "idw" - inverse-distance weighted maps
+    of the k nearest stations (str)
+    :param k: number of stations per cell for "idw" (int)
+    :param power: power of the inverse distances for "idw" (float)
+    :param max_distance: only stations within this distance in km are used (float or None - any distance)
+    """
+
+    def __init__(
+        self,
+        station_lats: Sequence[float],
+        station_lons: Sequence[float],
+        grid_lats: Sequence[float],
+        grid_lons: Sequence[float],
+        method: str = "idw",
+        k: int = 4,
+        power: float = 2,
+        max_distance: Optional[float] = None,
+    ):
+        if method not in ["nearest", "idw"]:
+            raise NotImplementedError(
+                f'Method {method} is not supported. Supported methods are "nearest" and "idw".'
+            )
+
+        self.method: str = method
+        self.k: int = 1 if method == "nearest" else k
+        self.n_stations: int = len(station_lats)
+        grid_lats = np.asarray(grid_lats, dtype=float)
+        grid_lons = np.asarray(grid_lons, dtype=float)
+        max_angle = (
+            np.degrees(max_distance / EARTH_RADIUS_KM)
+            if max_distance is not None
+            else None
+        )
+
+        # Neighbours of the cells (n_lat, n_lon, k), found row by row
+        index = StationIndex(station_lats, station_lons)
+        angles = np.empty((len(grid_lats), len(grid_lons), self.k))
+        indices = np.empty(angles.shape, dtype=np.intp)
+        for i, lat in enumerate(grid_lats):
+            angles[i], indices[i] = index.query_row(lat, grid_lons, self.k, max_angle)
+
+        # Interpolation weights of the neighbours, summing up to 1 in the cells with stations
+        is_neighbour = indices >= 0
+        with np.errstate(divide="ignore"):
+            inverse_distances = np.where(is_neighbour, angles ** (-power), 0)
+        is_exact = is_neighbour & (angles == 0)
+        has_exact = is_exact.any(axis=-1, keepdims=True)
+        inverse_distances = np.where(has_exact, is_exact, inverse_distances)
+        total = inverse_distances.sum(axis=-1, keepdims=True)
+        weights = np.divide(
+            inverse_distances, total, out=np.zeros_like(angles), where=total > 0
+        )
+        self.has_station: np.ndarray = total[..., 0] > 0  # (n_lat, n_lon)
+        # Missing neighbours point to the identity map appended after the stations
+        weights[..., 0] = np.where(self.has_station, weights[..., 0], 1)
+        indices = np.where(is_neighbour, indices, self.n_stations)
+
+        # Neighbour-major layout, (k, n_lat, n_lon): each neighbour is gathered from contiguous memory
+        self.weights: np.ndarray = np.ascontiguousarray(np.moveaxis(weights, -1, 0))
+        self.indices: np.ndarray = np.ascontiguousarray(np.moveaxis(indices, -1, 0))
+
+    def spread(self, w: np.ndarray, error: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Interpolate the maps of the stations to the grid
+
+        A station whose weights are all zero has no map yet and counts as the identity (see RLS.predict).
+
+        :param w: weights of the station maps (numpy array, shape (n_stations, 2))
+        :param error: the latest errors of the station maps (numpy array, shape (n_stations,))
+        Returns (w - weights of the cell maps (numpy array, shape (n_lat, n_lon, 2)),
+        error - errors of the cell maps (numpy array, shape (n_lat, n_lon)))
+        """
+
+        w = np.asarray(w, dtype=float).reshape(self.n_stations, 2)
+        all_zeros = (w[:, 0] == 0) & (w[:, 1] == 0)
+        w0 = np.append(np.where(all_zeros, 0, w[:, 0]), 0)
+        w1 = np.append(np.where(all_zeros, 1, w[:, 1]), 1)
+        error = np.append(np.where(all_zeros, 0, np.abs(error)), 0)
+
+        cell_w0, cell_w1, cell_error = (
+            np.zeros(self.has_station.shape) for _ in range(3)
+        )
+        for weights, indices in zip(self.weights, self.indices):
+            cell_w0 += weights * w0.take(indices)
+            cell_w1 += weights * w1.take(indices)
+            cell_error += weights * error.take(indices)
+        return np.stack([cell_w0, cell_w1], axis=-1), cell_error
+
+    def correct(
+        self,
+        field: np.ndarray,
+        w: np.ndarray,
+        error: np.ndarray,
+        err_field: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Correct model fields with the maps of the stations
+
+        :param field: model values (numpy array, shape (..., n_lat, n_lon), e.g. a timestep or a stack of them)
+        :param w: weights of the station maps (numpy array, shape (n_stations, 2))
+        :param error: the latest errors of the station maps (numpy array, shape (n_stations,))
+        :param err_field: uncertainties of the model values (numpy array broadcastable to field or None - unknown)
+        Returns (corrected - corrected values (numpy array, shape of field),
+        err - uncertainties of the corrected values, propagated as in DataSource.calibrate,
+        NaN without stations (numpy array, shape of field))
+        """
+
+        cell_w, cell_error = self.spread(w, error)
+        cell_w0, cell_w1 = cell_w[..., 0], cell_w[..., 1]
+        corrected = cell_w0 + cell_w1 * field
+        err = (
+            cell_error
+            if err_field is None
+            else np.abs(cell_w1) * err_field + cell_error
+        )
+        err = np.where(
+            self.has_station, err, np.nan if err_field is None else err_field
+        )
+        return corrected, np.broadcast_to(err, corrected.shape)
+
+
+def get_calibration_models(sources: Sequence) -> (np.ndarray, np.ndarray):
+    """
+    Weights and errors of the R(1) calibration models of data sources (see GriddedCorrection.correct)
+
+    :param sources: calibrated data sources, one per station (sequence of DataSource)
+    Returns (w - weights (numpy array, shape (n_stations, 2)), error - errors (numpy array, shape (n_stations,)))
+    """
+
+    states = [get_model_state(source.spatial_r_model)[:2] for source in sources]
+    if not states:
+        return np.zeros((0, 2)), np.zeros(0)
+    w, error = zip(*states)
+    return np.array(w), np.array(error)
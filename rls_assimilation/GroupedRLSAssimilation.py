@@ -0,0 +1,181 @@
+import copy
+from typing import Hashable, List, Optional, Sequence
+import numpy as np
+from numpy.typing import DTypeLike
+
+from rls_assimilation.BatchDataSource import BatchDataSource
+from rls_assimilation.BatchRLS import BatchRLS
+from rls_assimilation.MultiSourceRLSAssimilation import MultiSourceRLSAssimilation
+
+
+def _get_source_range(is_selected: np.ndarray) -> slice:
+    # The smallest range of sources covering the selected ones
+    selected = np.flatnonzero(is_selected)
+    return slice(selected[0], selected[-1] + 1) if len(selected) else slice(0, 0)
+
+
+def _select_sources(model, sources: slice):
+    # A model of the same class whose state is a view of a range of sources (the second axis) of the model
+    view = copy.copy(model)
+    for name, value in vars(model).items():
+        if isinstance(value, np.ndarray):
+            setattr(view, name, value[:, sources])
+        elif isinstance(value, BatchRLS):
+            setattr(view, name, _select_sources(value, sources))
+    return view
+
+
+class GroupedRLSAssimilation(MultiSourceRLSAssimilation):
+    """
+    Least-squares assimilation of K data sources for a bank of streams, some of which share the series of a source
+    (e.g. stations in the same SILAM grid cell share the model series)
+
+    The streams of a shared source are grouped by their source keys. AR(1) uncertainty estimation of the source
+    runs once per group and is broadcast to the streams of the group. If the source is in s_out (not calibrated),
+    its daily averages are also computed once per group. Calibration, downscaling and weighting stay per stream,
+    so the results are those of MultiSourceRLSAssimilation.
+
+    The streams of a group must receive the same values of the shared source; the values of the first stream
+    of each group are used, and so are its initial states of the models of the shared source.
+
+    :param t_ins: temporal scales of the sources (list of str, "hourly" or "daily")
+    :param s_ins: spatial scales of the sources (list of str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param source_keys: per source, the keys of its series for every stream, e.g. the grid cells of the stations
+    (list of sequences of hashable), or None if every stream has its own series
+    :param dtype: floating point type of the state and the results (numpy dtype, float64 or float32)
+    :param P_init: initial state matrices of all RLS models as multiples of the identity (float, or numpy array
+    broadcastable to (n_streams, K) for a value per stream and source; see MultiSourceRLSAssimilation)
+    :param w_init: initial weights of all RLS models (numpy array broadcastable to (n_streams, K, 2))
+    """
+
+    def __init__(
+        self,
+        t_ins: List[str],
+        s_ins: List[str],
+        t_out: str,
+        s_out: str,
+        source_keys: List[Optional[Sequence[Hashable]]],
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        stream_counts = {len(keys) for keys in source_keys if keys is not None}
+        if len(source_keys) != len(t_ins) or len(stream_counts) != 1:
+            raise ValueError(
+                "Source keys must be given for every source, with keys of the same number of streams "
+                "for at least one source"
+            )
+        (n_streams,) = stream_counts
+        MultiSourceRLSAssimilation.__init__(
+            self,
+            t_ins,
+            s_ins,
+            t_out,
+            s_out,
+            shape=(n_streams,),
+            dtype=dtype,
+            P_init=P_init,
+            w_init=w_init,
+        )
+
+        self.is_shared = np.array([keys is not None for keys in source_keys])
+        # Shared sources whose daily averages are computed per group
+        self.is_shared_daily_average = (
+            self.is_shared & self.is_hourly & ~self.is_calibrated
+        )
+        # Estimation and daily averages of the other sources run on views of the per-stream state
+        # (sources in the range that are shared are estimated, but their estimates are replaced)
+        self.own_sources: slice = _get_source_range(~self.is_shared)
+        self.own_estimator: BatchDataSource = _select_sources(
+            self.sources, self.own_sources
+        )
+        is_own_daily_average = self.is_hourly & ~self.is_shared_daily_average
+        self.own_daily_averages: slice = _get_source_range(is_own_daily_average)
+        self.own_daily_averages_mask: np.ndarray = is_own_daily_average[
+            self.own_daily_averages
+        ]
+        self.own_temporal_model = _select_sources(
+            self.sources.temporal_model, self.own_daily_averages
+        )
+
+        # Per shared source: the first stream of each group, the group of each stream and the group estimator
+        # (initialised as the first stream of each group)
+        P_init = np.broadcast_to(P_init, (n_streams, len(t_ins)))
+        w_init = np.broadcast_to(w_init, (n_streams, len(t_ins), 2))
+        self.shared_sources: List[int] = np.flatnonzero(self.is_shared).tolist()
+        self.group_first_streams: List[np.ndarray] = []
+        self.stream_groups: List[np.ndarray] = []
+        self.group_estimators: List[BatchDataSource] = []
+        for source in self.shared_sources:
+            group_ids = {}
+            stream_groups = np.array(
+                [
+                    group_ids.setdefault(key, len(group_ids))
+                    for key in source_keys[source]
+                ]
+            )
+            self.stream_groups.append(stream_groups)
+            first_streams = np.unique(stream_groups, return_index=True)[1]
+            self.group_first_streams.append(first_streams)
+            self.group_estimators.append(
+                BatchDataSource(
+                    (len(group_ids),),
+                    self.dtype,
+                    P_init[first_streams, source],
+                    w_init[first_streams, source],
+                )
+            )
+
+    def _estimate(self, obs: np.ndarray) -> (np.ndarray, np.ndarray):
+        shape = (*self.shape, len(self.t_ins))
+        obs = np.broadcast_to(np.asarray(obs, dtype=self.dtype), shape)
+        x = np.empty(shape, dtype=self.dtype)
+        err = np.empty(shape, dtype=self.dtype)
+
+        x[:, self.own_sources], err[:, self.own_sources] = self.own_estimator.estimate(
+            obs[:, self.own_sources]
+        )
+        for source, first_streams, stream_groups, estimator in zip(
+            self.shared_sources,
+            self.group_first_streams,
+            self.stream_groups,
+            self.group_estimators,
+        ):
+            x_group, err_group = estimator.estimate(obs[first_streams, source])
+            x[:, source] = x_group[stream_groups]
+            err[:, source] = err_group[stream_groups]
+
+        return x, err
+
+    def _update_daily_averages(self, x: np.ndarray, err: np.ndarray):
+        self.own_temporal_model.update(
+            x[:, self.own_daily_averages],
+            err[:, self.own_daily_averages],
+            mask=self.own_daily_averages_mask,
+        )
+
+        temporal_model = self.sources.temporal_model
+        for source, first_streams, stream_groups, estimator in zip(
+            self.shared_sources,
+            self.group_first_streams,
+            self.stream_groups,
+            self.group_estimators,
+        ):
+            if not self.is_shared_daily_average[source]:
+                continue
+
+            group_model = estimator.temporal_model
+            is_day_closed = (group_model.counter == 24).any()
+            group_model.update(x[first_streams, source], err[first_streams, source])
+            # Only the closed days are read per stream (upscaling and downscaling)
+            if is_day_closed:
+                for name in [
+                    "latest_daily_average",
+                    "latest_daily_average_err",
+                    "has_r_model",
+                ]:
+                    getattr(temporal_model, name)[:, source] = getattr(
+                        group_model, name
+                    )[stream_groups]
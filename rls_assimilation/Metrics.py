@@ -0,0 +1,275 @@
+import math
+from typing import Optional
+
+
+def _is_missing(x: Optional[float]) -> bool:
+    return x is None or math.isnan(x)
+
+
+class RunningStats:
+    """
+    Streaming mean, standard deviation, minimum and maximum of a series (Welford's algorithm)
+
+    Accumulators can be merged (Chan's parallel update), so statistics collected per station
+    or per worker process can be combined in any order and grouping.
+    Missing values (None or NaN) are skipped.
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.mean: float = math.nan
+        self.m2: float = 0  # sum of squared deviations from the mean
+        self.min: float = math.nan
+        self.max: float = math.nan
+
+    def update(self, x: Optional[float]):
+        """
+        Add a value to the statistics
+
+        :param x: new value (float or None)
+        """
+
+        if _is_missing(x):
+            return
+
+        x = float(x)
+        self.count += 1
+        if self.count == 1:
+            self.mean = x
+            self.min = x
+            self.max = x
+            return
+
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+
+    def update_many(self, values):
+        """
+        Add a batch of values to the statistics
+
+        :param values: new values (iterable of float or None)
+        """
+
+        values = [float(x) for x in values if not _is_missing(x)]
+        if not values:
+            return
+
+        batch = RunningStats()
+        batch.count = len(values)
+        batch.mean = math.fsum(values) / batch.count
+        batch.m2 = math.fsum((x - batch.mean) ** 2 for x in values)
+        batch.min = min(values)
+        batch.max = max(values)
+        self.merge(batch)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """
+        Combine statistics of another accumulator into this one
+
+        :param other: accumulator to merge (RunningStats)
+        Returns: this accumulator (RunningStats)
+        """
+
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count = other.count
+            self.mean = other.mean
+            self.m2 = other.m2
+            self.min = other.min
+            self.max = other.max
+            return self
+
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def to_dict(self) -> dict:
+        """
+        The accumulator as a JSON-serialisable dict (e.g. to merge the statistics of several machines)
+        """
+
+        return dict(
+            count=self.count, mean=self.mean, m2=self.m2, min=self.min, max=self.max
+        )
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningStats":
+        """
+        Restore an accumulator saved by to_dict
+
+        :param state: the saved accumulator (dict)
+        Returns: the accumulator (RunningStats)
+        """
+
+        stats = cls()
+        stats.count = state["count"]
+        stats.mean = state["mean"]
+        stats.m2 = state["m2"]
+        stats.min = state["min"]
+        stats.max = state["max"]
+        return stats
+
+    @property
+    def std(self) -> float:
+        """
+        Population standard deviation (as numpy.std)
+        """
+
+        return math.sqrt(self.m2 / self.count) if self.count > 0 else math.nan
+
+    def summary(self, decimals: int = 2) -> str:
+        """
+        Format as "mean ± std [min; max]" (as helpers.get_uncertainty_stats)
+        """
+
+        return (
+            f"{round(self.mean, decimals)} ± {round(self.std, decimals)} "
+            f"[{round(self.min, decimals)}; {round(self.max, decimals)}]"
+        )
+
+
+class RunningRMSE:
+    """
+    Streaming root mean squared error between two series
+
+    Pairs with a missing value (None or NaN) are skipped.
+    """
+
+    def __init__(self):
+        self.count: int = 0
+        self.sum_sq: float = 0
+
+    def update(self, x1: Optional[float], x2: Optional[float]):
+        """
+        Add a pair of values
+
+        :param x1: value of the first series (float or None)
+        :param x2: value of the second series (float or None)
+        """
+
+        if _is_missing(x1) or _is_missing(x2):
+            return
+
+        self.count += 1
+        self.sum_sq += (float(x1) - float(x2)) ** 2
+
+    def update_many(self, values1, values2):
+        """
+        Add a batch of pairs of values
+
+        :param values1: values of the first series (iterable of float or None)
+        :param values2: values of the second series (iterable of float or None)
+        """
+
+        for x1, x2 in zip(values1, values2):
+            self.update(x1, x2)
+
+    def merge(self, other: "RunningRMSE") -> "RunningRMSE":
+        """
+        Combine another accumulator into this one
+
+        :param other: accumulator to merge (RunningRMSE)
+        Returns: this accumulator (RunningRMSE)
+        """
+
+        self.count += other.count
+        self.sum_sq += other.sum_sq
+        return self
+
+    @property
+    def rmse(self) -> float:
+        return math.sqrt(self.sum_sq / self.count) if self.count > 0 else math.nan
+
+
+class AssimilationMetrics:
+    """
+    Streaming metrics of an assimilation run: RMSE between the raw sources and the assimilated values,
+    and statistics of absolute uncertainties (their means are the MAU metrics)
+    """
+
+    def __init__(self):
+        self.rmse_sources: RunningRMSE = RunningRMSE()  # source1 and source2
+        self.rmse_source1: RunningRMSE = RunningRMSE()  # source1 and assimilated
+        self.rmse_source2: RunningRMSE = RunningRMSE()  # source2 and assimilated
+        self.err_source1: RunningStats = RunningStats()  # AR(1) uncertainty of source1
+        self.err_source2: RunningStats = RunningStats()  # AR(1) uncertainty of source2
+        # R(1) uncertainty of the calibrated source
+        self.err_calibrated: RunningStats = RunningStats()
+        self.err_assimilated: RunningStats = RunningStats()
+
+    def update(
+        self,
+        obs1: Optional[float],
+        obs2: Optional[float],
+        assimilated_obs: float,
+        err_source1: float,
+        err_source2: Optional[float],
+        err_assimilated_obs: float,
+        err_calibrated: Optional[float] = None,
+    ):
+        """
+        Add the results of one assimilation step
+
+        :param obs1: raw value from the first data source (float or None)
+        :param obs2: raw value from the second data source (float or None)
+        :param assimilated_obs: assimilated value (float)
+        :param err_source1: AR(1) uncertainty of the first data source (float)
+        :param err_source2: AR(1) uncertainty of the second data source (float or None)
+        :param err_assimilated_obs: uncertainty of assimilated_obs (float)
+        :param err_calibrated: R(1) uncertainty of the calibrated data source (float or None)
+        """
+
+        self.rmse_sources.update(obs1, obs2)
+        self.rmse_source1.update(obs1, assimilated_obs)
+        self.rmse_source2.update(obs2, assimilated_obs)
+        self.err_source1.update(abs(err_source1))
+        if err_source2 is not None:
+            self.err_source2.update(abs(err_source2))
+        if err_calibrated is not None:
+            self.err_calibrated.update(abs(err_calibrated))
+        self.err_assimilated.update(abs(err_assimilated_obs))
+
+    def update_many(
+        self,
+        obs1,
+        obs2,
+        assimilated_obs,
+        err_source1,
+        err_source2,
+        err_assimilated_obs,
+        err_calibrated=None,
+    ):
+        """
+        Add the results of several assimilation steps (the arguments are sequences of the arguments of update)
+        """
+
+        self.rmse_sources.update_many(obs1, obs2)
+        self.rmse_source1.update_many(obs1, assimilated_obs)
+        self.rmse_source2.update_many(obs2, assimilated_obs)
+        self.err_source1.update_many(abs(e) for e in err_source1)
+        if err_source2 is not None:
+            self.err_source2.update_many(abs(e) for e in err_source2)
+        if err_calibrated is not None:
+            self.err_calibrated.update_many(abs(e) for e in err_calibrated)
+        self.err_assimilated.update_many(abs(e) for e in err_assimilated_obs)
+
+    def merge(self, other: "AssimilationMetrics") -> "AssimilationMetrics":
+        """
+        Combine metrics of another run (e.g. another station or worker process) into this one
+
+        :param other: metrics to merge (AssimilationMetrics)
+        Returns: these metrics (AssimilationMetrics)
+        """
+
+        for name, accumulator in vars(self).items():
+            accumulator.merge(getattr(other, name))
+        return self
@@ -0,0 +1,209 @@
+from typing import List, Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+from rls_assimilation.BatchDataSource import BatchDataSource
+from rls_assimilation.Buffers import as_input_array, as_output_array
+
+
+def inverse_variance_weights(err: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """
+    Least-squares (inverse-variance) weights of sources stacked along the last axis
+
+    The weight of source k is proportional to the product of the squared uncertainties of the other sources,
+    which for 2 sources is exactly the gain of RLSAssimilation. If the product vanishes for all sources
+    (several sources with zero uncertainty), the first of them gets the whole weight.
+
+    :param err: uncertainties of the sources (numpy array, shape (..., K))
+    :param mask: sources taking part in the combination (numpy bool array broadcastable to err)
+    :return: weights summing up to 1 along the last axis (numpy array, shape (..., K))
+    """
+
+    mask = np.broadcast_to(mask, err.shape)
+    with np.errstate(under="ignore", over="ignore"):
+        err2 = np.where(mask, err**2, 1)
+        if err.shape[-1] == 2:
+            numerator = err2[..., ::-1]
+        else:
+            ones = np.ones_like(err2[..., :1])
+            left = np.cumprod(np.concatenate([ones, err2[..., :-1]], axis=-1), axis=-1)
+            right = np.cumprod(
+                np.concatenate([ones, err2[..., :0:-1]], axis=-1), axis=-1
+            )
+            numerator = left * right[..., ::-1]
+    numerator = np.where(mask, numerator, 0)
+    total = numerator.sum(axis=-1, keepdims=True)
+
+    is_total_zero = total == 0
+    if not is_total_zero.any():
+        return numerator / total
+
+    is_candidate = mask & (err2 == 0)
+    is_candidate = np.where(
+        is_candidate.any(axis=-1, keepdims=True), is_candidate, mask
+    )
+    is_first_candidate = is_candidate & (np.cumsum(is_candidate, axis=-1) == 1)
+
+    weights = np.divide(
+        numerator, total, out=np.zeros_like(numerator), where=~is_total_zero
+    )
+    return np.where(is_total_zero, is_first_candidate, weights)
+
+
+class MultiSourceRLSAssimilation:
+    """
+    Least-squares assimilation of data from K data sources in one vectorised step
+
+    All per-source stages (AR(1) uncertainty estimation, R(1) calibration, daily averaging)
+    run on arrays with the sources stacked along the last axis, and the sources are combined
+    with inverse-variance weights. With 2 sources the results are those of RLSAssimilation.
+
+    Sources with s_in != s_out are calibrated against the least-squares combination of the sources
+    that are already in s_out. Hourly sources are upscaled for daily output, daily sources are downscaled
+    for hourly output using the relationship between hourly and daily data of the first hourly source.
+
+    :param t_ins: temporal scales of the sources (list of str, "hourly" or "daily")
+    :param s_ins: spatial scales of the sources (list of str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param shape: shape of the bank of independent assimilations, e.g. (n_stations,) (tuple of int)
+    :param dtype: floating point type of the state and the results (numpy dtype, float64 or float32).
+    float32 halves the memory of large banks at the cost of about 7 significant digits
+    :param P_init: initial state matrices of all RLS models as multiples of the identity (float, or numpy array
+    broadcastable to (*shape, K) for a value per lane and source; see BatchRLS)
+    :param w_init: initial weights of all RLS models (numpy array broadcastable to (*shape, K, 2))
+    """
+
+    def _validate(self, t_ins: List[str], s_ins: List[str], t_out: str, s_out: str):
+        if len(t_ins) != len(s_ins) or len(t_ins) < 2:
+            raise ValueError(
+                f"Temporal and spatial scales must be given for at least 2 sources, got {t_ins} and {s_ins}"
+            )
+
+        # 1) Supported temporal scales: 'hourly' and 'daily
+        for t in [*t_ins, t_out]:
+            if t not in ["hourly", "daily"]:
+                raise NotImplementedError(
+                    f'Temporal scale {t} is not supported. Supported temporal scales are "hourly" and "daily".'
+                )
+
+        # 2) Output spatial scale must be equal to at least one of the input spatial scales
+        if s_out not in s_ins:
+            raise ValueError(
+                f"Output spatial scale {s_out} must be equal to at least one of the input spatial scales {s_ins}"
+            )
+
+        # 3) Output temporal scale must be equal to at least one of the input temporal scales
+        if t_out not in t_ins:
+            raise ValueError(
+                f"Output temporal scale {t_out} must be equal to at least one of the input temporal scales {t_ins}"
+            )
+
+    def __init__(
+        self,
+        t_ins: List[str],
+        s_ins: List[str],
+        t_out: str,
+        s_out: str,
+        shape: Tuple[int, ...] = (),
+        dtype: DTypeLike = np.float64,
+        P_init: np.ndarray = 1.0,
+        w_init: np.ndarray = 0.0,
+    ):
+        # Validate prerequisites
+        self._validate(t_ins, s_ins, t_out, s_out)
+        self.t_ins: List[str] = list(t_ins)
+        self.s_ins: List[str] = list(s_ins)
+        self.t_out: str = t_out
+        self.s_out: str = s_out
+        self.shape: Tuple[int, ...] = tuple(shape)
+        self.dtype: np.dtype = np.dtype(dtype)
+
+        # Stages needed by each source
+        self.is_calibrated = np.array([s != s_out for s in s_ins])
+        self.is_hourly = np.array([t == "hourly" for t in t_ins])
+        self.is_upscaled = self.is_hourly & (t_out == "daily")
+        self.is_downscaled = ~self.is_hourly & (t_out == "hourly")
+        # The hourly source whose daily-to-hourly relationship is used for downscaling
+        self.downscaling_reference: int = int(np.argmax(self.is_hourly))
+
+        # Stacked data sources, (*shape, K)
+        self.sources: BatchDataSource = BatchDataSource(
+            (*self.shape, len(t_ins)), self.dtype, P_init, w_init
+        )
+
+    def _estimate(self, obs: np.ndarray) -> (np.ndarray, np.ndarray):
+        return self.sources.estimate(obs)
+
+    def _update_daily_averages(self, x: np.ndarray, err: np.ndarray):
+        self.sources.temporal_model.update(x, err, mask=self.is_hourly)
+
+    def _align_scales_of_sources(
+        self, x: np.ndarray, err: np.ndarray
+    ) -> (np.ndarray, np.ndarray):
+        # Spatial calibration against the combination of the sources in s_out
+        if self.is_calibrated.any():
+            ref_weights = inverse_variance_weights(err, ~self.is_calibrated)
+            x_ref = np.sum(ref_weights * x, axis=-1, keepdims=True)
+            x, err = self.sources.calibrate(x, err, x_ref, mask=self.is_calibrated)
+
+        # Update daily averages for hourly data sources
+        self._update_daily_averages(x, err)
+
+        # Temporal scaling
+        if self.is_upscaled.any():
+            x_daily, err_daily = self.sources.upscale()
+            x = np.where(self.is_upscaled, x_daily, x)
+            err = np.where(self.is_upscaled, err_daily, err)
+        if self.is_downscaled.any():
+            x_hourly, err_hourly = self.sources.downscale_other_sources(
+                self.downscaling_reference, x, x, err
+            )
+            x = np.where(self.is_downscaled, x_hourly, x)
+            err = np.where(self.is_downscaled, err_hourly, err)
+
+        return x, err
+
+    def assimilate(
+        self,
+        obs: np.ndarray,
+        out: Optional[np.ndarray] = None,
+        err_out: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate values from K data sources with unknown uncertainty
+
+        The observations can be any buffer (e.g. a memoryview of a message), which is read without copying,
+        and the results can be written to preallocated buffers.
+
+        :param: obs - values from the data sources (numpy array or buffer of shape (*shape, K) or flat, NaN if missing)
+        :param: out - buffer the assimilated values are written to (writable numpy array or buffer of shape `shape`
+        or flat, or None - a new array)
+        :param: err_out - buffer the uncertainties are written to (as out)
+
+        Returns (assimilated_obs - assimilated values (numpy array of shape `shape`, a view of out if given),
+        err_assimilated_obs - uncertainties of assimilated_obs (numpy array of shape `shape`, a view of err_out if given))
+        """
+
+        obs = as_input_array(obs, (*self.shape, len(self.t_ins)))
+        out = as_output_array(out, self.shape, "out")
+        err_out = as_output_array(err_out, self.shape, "err_out")
+
+        # Step 1: Pre-process observations and estimate AR(1) errors
+        x, err = self._estimate(obs)
+
+        # Step 2: Temporal and spatial calibration
+        x, err = self._align_scales_of_sources(x, err)
+
+        # Step 3: Assimilation
+        weights = inverse_variance_weights(err, True)
+        assimilated_obs = np.sum(weights * x, axis=-1, out=out)
+        err_assimilated_obs = np.sqrt(
+            np.sum((weights * err) ** 2, axis=-1), out=err_out
+        )
+
+        if out is None:
+            assimilated_obs = assimilated_obs[()]
+        if err_out is None:
+            err_assimilated_obs = err_assimilated_obs[()]
+        return assimilated_obs, err_assimilated_obs
@@ -0,0 +1,124 @@
+from typing import List, Sequence, Tuple
+
+
+def repeat_update(
+    P: List[List[float]], w: List[float], x: float, y: float, n_updates: int
+) -> Tuple[List[List[float]], List[float], List[float]]:
+    """
+    Apply n_updates identical RLS updates (x, y) in plain Python floats, as n_updates calls of update
+
+    The element-wise update of the state matrix has no closed form for repeated updates, but the loop
+    over the 2x2 state in scalars avoids the overhead of a call (and of numpy) per update.
+
+    :param P: state matrix (nested lists, 2x2)
+    :param w: weights (list, constant and coefficient)
+    :param x: past/input observation (scalar)
+    :param y: current/output observation (scalar)
+    :param n_updates: number of updates (int)
+    Returns (P - the updated state matrix, w - the updated weights, errors - the error after each update (list))
+    """
+
+    (P00, P01), (P10, P11) = P
+    w0, w1 = w
+    x = float(x)
+    y = float(y)
+    errors = []
+    for _ in range(n_updates):
+        alpha = float(y - (w0 + x * w1))
+        denominator = 1 + ((P00 + x * P10) + (P01 + x * P11) * x)
+        g0 = (P00 + P01 * x) / denominator
+        g1 = (P10 + P11 * x) / denominator
+        errors.append(abs(alpha))
+        w0, w1 = w0 + g0 * alpha, w1 + g1 * alpha
+        P00, P01, P10, P11 = (
+            P00 - g0 * P00,
+            P01 - g0 * x * P01,
+            P10 - g1 * P10,
+            P11 - g1 * x * P11,
+        )
+
+    return [[P00, P01], [P10, P11]], [w0, w1], errors
+
+
+class PureRLS:
+    """
+    RLS in plain Python floats, the scalar backend without numpy (see rls_assimilation.Backend)
+
+    Follows the same recursion as RLS, including the element-wise update of the state matrix,
+    with P as nested lists (2x2) and w as a list (constant and coefficient).
+
+    :param P_init: initial state matrix as a multiple of the identity (scalar, see RLS)
+    :param w_init: initial weights (constant and coefficient)
+    """
+
+    def __init__(self, P_init: float = 1.0, w_init: Sequence[float] = (0.0, 0.0)):
+        P_init = float(P_init)
+        # state matrix, 2x2
+        self.P: List[List[float]] = [[P_init, 0.0], [0.0, P_init]]
+        self.w: List[float] = [
+            float(w) for w in w_init
+        ]  # weights (constant and coefficient)
+        self.error: float = 0
+
+    def update(self, x: float, y: float):
+        """
+        RLS state update
+        :param x: past/input observation (scalar)
+        :param y: current/output observation (scalar)
+        """
+
+        (P00, P01), (P10, P11) = self.P
+        w0, w1 = self.w
+
+        alpha = float(y - (w0 + x * w1))
+        denominator = 1 + ((P00 + x * P10) + (P01 + x * P11) * x)
+        g0 = (P00 + P01 * x) / denominator
+        g1 = (P10 + P11 * x) / denominator
+        self.error = abs(alpha)
+        self.w = [w0 + g0 * alpha, w1 + g1 * alpha]
+        self.P = [
+            [P00 - g0 * P00, P01 - g0 * x * P01],
+            [P10 - g1 * P10, P11 - g1 * x * P11],
+        ]
+
+    def update_repeated(self, x: float, y: float, n_updates: int) -> List[float]:
+        """
+        The same as n_updates calls of update(x, y), e.g. for a run of equal values (see repeat_update)
+        :param x: past/input observation (scalar)
+        :param y: current/output observation (scalar)
+        :param n_updates: number of updates (int)
+        :return: the error after each update (list)
+        """
+
+        if n_updates <= 0:
+            return []
+
+        self.P, self.w, errors = repeat_update(self.P, self.w, x, y, n_updates)
+        self.error = errors[-1]
+        return errors
+
+    def predict(self, x: float) -> float:
+        """
+        Predict observation, using RLS model
+        :param x: past observation (scalar)
+        :return: predicted observation (scalar)
+        """
+
+        w0, w1 = self.w
+        if w0 == 0 and w1 == 0:
+            return x
+
+        return float(w0 + x * w1)
+
+    def predict_ahead(self, x: float, n_steps: int):
+        """
+        Predict observations n_steps ahead in closed form (see RLS.predict_ahead), needs numpy
+        :param x: the latest observation (scalar)
+        :param n_steps: number of steps ahead (int)
+        :return: predicted observations for steps 1..n_steps (numpy array)
+        """
+
+        import numpy as np
+        from rls_assimilation.BatchRLS import predict_trajectory
+
+        return predict_trajectory(np.array(self.w, dtype=float), x, n_steps)
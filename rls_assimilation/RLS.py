@@ -1,15 +1,22 @@
+from typing import Sequence
 import numpy as np
 
+from rls_assimilation.BatchRLS import predict_trajectory
+from rls_assimilation.PureRLS import repeat_update
+
 
 class RLS:
-    def __init__(self):
+    def __init__(self, P_init: float = 1.0, w_init: Sequence[float] = (0.0, 0.0)):
         """
         RLS initialisation
+        :param P_init: initial state matrix as a multiple of the identity (scalar), the larger
+        the faster the weights move away from w_init with the first observations
+        :param w_init: initial weights (constant and coefficient)
         """
 
-        self.P = np.eye(2)  # state matrix, 2x2
-        self.w = np.zeros(
-            (2, 1)
+        self.P = P_init * np.eye(2)  # state matrix, 2x2
+        self.w = np.reshape(
+            np.array(w_init, dtype=float), (2, 1)
         )  # weights (coefficients of the linear model including constant, 2x1)
         self.error = 0
 
@@ -27,6 +34,27 @@ class RLS:
         self.w = self.w + g * alpha
         self.P = self.P - g * X * self.P
 
+    def update_repeated(self, x: float, y: float, n_updates: int) -> np.ndarray:
+        """
+        RLS state update with the same (x, y) n_updates times, e.g. for a run of equal values
+        (the same as calling update n_updates times, without the overhead of numpy per update)
+        :param x: past/input observation (scalar)
+        :param y: current/output observation (scalar)
+        :param n_updates: number of updates (int)
+        :return: the error after each update (numpy array)
+        """
+
+        if n_updates <= 0:
+            return np.empty(0)
+
+        P, w, errors = repeat_update(
+            self.P.tolist(), np.ravel(self.w).tolist(), x, y, n_updates
+        )
+        self.P = np.array(P)
+        self.w = np.reshape(w, (2, 1))
+        self.error = np.abs(errors[-1])
+        return np.array(errors)
+
     def predict(self, x: float) -> float:
         """
         Predict observation, using RLS model
@@ -40,3 +68,14 @@ class RLS:
 
         X = np.reshape([1, x], (1, 2))  # reshape to a 1x2 matrix
         return float(X @ self.w)
+
+    def predict_ahead(self, x: float, n_steps: int) -> np.ndarray:
+        """
+        Predict observations n_steps ahead, feeding each prediction back as the input,
+        in closed form (the model is not updated without observations)
+        :param x: the latest observation (scalar)
+        :param n_steps: number of steps ahead (int)
+        :return: predicted observations for steps 1..n_steps (numpy array)
+        """
+
+        return predict_trajectory(np.ravel(self.w), x, n_steps)
@@ -1,7 +1,16 @@
-from typing import Optional
-import numpy as np
+from __future__ import annotations
 
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Sequence
+
+from rls_assimilation.Backend import sqrt
+from rls_assimilation.Buffers import get_input_view, get_output_view
+from rls_assimilation.CalendarAverage import TEMPORAL_SCALES, is_finer
 from rls_assimilation.DataSource import DataSource
+from rls_assimilation.Metrics import AssimilationMetrics
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class RLSAssimilation:
@@ -14,24 +23,37 @@ class RLSAssimilation:
     :param s_in2: spatial scale of source1  (str)
     :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
     :param s_out: spatial scale of assimilation output (str)
+    :param use_timestamps: assimilate timestamped data, averaged over calendar days or weeks instead of
+    24 values, which also supports the "weekly" temporal scale (bool)
+    :param P_init: initial state matrix of all RLS models as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of all RLS models (constant and coefficient)
     """
 
     def _validate(
-        self, t_in1: str, t_in2: str, s_in1: str, s_in2: str, t_out: str, s_out: str
+        self,
+        t_in1: str,
+        t_in2: str,
+        s_in1: str,
+        s_in2: str,
+        t_out: str,
+        s_out: str,
+        use_timestamps: bool = False,
     ):
-        # 1) Supported temporal scales: 'hourly' and 'daily
+        # 1) Supported temporal scales: 'hourly' and 'daily' (and 'weekly' for timestamped data)
+        supported_t = TEMPORAL_SCALES if use_timestamps else ["hourly", "daily"]
         err_t = (
             t_in1
-            if t_in1 not in ["hourly", "daily"]
+            if t_in1 not in supported_t
             else (
                 t_in2
-                if t_in2 not in ["hourly", "daily"]
-                else (t_out if t_out not in ["hourly", "daily"] else None)
+                if t_in2 not in supported_t
+                else (t_out if t_out not in supported_t else None)
             )
         )
         if err_t is not None:
+            supported_t_str = ", ".join(f'"{t}"' for t in supported_t[:-1])
             raise NotImplementedError(
-                f'Temporal scale {err_t} is not supported. Supported temporal scales are "hourly" and "daily".'
+                f'Temporal scale {err_t} is not supported. Supported temporal scales are {supported_t_str} and "{supported_t[-1]}".'
             )
 
         # 2) Output spatial scale must be equal to at least one of the input spatial scales
@@ -47,13 +69,33 @@ class RLSAssimilation:
             )
 
     def __init__(
-        self, t_in1: str, t_in2: str, s_in1: str, s_in2: str, t_out: str, s_out: str
+        self,
+        t_in1: str,
+        t_in2: str,
+        s_in1: str,
+        s_in2: str,
+        t_out: str,
+        s_out: str,
+        use_timestamps: bool = False,
+        P_init: float = 1.0,
+        w_init: Sequence[float] = (0.0, 0.0),
     ):
         # Validate prerequisites
-        self._validate(t_in1, t_in2, s_in1, s_in2, t_out, s_out)
+        self._validate(t_in1, t_in2, s_in1, s_in2, t_out, s_out, use_timestamps)
+        self.use_timestamps: bool = use_timestamps
+        # Timestamped data is averaged over the coarser input scale, for upscaling and downscaling
+        t_aggregate = (
+            (t_in2 if is_finer(t_in1, t_in2) else t_in1) if use_timestamps else None
+        )
         # Create objects for 2 data sources
-        self.source1: DataSource = DataSource(t_in1, t_out, s_in1, s_out)
-        self.source2: DataSource = DataSource(t_in2, t_out, s_in2, s_out)
+        self.source1: DataSource = DataSource(
+            t_in1, t_out, s_in1, s_out, t_aggregate, P_init, w_init
+        )
+        self.source2: DataSource = DataSource(
+            t_in2, t_out, s_in2, s_out, t_aggregate, P_init, w_init
+        )
+        # Streaming metrics updated on every assimilation step
+        self.metrics: AssimilationMetrics = AssimilationMetrics()
 
     def _align_scales_of_sources(
         self,
@@ -61,6 +103,7 @@ class RLSAssimilation:
         _err_source1: float,
         _source2_obs: float,
         _err_source2: float,
+        timestamp: Optional[datetime] = None,
     ) -> (float, float, float, float):
         # Obtain data values and uncertainties in the t_out and s_out scales
         source1_obs = _source1_obs
@@ -86,20 +129,20 @@ class RLSAssimilation:
 
         # Update daily averages for hourly data sources
         if self.source1.has_daily_average():
-            self.source1.temporal_model.update(source1_obs, err_source1)
+            self.source1.temporal_model.update(source1_obs, err_source1, timestamp)
         if self.source2.has_daily_average():
-            self.source2.temporal_model.update(source2_obs, err_source2)
+            self.source2.temporal_model.update(source2_obs, err_source2, timestamp)
 
         # Temporal scaling
         if self.source1.t_in != self.source1.t_out:
-            if self.source1.t_in == "hourly":
+            if is_finer(self.source1.t_in, self.source1.t_out):
                 source1_obs, err_source1 = self.source1.upscale()
             else:
                 source1_obs, err_source1 = self.source2.downscale_other_source(
                     source2_obs, source1_obs, err_source1
                 )
         elif self.source2.t_in != self.source2.t_out:
-            if self.source2.t_in == "hourly":
+            if is_finer(self.source2.t_in, self.source2.t_out):
                 source2_obs, err_source2 = self.source2.upscale()
             else:
                 source2_obs, err_source2 = self.source1.downscale_other_source(
@@ -108,22 +151,14 @@ class RLSAssimilation:
 
         return source1_obs, err_source1, source2_obs, err_source2
 
-    def assimilate(
-        self, obs1: Optional[float], obs2: Optional[float]
+    def _assimilate_estimated(
+        self,
+        source1_obs: float,
+        err_source1: float,
+        source2_obs: float,
+        err_source2: float,
+        timestamp: Optional[datetime] = None,
     ) -> (float, float):
-        """
-        Assimilate values for 2 data sources with unknown uncertainty
-
-        :param: obs1 - value from the first data source (float or None)
-        :param: obs2 - value from the second data source (float or None)
-
-        Returns (assimilated_obs - assimilated value (float), err_assimilated_obs - uncertainty of assimilated_obs (float))
-        """
-
-        # Step 1: Pre-process observations and estimate AR(1) errors
-        source1_obs, err_source1 = self.source1.estimate(obs1)
-        source2_obs, err_source2 = self.source2.estimate(obs2)
-
         # Step 2: Temporal and spatial calibration
         (
             source1_obs,
@@ -131,7 +166,7 @@ class RLSAssimilation:
             source2_obs,
             err_source2,
         ) = self._align_scales_of_sources(
-            source1_obs, err_source1, source2_obs, err_source2
+            source1_obs, err_source1, source2_obs, err_source2, timestamp
         )
 
         # Step 3: Assimilation
@@ -142,8 +177,258 @@ class RLSAssimilation:
 
         assimilated_obs = k * source1_obs + (1 - k) * source2_obs
 
-        err_assimilated_obs = np.sqrt(
+        err_assimilated_obs = sqrt(
             (k * err_source1) ** 2 + ((1 - k) * err_source2) ** 2
         )
 
         return assimilated_obs, err_assimilated_obs
+
+    def _assimilate_step(
+        self,
+        obs1: Optional[float],
+        obs2: Optional[float],
+        timestamp: Optional[datetime] = None,
+    ) -> (float, float):
+        # Step 1: Pre-process observations and estimate AR(1) errors
+        source1_obs, err_source1 = self.source1.estimate(obs1)
+        source2_obs, err_source2 = self.source2.estimate(obs2)
+
+        # Steps 2 and 3: Calibration and assimilation
+        return self._assimilate_estimated(
+            source1_obs, err_source1, source2_obs, err_source2, timestamp
+        )
+
+    def _update_metrics(
+        self,
+        obs1: Optional[float],
+        obs2: Optional[float],
+        assimilated_obs: float,
+        err_assimilated_obs: float,
+    ):
+        calibrated_source = (
+            self.source1
+            if self.source1.is_spatially_calibrated()
+            else (self.source2 if self.source2.is_spatially_calibrated() else None)
+        )
+        self.metrics.update(
+            obs1,
+            obs2,
+            assimilated_obs,
+            self.source1.ar_errors[-1],
+            self.source2.ar_errors[-1],
+            err_assimilated_obs,
+            calibrated_source.get_latest_error() if calibrated_source else None,
+        )
+
+    def assimilate(
+        self,
+        obs1: Optional[float],
+        obs2: Optional[float],
+        timestamp: Optional[datetime] = None,
+    ) -> (float, float):
+        """
+        Assimilate values for 2 data sources with unknown uncertainty
+
+        :param: obs1 - value from the first data source (float or None)
+        :param: obs2 - value from the second data source (float or None)
+        :param: timestamp - time of the values, required with use_timestamps (datetime or None)
+
+        Returns (assimilated_obs - assimilated value (float), err_assimilated_obs - uncertainty of assimilated_obs (float))
+        """
+
+        assimilated_obs, err_assimilated_obs = self._assimilate_step(
+            obs1, obs2, timestamp
+        )
+        self._update_metrics(obs1, obs2, assimilated_obs, err_assimilated_obs)
+
+        return assimilated_obs, err_assimilated_obs
+
+    def assimilate_buffer(self, obs1, obs2, out=None, err_out=None) -> (object, object):
+        """
+        Assimilate a series of values from buffers, e.g. columns of a message held as memoryviews or
+        numpy arrays (the same as calling assimilate for each step)
+
+        The buffers are not copied: each value is read from the input buffers and assimilated by the per-step path
+        (assimilate), and the results are written to the output buffers element by element. Only the lists or arrays
+        of the whole series are saved, not the work per step; works with both backends.
+
+        :param: obs1 - values from the first data source (float64 or float32 buffer, NaN if missing)
+        :param: obs2 - values from the second data source (float64 or float32 buffer of the same length)
+        :param: out - writable float64 or float32 buffer the assimilated values are written to (or None - a new array.array)
+        :param: err_out - writable buffer the uncertainties are written to (as out)
+
+        Returns (out - the buffer of the assimilated values, err_out - the buffer of their uncertainties)
+        """
+
+        if self.use_timestamps:
+            raise NotImplementedError(
+                "Buffers of timestamped data are not supported, use assimilate"
+            )
+
+        obs1 = get_input_view(obs1, "obs1")
+        obs2 = get_input_view(obs2, "obs2")
+        n_steps = len(obs1)
+        if len(obs2) != n_steps:
+            raise ValueError(
+                f"obs1 and obs2 must have the same length, got {n_steps} and {len(obs2)}"
+            )
+        out, out_view = get_output_view(out, n_steps, "out")
+        err_out, err_out_view = get_output_view(err_out, n_steps, "err_out")
+
+        assimilate = self.assimilate
+        for i in range(n_steps):
+            out_view[i], err_out_view[i] = assimilate(obs1[i], obs2[i])
+        return out, err_out
+
+    def trim_history(self):
+        """
+        Drop the values of the sources stored for plotting, keeping the state of the assimilation
+        (see DataSourceAR1.trim_history)
+        """
+
+        self.source1.trim_history()
+        self.source2.trim_history()
+
+    def _needs_scale_alignment(self) -> bool:
+        return (
+            self.source1.is_spatially_calibrated()
+            or self.source2.is_spatially_calibrated()
+            or self.source1.t_in != self.source1.t_out
+            or self.source2.t_in != self.source2.t_out
+        )
+
+    def _assimilate_estimated_many(
+        self,
+        source1_obs: np.ndarray,
+        source2_obs: np.ndarray,
+        err_source1: np.ndarray,
+        err_source2: np.ndarray,
+    ) -> (np.ndarray, np.ndarray, Optional[List[float]]):
+        # Steps 2 and 3 for a sequence of AR(1) estimates, vectorised if no scales need to be aligned.
+        # Also returns R(1) uncertainties of the calibrated source (None without calibration).
+        import numpy as np
+
+        n_steps = len(source1_obs)
+
+        if not self._needs_scale_alignment():
+            # Only daily averages of hourly sources are updated
+            for source, source_obs, err_source in [
+                (self.source1, source1_obs, err_source1),
+                (self.source2, source2_obs, err_source2),
+            ]:
+                if source.has_daily_average():
+                    source.temporal_model.update_many(source_obs, err_source)
+
+            err_sum = err_source1**2 + err_source2**2
+            k = np.divide(
+                err_source2**2, err_sum, out=np.ones(n_steps), where=err_sum != 0
+            )
+            assimilated_obs = k * source1_obs + (1 - k) * source2_obs
+            err_assimilated_obs = np.sqrt(
+                (k * err_source1) ** 2 + ((1 - k) * err_source2) ** 2
+            )
+            return assimilated_obs, err_assimilated_obs, None
+
+        assimilated_obs = np.empty(n_steps)
+        err_assimilated_obs = np.empty(n_steps)
+        calibrated_source = (
+            self.source1
+            if self.source1.is_spatially_calibrated()
+            else (self.source2 if self.source2.is_spatially_calibrated() else None)
+        )
+        err_calibrated = [] if calibrated_source else None
+        for i in range(n_steps):
+            assimilated_obs[i], err_assimilated_obs[i] = self._assimilate_estimated(
+                source1_obs[i], err_source1[i], source2_obs[i], err_source2[i]
+            )
+            if calibrated_source:
+                err_calibrated.append(calibrated_source.get_latest_error())
+
+        return assimilated_obs, err_assimilated_obs, err_calibrated
+
+    def fast_forward(
+        self,
+        n_steps: int,
+        obs1: Optional[np.ndarray] = None,
+        obs2: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate n_steps while one or both data sources are offline
+        (the same as calling assimilate for each step)
+
+        Offline sources are imputed in closed form (DataSourceAR1.fast_forward), the observations
+        of an online source are estimated as usual. When the sources are of the same scales, the assimilation
+        of the whole gap is vectorised; otherwise the R(1) calibration and scaling models, which learn on every step,
+        are advanced step by step.
+
+        :param: n_steps - the number of steps (int)
+        :param: obs1 - values from the first data source during the gap (array-like of n_steps floats, or None if offline)
+        :param: obs2 - values from the second data source during the gap (array-like of n_steps floats, or None if offline)
+
+        Returns (assimilated_obs - assimilated values (numpy array), err_assimilated_obs - uncertainties of assimilated_obs (numpy array))
+        """
+
+        (
+            assimilated_obs,
+            err_assimilated_obs,
+            ar_err_source1,
+            ar_err_source2,
+            err_calibrated,
+        ) = self._fast_forward_estimated(n_steps, obs1, obs2)
+
+        self.metrics.update_many(
+            [None] * n_steps if obs1 is None else obs1,
+            [None] * n_steps if obs2 is None else obs2,
+            assimilated_obs,
+            ar_err_source1,
+            ar_err_source2,
+            err_assimilated_obs,
+            err_calibrated,
+        )
+
+        return assimilated_obs, err_assimilated_obs
+
+    def _fast_forward_estimated(
+        self,
+        n_steps: int,
+        obs1: Optional[np.ndarray],
+        obs2: Optional[np.ndarray],
+    ) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, Optional[List[float]]):
+        # Steps 1 to 3 of fast_forward, without the metrics. Also returns the AR(1) uncertainties of the sources
+        # and the R(1) uncertainties of the calibrated source (None without calibration).
+        if self.use_timestamps:
+            raise NotImplementedError(
+                "Fast-forward is not supported for timestamped data, use assimilate"
+            )
+        for name, obs in [("obs1", obs1), ("obs2", obs2)]:
+            if obs is not None and len(obs) != n_steps:
+                raise ValueError(
+                    f"{name} must have {n_steps} values, got {len(obs)}"
+                )
+
+        # Step 1: Impute offline sources in closed form, estimate AR(1) errors of online ones
+        sources_obs = []
+        sources_err = []
+        for source, obs in [(self.source1, obs1), (self.source2, obs2)]:
+            if obs is None:
+                source_obs, err_source = source.fast_forward(n_steps)
+            else:
+                source_obs, err_source = source.estimate_many(obs)
+            sources_obs.append(source_obs)
+            sources_err.append(err_source)
+        ar_err_source1, ar_err_source2 = sources_err
+
+        # Steps 2 and 3: Calibration and assimilation
+        (
+            assimilated_obs,
+            err_assimilated_obs,
+            err_calibrated,
+        ) = self._assimilate_estimated_many(*sources_obs, *sources_err)
+
+        return (
+            assimilated_obs,
+            err_assimilated_obs,
+            ar_err_source1,
+            ar_err_source2,
+            err_calibrated,
+        )
@@ -0,0 +1,182 @@
+import copy
+from typing import Dict, List, Tuple, Union
+import numpy as np
+
+from rls_assimilation.DataSource import DataSourceAR1
+from rls_assimilation.RLSAssimilation import RLSAssimilation
+from rls_assimilation.SequentialRLSAssimilation import (
+    SequentialRLSAssimilationOneSource,
+    SequentialRLSAssimilationTwoSources,
+)
+
+
+class RLSAssimilationSweep:
+    """
+    Least-squares assimilation of the same data with several scale configurations
+
+    AR(1) uncertainty estimation depends only on the raw series, so it runs once per series
+    and is shared by all configurations; only calibration, scaling and weighting run per configuration.
+
+    With sequential=True every configuration is also assimilated sequentially, as in the experiments of example2.py:
+    a configuration of a single temporal scale with the one-source sequential assimilation of the source in the
+    output spatial scale (which shares the AR(1) estimates of that source), other configurations with the two-source
+    sequential assimilation (the sequential stage on top of the assimilation of the configuration).
+
+    :param configs: configurations (list of tuples (t_in1, t_in2, s_in1, s_in2, t_out, s_out),
+    see RLSAssimilation for the arguments)
+    :param sequential: also run the sequential assimilation of every configuration (bool)
+    """
+
+    def __init__(
+        self,
+        configs: List[Tuple[str, str, str, str, str, str]],
+        sequential: bool = False,
+    ):
+        self.configs: List[Tuple[str, str, str, str, str, str]] = [
+            tuple(config) for config in configs
+        ]
+        self.sequential: bool = sequential
+        # Validate all configurations before running anything
+        for config in self.configs:
+            RLSAssimilation(*config)
+
+    @staticmethod
+    def _get_series(
+        obs: Union[np.ndarray, Dict[str, np.ndarray]], t_in: str
+    ) -> np.ndarray:
+        return obs[t_in] if isinstance(obs, dict) else obs
+
+    @staticmethod
+    def _seq_assimilate_many(
+        seq_assimilator: SequentialRLSAssimilationOneSource,
+        source_obs: np.ndarray,
+        err_source: np.ndarray,
+    ) -> (np.ndarray, np.ndarray):
+        # The sequential stage for a series of values and their uncertainties
+        n_steps = len(source_obs)
+        seq_assimilated_obs = np.empty(n_steps)
+        err_seq_assimilated_obs = np.empty(n_steps)
+        seq_assimilate = seq_assimilator.seq_assimilate
+        for i in range(n_steps):
+            (
+                seq_assimilated_obs[i],
+                err_seq_assimilated_obs[i],
+            ) = seq_assimilate(float(source_obs[i]), float(err_source[i]))
+        return seq_assimilated_obs, err_seq_assimilated_obs
+
+    def run(
+        self,
+        obs1: Union[np.ndarray, Dict[str, np.ndarray]],
+        obs2: Union[np.ndarray, Dict[str, np.ndarray]],
+    ) -> List[tuple]:
+        """
+        Assimilate the data with every configuration
+
+        :param: obs1 - values from the first data source: an array used by all configurations
+        or a dict of arrays by temporal scale, e.g. {"hourly": ..., "daily": ...}
+        :param: obs2 - values from the second data source (the same as obs1)
+
+        Returns a list with a tuple per configuration: (assimilated values (numpy array),
+        uncertainties of assimilated values (numpy array), the assimilator holding the sources and metrics (RLSAssimilation)),
+        with sequential=True followed by (sequentially assimilated values (numpy array), their uncertainties (numpy array),
+        the sequential assimilator (SequentialRLSAssimilationOneSource or SequentialRLSAssimilationTwoSources))
+        """
+
+        # Stage 1: AR(1) estimation, once per source series
+        estimated_sources: Dict[Tuple[int, str], DataSourceAR1] = {}
+        estimates: Dict[Tuple[int, str], Tuple[np.ndarray, np.ndarray]] = {}
+        for config in self.configs:
+            t_in1, t_in2 = config[:2]
+            for key, obs in [((1, t_in1), obs1), ((2, t_in2), obs2)]:
+                if key in estimated_sources:
+                    continue
+                source = DataSourceAR1()
+                estimates[key] = source.estimate_many(self._get_series(obs, key[1]))
+                estimated_sources[key] = source
+
+        # Stage 2: Calibration, scaling and weighting, per configuration
+        results = []
+        for config in self.configs:
+            t_in1, t_in2 = config[:2]
+            assimilator = RLSAssimilation(*config)
+            assimilator.source1.load_estimation(estimated_sources[(1, t_in1)])
+            assimilator.source2.load_estimation(estimated_sources[(2, t_in2)])
+            source1_obs, err_source1 = estimates[(1, t_in1)]
+            source2_obs, err_source2 = estimates[(2, t_in2)]
+
+            (
+                assimilated_obs,
+                err_assimilated_obs,
+                err_calibrated,
+            ) = assimilator._assimilate_estimated_many(
+                source1_obs, source2_obs, err_source1, err_source2
+            )
+            assimilator.metrics.update_many(
+                self._get_series(obs1, t_in1),
+                self._get_series(obs2, t_in2),
+                assimilated_obs,
+                err_source1,
+                err_source2,
+                err_assimilated_obs,
+                err_calibrated,
+            )
+            if not self.sequential:
+                results.append((assimilated_obs, err_assimilated_obs, assimilator))
+                continue
+
+            # Stage 3: Sequential assimilation, per configuration
+            t_out, s_out = config[4:]
+            if t_in1 == t_out and t_in2 == t_out:
+                # The source in the output scale, with its AR(1) estimates
+                key, obs = (
+                    ((1, t_in1), obs1) if s_out == config[2] else ((2, t_in2), obs2)
+                )
+                seq_assimilator = SequentialRLSAssimilationOneSource()
+                seq_assimilator.source.load_estimation(estimated_sources[key])
+                seq_source_obs, err_seq_source = estimates[key]
+                (
+                    seq_assimilated_obs,
+                    err_seq_assimilated_obs,
+                ) = self._seq_assimilate_many(
+                    seq_assimilator, seq_source_obs, err_seq_source
+                )
+                seq_assimilator.metrics.update_many(
+                    self._get_series(obs, key[1]),
+                    [None] * len(seq_source_obs),
+                    seq_assimilated_obs,
+                    err_seq_source,
+                    None,
+                    err_seq_assimilated_obs,
+                )
+            else:
+                # The sources of this configuration, with the sequential stage on top of its assimilation
+                seq_assimilator = SequentialRLSAssimilationTwoSources(*config)
+                seq_assimilator.source1 = copy.deepcopy(assimilator.source1)
+                seq_assimilator.source2 = copy.deepcopy(assimilator.source2)
+                (
+                    seq_assimilated_obs,
+                    err_seq_assimilated_obs,
+                ) = self._seq_assimilate_many(
+                    seq_assimilator, assimilated_obs, err_assimilated_obs
+                )
+                seq_assimilator.metrics.update_many(
+                    self._get_series(obs1, t_in1),
+                    self._get_series(obs2, t_in2),
+                    seq_assimilated_obs,
+                    err_source1,
+                    err_source2,
+                    err_seq_assimilated_obs,
+                    err_calibrated,
+                )
+            results.append(
+                (
+                    assimilated_obs,
+                    err_assimilated_obs,
+                    assimilator,
+                    seq_assimilated_obs,
+                    err_seq_assimilated_obs,
+                    seq_assimilator,
+                )
+            )
+
+        return results
@@ -0,0 +1,130 @@
+from itertools import product
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+from rls_assimilation.MultiSourceRLSAssimilation import MultiSourceRLSAssimilation
+
+
+class RLSInitialisationSearch:
+    """
+    Grid search over the initial state of the RLS models (P_init and w_init, see RLS) for a bank of streams
+
+    The assimilations of all streams with all grid points are the lanes of one MultiSourceRLSAssimilation
+    of shape (n_streams, n_grid), so the data is passed once for the whole grid instead of once per grid point.
+    Every lane is scored with the metrics of AssimilationMetrics: the RMSE between each source and the assimilated
+    values (rows with missing values skipped) and the mean absolute uncertainty (MAU) of the assimilated values.
+
+    :param t_ins: temporal scales of the sources (list of str, "hourly" or "daily")
+    :param s_ins: spatial scales of the sources (list of str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param P_inits: initial state matrices as multiples of the identity (sequence of float)
+    :param w_inits: initial weights (sequence of pairs of float, constant and coefficient)
+    :param n_streams: number of independent streams, e.g. stations (int)
+    :param dtype: floating point type of the state and the results (numpy dtype, float64 or float32)
+    """
+
+    def __init__(
+        self,
+        t_ins: List[str],
+        s_ins: List[str],
+        t_out: str,
+        s_out: str,
+        P_inits: Sequence[float],
+        w_inits: Sequence[Tuple[float, float]] = ((0.0, 0.0),),
+        n_streams: int = 1,
+        dtype: DTypeLike = np.float64,
+    ):
+        # Grid points: all combinations of P_inits and w_inits
+        self.grid: List[Tuple[float, Tuple[float, float]]] = [
+            (float(P_init), (float(w_init[0]), float(w_init[1])))
+            for P_init, w_init in product(P_inits, w_inits)
+        ]
+        P_init = np.array([P_init for P_init, _ in self.grid])
+        w_init = np.array([w_init for _, w_init in self.grid])
+        shape = (n_streams, len(self.grid))
+        self.assimilator: MultiSourceRLSAssimilation = MultiSourceRLSAssimilation(
+            t_ins,
+            s_ins,
+            t_out,
+            s_out,
+            shape=shape,
+            dtype=dtype,
+            P_init=P_init[:, None],
+            w_init=w_init[:, None, :],
+        )
+
+        # Streaming metrics per lane (and source), see RunningRMSE and RunningStats
+        n_sources = len(t_ins)
+        self.rmse_count = np.zeros((*shape, n_sources), dtype=np.int64)
+        self.rmse_sum_sq = np.zeros((*shape, n_sources))
+        self.err_count = np.zeros(shape, dtype=np.int64)
+        self.err_sum = np.zeros(shape)
+
+    def assimilate(self, obs: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate values of all streams with all grid points and update the metrics
+
+        :param: obs - values from the data sources (numpy array of shape (n_streams, K), NaN if missing)
+
+        Returns (assimilated_obs - assimilated values (numpy array of shape (n_streams, n_grid)),
+        err_assimilated_obs - uncertainties of assimilated_obs (numpy array of shape (n_streams, n_grid)))
+        """
+
+        obs = np.asarray(obs, dtype=self.assimilator.dtype)[:, None, :]
+        assimilated_obs, err_assimilated_obs = self.assimilator.assimilate(obs)
+
+        with np.errstate(invalid="ignore"):
+            diff = obs - assimilated_obs[..., None]
+        is_pair = ~np.isnan(diff)
+        self.rmse_count += is_pair
+        self.rmse_sum_sq += np.where(is_pair, diff, 0) ** 2
+
+        is_err = ~np.isnan(err_assimilated_obs)
+        self.err_count += is_err
+        self.err_sum += np.where(is_err, np.abs(err_assimilated_obs), 0)
+
+        return assimilated_obs, err_assimilated_obs
+
+    def run(self, obs: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Assimilate series of all streams with all grid points
+
+        :param: obs - values from the data sources (numpy array of shape (n_steps, n_streams, K), NaN if missing)
+
+        Returns the scores (see scores)
+        """
+
+        for row in obs:
+            self.assimilate(row)
+        return self.scores()
+
+    def scores(self) -> Dict[str, np.ndarray]:
+        """
+        Metrics of all lanes, NaN without values
+
+        Returns a dict with "rmse" - RMSE between each source and the assimilated values
+        (numpy array of shape (n_streams, n_grid, K)) and "mau" - mean absolute uncertainty
+        of the assimilated values (numpy array of shape (n_streams, n_grid))
+        """
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return dict(
+                rmse=np.sqrt(self.rmse_sum_sq / self.rmse_count),
+                mau=self.err_sum / self.err_count,
+            )
+
+    def best(self, score: np.ndarray) -> List[Tuple[float, Tuple[float, float]]]:
+        """
+        The grid point with the lowest score of every stream
+
+        :param: score - a score of all lanes, e.g. scores()["mau"] or scores()["rmse"][..., 0]
+        (numpy array of shape (n_streams, n_grid))
+
+        Returns (P_init, w_init) of every stream (list)
+        """
+
+        # Streams without a score get the first grid point
+        best_indices = np.argmin(np.where(np.isnan(score), np.inf, score), axis=-1)
+        return [self.grid[i] for i in best_indices.tolist()]
@@ -0,0 +1,129 @@
+import math
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+# A released slot of a stream: (slot time, value, NaN if missing)
+ReleasedSlot = Tuple[datetime, float]
+
+
+class ReorderBuffer:
+    """
+    Event-time front-end of one stream: releases late and out-of-order values in the order of their slots,
+    one value per slot (e.g. hourly), as DataSourceAR1.estimate and the assimilators expect
+
+    Values are held in a ring of lateness // step slots (at least 1) after the earliest slot not released yet.
+    A slot is released as soon as it and all earlier slots are filled. A slot still empty when a value at least
+    lateness newer arrives, or when advance is called at lateness after the slot, expires and is released
+    with NaN, which the AR(1) model then imputes. Values for released slots are too late: they are dropped and
+    counted in late_drops. Memory per stream is fixed by the size of the ring.
+
+    The first slot of the stream is not known until lateness has passed: until a slot is released (expired by
+    a newer value or by advance), values are held, and a value for an earlier slot within lateness of the latest one
+    moves the start of the stream back instead of being dropped. Only the first lateness of a stream is delayed.
+
+    Valid times are rounded to the nearest slot on the grid of steps from the start of the day of the first value,
+    and the latest value received for a slot wins.
+
+    :param step: time between the slots (timedelta)
+    :param lateness: how long a slot waits for a late value (timedelta)
+    """
+
+    def __init__(
+        self,
+        step: timedelta = timedelta(hours=1),
+        lateness: timedelta = timedelta(hours=3),
+    ):
+        self.step: timedelta = step
+        self.lateness: timedelta = lateness
+        self.size: int = max(lateness // step, 1)
+        self._values: List[Optional[float]] = [None] * self.size  # None - empty slot
+        self.origin: Optional[datetime] = None  # time of slot 0
+        self.next_slot: Optional[int] = None  # the earliest slot not released yet
+        self.latest_slot: Optional[int] = None  # the latest slot with a value
+        self.late_drops: int = 0  # values dropped as too late
+        self.started: bool = (
+            False  # a slot was released, the first slot of the stream is fixed
+        )
+
+    def _get_time(self, slot: int) -> datetime:
+        return self.origin + slot * self.step
+
+    def _release_until(self, end: int) -> List[ReleasedSlot]:
+        # Release the slots before end, NaN if empty
+        released = []
+        while self.next_slot < end:
+            i = self.next_slot % self.size
+            value = self._values[i]
+            self._values[i] = None
+            released.append(
+                (self._get_time(self.next_slot), math.nan if value is None else value)
+            )
+            self.next_slot += 1
+            self.started = True
+        return released
+
+    def _release_filled(self) -> List[ReleasedSlot]:
+        # Release the filled slots up to the first empty one (once the first slot of the stream is fixed)
+        released = []
+        if not self.started:
+            return released
+        while self._values[self.next_slot % self.size] is not None:
+            released.extend(self._release_until(self.next_slot + 1))
+        return released
+
+    def push(self, valid_time: datetime, value: Optional[float]) -> List[ReleasedSlot]:
+        """
+        Add a value of the stream
+
+        :param valid_time: time the value is valid for (datetime)
+        :param value: the value (float, NaN or None if missing)
+        Returns the released slots, in time order (list of (slot time, value))
+        """
+
+        if self.origin is None:
+            self.origin = valid_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        slot = (valid_time - self.origin + self.step // 2) // self.step
+        if self.next_slot is None:
+            self.next_slot = slot
+        elif not self.started and self.latest_slot - self.size < slot < self.next_slot:
+            # An earlier first slot, within lateness of the latest value
+            self.next_slot = slot
+        if slot < self.next_slot:
+            self.late_drops += 1
+            return []
+
+        # Slots that fall out of the ring expire
+        released = self._release_until(slot - self.size + 1)
+        self._values[slot % self.size] = math.nan if value is None else value
+        if self.latest_slot is None or slot > self.latest_slot:
+            self.latest_slot = slot
+        released.extend(self._release_filled())
+        return released
+
+    def advance(self, now: datetime) -> List[ReleasedSlot]:
+        """
+        Release the slots waiting for lateness or longer, NaN if empty (also the slots of a stream
+        that stopped sending values)
+
+        :param now: the current time (datetime)
+        Returns the released slots, in time order (list of (slot time, value))
+        """
+
+        if self.next_slot is None:
+            return []
+        # The first slot that has not waited for lateness yet
+        end = (now - self.lateness - self.origin) // self.step + 1
+        released = self._release_until(end)
+        released.extend(self._release_filled())
+        return released
+
+    def flush(self) -> List[ReleasedSlot]:
+        """
+        Release the slots up to the latest value, NaN if empty (e.g. at the end of the data)
+
+        Returns the released slots, in time order (list of (slot time, value))
+        """
+
+        if self.latest_slot is None:
+            return []
+        return self._release_until(self.latest_slot + 1)
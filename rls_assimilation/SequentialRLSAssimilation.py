@@ -1,17 +1,29 @@
-from typing import Optional
-import numpy as np
+from __future__ import annotations
 
-from rls_assimilation.RLS import RLS
+import math
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from rls_assimilation.Backend import RLS, absolute, sqrt
+from rls_assimilation.Buffers import get_input_view, get_output_view
 from rls_assimilation.DataSource import DataSourceAR1
+from rls_assimilation.Metrics import AssimilationMetrics
 from rls_assimilation.RLSAssimilation import RLSAssimilation
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class SequentialRLSAssimilationOneSource:
-    def __init__(self):
-        self.source: DataSourceAR1 = DataSourceAR1()
+    def __init__(self, P_init: float = 1.0, w_init: Sequence[float] = (0.0, 0.0)):
+        self.P_init: float = P_init
+        self.w_init: Sequence[float] = w_init
+        self.source: DataSourceAR1 = DataSourceAR1(P_init, w_init)
         self.ar_model = None
         self.last_assimilated = None
         self.last_err_assimilated = None
+        # Streaming metrics updated on every assimilation step
+        self.metrics: AssimilationMetrics = AssimilationMetrics()
 
     def seq_assimilate(self, new_obs, err_new_obs):
         if self.last_assimilated is None or self.last_err_assimilated is None:
@@ -19,7 +31,7 @@ class SequentialRLSAssimilationOneSource:
             self.last_err_assimilated = err_new_obs
             return new_obs, err_new_obs
         elif self.ar_model is None:
-            self.ar_model = RLS()
+            self.ar_model = RLS(self.P_init, self.w_init)
             self.ar_model.update(self.last_assimilated, new_obs)
             self.last_assimilated = new_obs
             self.last_err_assimilated = err_new_obs
@@ -27,7 +39,7 @@ class SequentialRLSAssimilationOneSource:
         else:
             pred_assimilated = float(self.ar_model.predict(self.last_assimilated))
             pred_err_assimilated = float(
-                self.last_err_assimilated * np.abs(self.ar_model.w[1])
+                self.last_err_assimilated * absolute(self.ar_model.w[1])
                 + self.ar_model.error
             )
             self.ar_model.update(self.last_assimilated, new_obs)
@@ -40,20 +52,115 @@ class SequentialRLSAssimilationOneSource:
                 k = 1
 
             assimilated_obs = k * new_obs + (1 - k) * pred_assimilated
-            err_assimilated_obs = np.sqrt(
+            err_assimilated_obs = sqrt(
                 (k * err_new_obs) ** 2 + ((1 - k) * pred_err_assimilated) ** 2
             )
             self.last_assimilated = assimilated_obs
             self.last_err_assimilated = err_assimilated_obs
             return assimilated_obs, err_assimilated_obs
 
+    def trim_history(self):
+        self.source.trim_history()
+
+    def get_forecast_state(self):
+        """
+        State the forecast of the assimilated values starts from (see DataSourceAR1.get_forecast_state)
+        """
+        from rls_assimilation.Forecast import get_model_state
+
+        w, model_error, has_model = get_model_state(self.ar_model)
+        x = math.nan if self.last_assimilated is None else self.last_assimilated
+        err = (
+            math.nan if self.last_err_assimilated is None else self.last_err_assimilated
+        )
+        return w, model_error, has_model, x, err
+
+    def forecast(self, n_steps: int):
+        """
+        Forecast the assimilated values n_steps ahead with the AR(1) model of the sequential assimilation,
+        with the uncertainty propagated as in seq_assimilate (the state is not changed)
+
+        :param n_steps: number of steps ahead (int)
+        Returns (mean - forecast values (numpy array), err - uncertainties of the forecast values (numpy array))
+        """
+        from rls_assimilation.Forecast import forecast_streams
+
+        mean, err = forecast_streams([self], n_steps)
+        return mean[:, 0], err[:, 0]
+
     def assimilate(self, obs: Optional[float]):
         source1_obs, err_source1 = self.source.estimate(obs)
         assimilated_obs, err_assimilated_obs = self.seq_assimilate(
             source1_obs, err_source1
         )
+        self.metrics.update(
+            obs, None, assimilated_obs, err_source1, None, err_assimilated_obs
+        )
         return assimilated_obs, err_assimilated_obs
 
+    def fast_forward(
+        self, n_steps: int, obs: Optional[np.ndarray] = None
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate n_steps while the data source is offline
+        (the same as calling assimilate for each step, see RLSAssimilation.fast_forward)
+
+        An offline source is imputed in closed form (DataSourceAR1.fast_forward), the observations of an online
+        source are estimated at once (DataSourceAR1.estimate_many); the sequential assimilation and its AR(1) model
+        are advanced step by step.
+
+        :param: n_steps - the number of steps (int)
+        :param: obs - values from the data source during the gap (array-like of n_steps floats, or None if offline)
+
+        Returns (assimilated_obs - assimilated values (numpy array), err_assimilated_obs - uncertainties of assimilated_obs (numpy array))
+        """
+        import numpy as np
+
+        if obs is None:
+            source_obs, err_source = self.source.fast_forward(n_steps)
+        else:
+            if len(obs) != n_steps:
+                raise ValueError(f"obs must have {n_steps} values, got {len(obs)}")
+            source_obs, err_source = self.source.estimate_many(obs)
+
+        assimilated_obs = np.empty(n_steps)
+        err_assimilated_obs = np.empty(n_steps)
+        for i in range(n_steps):
+            assimilated_obs[i], err_assimilated_obs[i] = self.seq_assimilate(
+                float(source_obs[i]), float(err_source[i])
+            )
+
+        self.metrics.update_many(
+            [None] * n_steps if obs is None else obs,
+            [None] * n_steps,
+            assimilated_obs,
+            err_source,
+            None,
+            err_assimilated_obs,
+        )
+
+        return assimilated_obs, err_assimilated_obs
+
+    def assimilate_buffer(self, obs, out=None, err_out=None):
+        """
+        Assimilate a series of values from a buffer, writing the results to output buffers
+        (the same as calling assimilate for each step, see RLSAssimilation.assimilate_buffer)
+
+        :param obs: values of the source (float64 or float32 buffer, NaN if missing)
+        :param out: writable float64 or float32 buffer the assimilated values are written to (or None - a new array.array)
+        :param err_out: writable buffer the uncertainties are written to (as out)
+        Returns (out - the buffer of the assimilated values, err_out - the buffer of their uncertainties)
+        """
+        obs = get_input_view(obs, "obs")
+        n_steps = len(obs)
+        out, out_view = get_output_view(out, n_steps, "out")
+        err_out, err_out_view = get_output_view(err_out, n_steps, "err_out")
+
+        assimilate = self.assimilate
+        for i in range(n_steps):
+            out_view[i], err_out_view[i] = assimilate(obs[i])
+        return out, err_out
+
 
 class SequentialRLSAssimilationTwoSources(
     RLSAssimilation, SequentialRLSAssimilationOneSource
@@ -67,17 +174,45 @@ class SequentialRLSAssimilationTwoSources(
     :param s_in2: spatial scale of source1  (str)
     :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
     :param s_out: spatial scale of assimilation output (str)
+    :param use_timestamps: assimilate timestamped data with calendar averages (bool, see RLSAssimilation)
+    :param P_init: initial state matrix of all RLS models as a multiple of the identity (float, see RLS)
+    :param w_init: initial weights of all RLS models (constant and coefficient)
     """
 
     def __init__(
-        self, t_in1: str, t_in2: str, s_in1: str, s_in2: str, t_out: str, s_out: str
+        self,
+        t_in1: str,
+        t_in2: str,
+        s_in1: str,
+        s_in2: str,
+        t_out: str,
+        s_out: str,
+        use_timestamps: bool = False,
+        P_init: float = 1.0,
+        w_init: Sequence[float] = (0.0, 0.0),
     ):
-        RLSAssimilation.__init__(self, t_in1, t_in2, s_in1, s_in2, t_out, s_out)
-        SequentialRLSAssimilationOneSource.__init__(self)
+        RLSAssimilation.__init__(
+            self,
+            t_in1,
+            t_in2,
+            s_in1,
+            s_in2,
+            t_out,
+            s_out,
+            use_timestamps,
+            P_init,
+            w_init,
+        )
+        SequentialRLSAssimilationOneSource.__init__(self, P_init, w_init)
 
-    def assimilate(self, obs1: Optional[float], obs2: Optional[float]):
-        assimilated_obs, err_assimilated_obs = RLSAssimilation.assimilate(
-            self, obs1, obs2
+    def assimilate(
+        self,
+        obs1: Optional[float],
+        obs2: Optional[float],
+        timestamp: Optional[datetime] = None,
+    ):
+        assimilated_obs, err_assimilated_obs = RLSAssimilation._assimilate_step(
+            self, obs1, obs2, timestamp
         )
         (
             assimilated_obs,
@@ -85,4 +220,53 @@ class SequentialRLSAssimilationTwoSources(
         ) = SequentialRLSAssimilationOneSource.seq_assimilate(
             self, assimilated_obs, err_assimilated_obs
         )
+        self._update_metrics(obs1, obs2, assimilated_obs, err_assimilated_obs)
+        return assimilated_obs, err_assimilated_obs
+
+    def fast_forward(
+        self,
+        n_steps: int,
+        obs1: Optional[np.ndarray] = None,
+        obs2: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate n_steps while one or both data sources are offline
+        (the same as calling assimilate for each step, see RLSAssimilation.fast_forward)
+
+        The sources are fast-forwarded as in RLSAssimilation, then the sequential assimilation
+        and its AR(1) model are advanced step by step over the gap.
+
+        :param: n_steps - the number of steps (int)
+        :param: obs1 - values from the first data source during the gap (array-like of n_steps floats, or None if offline)
+        :param: obs2 - values from the second data source during the gap (array-like of n_steps floats, or None if offline)
+
+        Returns (assimilated_obs - assimilated values (numpy array), err_assimilated_obs - uncertainties of assimilated_obs (numpy array))
+        """
+
+        (
+            assimilated_obs,
+            err_assimilated_obs,
+            ar_err_source1,
+            ar_err_source2,
+            err_calibrated,
+        ) = RLSAssimilation._fast_forward_estimated(self, n_steps, obs1, obs2)
+
+        for i in range(n_steps):
+            (
+                assimilated_obs[i],
+                err_assimilated_obs[i],
+            ) = SequentialRLSAssimilationOneSource.seq_assimilate(
+                self, float(assimilated_obs[i]), float(err_assimilated_obs[i])
+            )
+
+        self.metrics.update_many(
+            [None] * n_steps if obs1 is None else obs1,
+            [None] * n_steps if obs2 is None else obs2,
+            assimilated_obs,
+            ar_err_source1,
+            ar_err_source2,
+            err_assimilated_obs,
+            err_calibrated,
+        )
+
         return assimilated_obs, err_assimilated_obs
@@ -0,0 +1,198 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence
+
+# An observation row of a tick: (key, *arguments of the assimilate method of the stream)
+TickRow = Sequence[Any]
+
+
+class _Shard:
+    """
+    Streams of one shard and the lock guarding them and their assimilators
+    """
+
+    def __init__(self):
+        self.lock: threading.Lock = threading.Lock()
+        self.assimilators: Dict[Hashable, Any] = {}
+
+
+class ShardedStreamRegistry:
+    """
+    Thread-safe registry of per-stream assimilators (e.g. RLSAssimilation per station), for thread pools
+    and free-threaded Python builds
+
+    The assimilators mutate their state without locking, so each one must only be used by one thread at a time.
+    The streams are split into shards by the hash of their keys, and every access to a stream holds the lock of
+    its shard. assimilate_tick runs the observations of a tick on a pool of threads with one task per shard:
+    the streams of different shards are assimilated in parallel, and the observations of a stream are
+    assimilated in the order they are given. A tick returns when all its observations are assimilated,
+    so the ticks given by one thread are assimilated in order.
+
+    :param make_assimilator: creates the assimilator of a new stream from its key (callable, e.g.
+    lambda key: RLSAssimilation("hourly", "hourly", "obs", "model", "hourly", "obs"))
+    :param n_shards: number of shards (int)
+    :param n_workers: number of threads of assimilate_tick (int or None - as ThreadPoolExecutor)
+    """
+
+    def __init__(
+        self,
+        make_assimilator: Callable[[Hashable], Any],
+        n_shards: int = 16,
+        n_workers: Optional[int] = None,
+    ):
+        if n_shards < 1:
+            raise ValueError(f"Number of shards must be positive, got {n_shards}")
+
+        self.make_assimilator: Callable[[Hashable], Any] = make_assimilator
+        self.shards: List[_Shard] = [_Shard() for _ in range(n_shards)]
+        self.n_workers: Optional[int] = n_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock: threading.Lock = threading.Lock()
+
+    def _get_shard(self, key: Hashable) -> _Shard:
+        return self.shards[hash(key) % len(self.shards)]
+
+    def _get_or_create(self, shard: _Shard, key: Hashable) -> Any:
+        # The lock of the shard must be held
+        assimilator = shard.assimilators.get(key)
+        if assimilator is None:
+            assimilator = self.make_assimilator(key)
+            shard.assimilators[key] = assimilator
+        return assimilator
+
+    @contextmanager
+    def locked(self, key: Hashable) -> Iterator[Any]:
+        """
+        Use the assimilator of a stream (created if new) while holding the lock of its shard, e.g.
+        to read its state or call other methods: with registry.locked(key) as assimilator: ...
+
+        :param key: key of the stream (hashable)
+        """
+
+        shard = self._get_shard(key)
+        with shard.lock:
+            yield self._get_or_create(shard, key)
+
+    def assimilate(self, key: Hashable, *obs) -> Any:
+        """
+        Assimilate observations of a stream (created if new)
+
+        :param key: key of the stream (hashable)
+        :param obs: arguments of the assimilate method of the stream, e.g. obs1, obs2
+        Returns the result of the assimilate method, e.g. (assimilated value, uncertainty)
+        """
+
+        shard = self._get_shard(key)
+        with shard.lock:
+            return self._get_or_create(shard, key).assimilate(*obs)
+
+    def remove(self, key: Hashable) -> Optional[Any]:
+        """
+        Remove a stream
+
+        :param key: key of the stream (hashable)
+        Returns the assimilator of the stream (or None if there is no such stream)
+        """
+
+        shard = self._get_shard(key)
+        with shard.lock:
+            return shard.assimilators.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        """
+        Keys of all streams, shard by shard
+        """
+
+        keys = []
+        for shard in self.shards:
+            with shard.lock:
+                keys.extend(shard.assimilators)
+        return keys
+
+    def __len__(self) -> int:
+        return sum(len(shard.assimilators) for shard in self.shards)
+
+    def __contains__(self, key: Hashable) -> bool:
+        shard = self._get_shard(key)
+        with shard.lock:
+            return key in shard.assimilators
+
+    def _assimilate_shard(
+        self, shard: _Shard, rows: List[TickRow], positions: List[int], results: list
+    ):
+        with shard.lock:
+            for row, position in zip(rows, positions):
+                results[position] = self._get_or_create(shard, row[0]).assimilate(
+                    *row[1:]
+                )
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.n_workers, thread_name_prefix="ShardedStreamRegistry"
+                )
+            return self._executor
+
+    def assimilate_tick(self, rows: Sequence[TickRow]) -> list:
+        """
+        Assimilate the observations of a tick, the shards in parallel on the thread pool
+
+        :param rows: observations (sequence of (key, *arguments of the assimilate method),
+        e.g. (station, obs1, obs2)); a stream may have several rows, assimilated in their order
+        Returns the results of the rows, in their order (list)
+        """
+
+        # Rows and their positions by shard, in the order of the rows
+        shard_rows: Dict[int, List[TickRow]] = {}
+        shard_positions: Dict[int, List[int]] = {}
+        for position, row in enumerate(rows):
+            shard_idx = hash(row[0]) % len(self.shards)
+            shard_rows.setdefault(shard_idx, []).append(row)
+            shard_positions.setdefault(shard_idx, []).append(position)
+
+        results = [None] * len(rows)
+        if len(shard_rows) <= 1:
+            for shard_idx in shard_rows:
+                self._assimilate_shard(
+                    self.shards[shard_idx],
+                    shard_rows[shard_idx],
+                    shard_positions[shard_idx],
+                    results,
+                )
+            return results
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(
+                self._assimilate_shard,
+                self.shards[shard_idx],
+                shard_rows[shard_idx],
+                shard_positions[shard_idx],
+                results,
+            )
+            for shard_idx in shard_rows
+        ]
+        # Wait for all shards, then raise the first error
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+        return results
+
+    def close(self):
+        """
+        Stop the threads of assimilate_tick (the streams are kept, a later tick starts new threads)
+        """
+
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
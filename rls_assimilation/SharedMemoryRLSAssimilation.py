@@ -0,0 +1,389 @@
+import multiprocessing
+import traceback
+import zlib
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+from rls_assimilation.Buffers import as_input_array, as_output_array
+from rls_assimilation.MultiSourceRLSAssimilation import MultiSourceRLSAssimilation
+
+# State arrays of MultiSourceRLSAssimilation, all with the streams along the first axis
+_STATE_PATHS = [
+    "sources.x_past",
+    "sources.has_ar_model",
+    "sources.ar_model.P",
+    "sources.ar_model.w",
+    "sources.ar_model.error",
+    "sources.spatial_r_model.P",
+    "sources.spatial_r_model.w",
+    "sources.spatial_r_model.error",
+    "sources.is_calibration_started",
+    "sources.temporal_model.current_average",
+    "sources.temporal_model.current_average_err",
+    "sources.temporal_model.latest_daily_average",
+    "sources.temporal_model.latest_daily_average_err",
+    "sources.temporal_model.counter",
+    "sources.temporal_model.has_r_model",
+    "sources.temporal_model.r_model.P",
+    "sources.temporal_model.r_model.w",
+    "sources.temporal_model.r_model.error",
+]
+_MAGIC = 0x524C5342414E4B  # "RLSBANK"
+_ALIGNMENT = 64  # bytes, arrays start on cache lines
+# Header fields (int64)
+_HEADER_MAGIC, _HEADER_LAYOUT, _HEADER_N_TICKS, _HEADER_IS_IN_TICK = range(4)
+
+
+def _get_parent_and_attribute(obj, path: str):
+    *parents, attribute = path.split(".")
+    for parent in parents:
+        obj = getattr(obj, parent)
+    return obj, attribute
+
+
+def _get_layout(
+    assimilator: MultiSourceRLSAssimilation,
+) -> (List[Tuple[str, Tuple[int, ...], np.dtype, int]], int, int):
+    # (name, shape, dtype, offset) of the header, the buffers for observations and results, and the state arrays,
+    # the size of the segment and the checksum of the layout
+    n_streams = assimilator.shape[0]
+    arrays = [
+        ("header", (4,), np.dtype(np.int64)),
+        ("obs", (n_streams, len(assimilator.t_ins)), assimilator.dtype),
+        ("assimilated_obs", (n_streams,), assimilator.dtype),
+        ("err_assimilated_obs", (n_streams,), assimilator.dtype),
+    ]
+    for path in _STATE_PATHS:
+        parent, attribute = _get_parent_and_attribute(assimilator, path)
+        array = getattr(parent, attribute)
+        arrays.append((path, array.shape, array.dtype))
+
+    layout = []
+    offset = 0
+    for name, shape, dtype in arrays:
+        layout.append((name, shape, dtype, offset))
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        offset += -(-nbytes // _ALIGNMENT) * _ALIGNMENT
+    description = repr(
+        [
+            assimilator.t_ins,
+            assimilator.s_ins,
+            assimilator.t_out,
+            assimilator.s_out,
+            [(name, shape, dtype.str) for name, shape, dtype, _ in layout],
+        ]
+    )
+    return layout, offset, zlib.crc32(description.encode())
+
+
+def _map_arrays(
+    buffer, layout: List[Tuple[str, Tuple[int, ...], np.dtype, int]]
+) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+        for name, shape, dtype, offset in layout
+    }
+
+
+def _bind_state(
+    assimilator: MultiSourceRLSAssimilation,
+    arrays: Dict[str, np.ndarray],
+    streams: slice,
+):
+    # Replace the state arrays of the assimilator with views of the shared arrays
+    for path in _STATE_PATHS:
+        parent, attribute = _get_parent_and_attribute(assimilator, path)
+        setattr(parent, attribute, arrays[path][streams])
+
+
+def _run_worker(
+    segment: shared_memory.SharedMemory,
+    layout: List[Tuple[str, Tuple[int, ...], np.dtype, int]],
+    config: Tuple[List[str], List[str], str, str, np.dtype],
+    streams: slice,
+    conn,
+):
+    # Assimilates the slice of streams owned by the worker on every tick until the coordinator stops it or exits
+    arrays = _map_arrays(segment.buf, layout)
+    t_ins, s_ins, t_out, s_out, dtype = config
+    assimilator = MultiSourceRLSAssimilation(
+        t_ins, s_ins, t_out, s_out, shape=(streams.stop - streams.start,), dtype=dtype
+    )
+    _bind_state(assimilator, arrays, streams)
+    obs = arrays["obs"][streams]
+    assimilated_obs = arrays["assimilated_obs"][streams]
+    err_assimilated_obs = arrays["err_assimilated_obs"][streams]
+    parent = multiprocessing.parent_process()
+
+    while True:
+        if not conn.poll(1.0):
+            if parent is not None and not parent.is_alive():
+                break
+            continue
+        if conn.recv() is None:
+            break
+        try:
+            assimilated_obs[...], err_assimilated_obs[...] = assimilator.assimilate(obs)
+            conn.send(None)
+        except Exception:
+            conn.send(traceback.format_exc())
+
+    conn.close()
+
+
+class SharedMemoryRLSAssimilation:
+    """
+    Least-squares assimilation of K data sources for a bank of streams sharded over worker processes
+
+    The state of all streams (see MultiSourceRLSAssimilation) lives in one shared memory segment.
+    Each worker owns a contiguous slice of streams and updates it in place on every tick,
+    the coordinator only writes the observations and reads the results, so no state is pickled.
+    Workers are forked when the bank is created (the "fork" start method is required).
+
+    Without a name, the segment is removed on close or by the multiprocessing resource tracker
+    if the coordinator exits abnormally. A named segment outlives the coordinator: creating the bank
+    with the same name and configuration attaches to the segment and resumes from its state,
+    and SharedMemoryRLSAssimilation.unlink removes a segment that is no longer needed.
+
+    :param t_ins: temporal scales of the sources (list of str, "hourly" or "daily")
+    :param s_ins: spatial scales of the sources (list of str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param n_streams: number of independent streams, e.g. stations (int)
+    :param n_workers: number of worker processes (int or None - the number of CPUs)
+    :param name: name of a persistent shared memory segment (str or None - a temporary segment)
+    :param dtype: floating point type of the state and the results (numpy dtype, float64 or float32)
+    """
+
+    def __init__(
+        self,
+        t_ins: List[str],
+        s_ins: List[str],
+        t_out: str,
+        s_out: str,
+        n_streams: int,
+        n_workers: Optional[int] = None,
+        name: Optional[str] = None,
+        dtype: DTypeLike = np.float64,
+    ):
+        # The bank of the coordinator validates the configuration and gives the initial state
+        self.bank: MultiSourceRLSAssimilation = MultiSourceRLSAssimilation(
+            t_ins, s_ins, t_out, s_out, shape=(n_streams,), dtype=dtype
+        )
+        self.n_streams: int = n_streams
+        self.name: Optional[str] = name
+        n_workers = min(n_workers or multiprocessing.cpu_count(), n_streams)
+        layout, size, layout_checksum = _get_layout(self.bank)
+
+        self.segment: Optional[shared_memory.SharedMemory] = None
+        is_resumed = False
+        if name is not None:
+            try:
+                self.segment = shared_memory.SharedMemory(name=name)
+                is_resumed = True
+            except FileNotFoundError:
+                pass
+        if self.segment is None:
+            self.segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+        if name is not None:
+            # A persistent segment must not be removed by the resource tracker when the coordinator exits
+            resource_tracker.unregister(self.segment._name, "shared_memory")
+
+        config_error = ValueError(
+            f"Shared memory segment {name} does not hold a bank of this configuration"
+        )
+        if is_resumed and self.segment.size < size:
+            self._release(unlink=False)
+            raise config_error
+
+        self.arrays: Dict[str, np.ndarray] = _map_arrays(self.segment.buf, layout)
+        header = self.arrays["header"]
+        if is_resumed:
+            error = None
+            if (
+                header[_HEADER_MAGIC] != _MAGIC
+                or header[_HEADER_LAYOUT] != layout_checksum
+            ):
+                error = config_error
+            elif header[_HEADER_IS_IN_TICK]:
+                error = RuntimeError(
+                    f"Shared memory segment {name} was left in the middle of a tick, its state is inconsistent"
+                )
+            if error is not None:
+                del header  # views must be released before the segment is closed
+                self._release(unlink=False)
+                raise error
+        else:
+            for path in _STATE_PATHS:
+                parent, attribute = _get_parent_and_attribute(self.bank, path)
+                self.arrays[path][...] = getattr(parent, attribute)
+            header[_HEADER_MAGIC] = _MAGIC
+            header[_HEADER_LAYOUT] = layout_checksum
+            header[_HEADER_N_TICKS] = 0
+            header[_HEADER_IS_IN_TICK] = 0
+        _bind_state(self.bank, self.arrays, slice(None))
+
+        # Fork workers, each owning a contiguous slice of streams
+        context = multiprocessing.get_context("fork")
+        config = (self.bank.t_ins, self.bank.s_ins, t_out, s_out, self.bank.dtype)
+        bounds = np.linspace(0, n_streams, n_workers + 1).astype(int)
+        self.connections = []
+        self.workers = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            conn, worker_conn = context.Pipe()
+            worker = context.Process(
+                target=_run_worker,
+                args=(self.segment, layout, config, slice(start, stop), worker_conn),
+                daemon=True,
+            )
+            worker.start()
+            worker_conn.close()
+            self.connections.append(conn)
+            self.workers.append(worker)
+
+    @property
+    def n_ticks(self) -> int:
+        """
+        Number of completed ticks, including those before the bank was resumed
+        """
+
+        return int(self.arrays["header"][_HEADER_N_TICKS])
+
+    def assimilate(
+        self,
+        obs: np.ndarray,
+        out: Optional[np.ndarray] = None,
+        err_out: Optional[np.ndarray] = None,
+    ) -> (np.ndarray, np.ndarray):
+        """
+        Assimilate values of all streams from K data sources with unknown uncertainty
+
+        The observations are copied into the shared segment straight from their buffer, and the results
+        are copied from it into out and err_out if given (see MultiSourceRLSAssimilation.assimilate).
+
+        :param: obs - values from the data sources (numpy array or buffer of shape (n_streams, K) or flat, NaN if missing)
+        :param: out - buffer the assimilated values are written to (writable buffer of n_streams values,
+        or None - a new array)
+        :param: err_out - buffer the uncertainties are written to (as out)
+
+        Returns (assimilated_obs - assimilated values (numpy array of shape (n_streams,), a view of out if given),
+        err_assimilated_obs - uncertainties of assimilated_obs (numpy array of shape (n_streams,), a view of err_out if given))
+        """
+
+        if self.segment is None:
+            raise RuntimeError("The bank is closed")
+
+        obs_array = self.arrays["obs"]
+        out = as_output_array(out, self.arrays["assimilated_obs"].shape, "out")
+        err_out = as_output_array(
+            err_out, self.arrays["err_assimilated_obs"].shape, "err_out"
+        )
+        header = self.arrays["header"]
+        obs_array[...] = as_input_array(obs, obs_array.shape)
+        header[_HEADER_IS_IN_TICK] = 1
+        is_sent = []
+        for conn in self.connections:
+            try:
+                conn.send(int(header[_HEADER_N_TICKS]))
+                is_sent.append(True)
+            except OSError:
+                is_sent.append(False)
+
+        errors = []
+        for conn, worker, is_worker_sent in zip(
+            self.connections, self.workers, is_sent
+        ):
+            error = self._wait_for_worker(conn, worker) if is_worker_sent else None
+            if error is None and not worker.is_alive():
+                worker.join()
+                error = f"Worker {worker.pid} exited with code {worker.exitcode}"
+            if error is not None:
+                errors.append(error)
+        if errors:
+            # The state of the failed tick is inconsistent, a named segment is kept for inspection
+            self.close(unlink=self.name is None)
+            raise RuntimeError(
+                "Assimilation failed in worker processes:\n" + "\n".join(errors)
+            )
+
+        header[_HEADER_N_TICKS] += 1
+        header[_HEADER_IS_IN_TICK] = 0
+
+        if out is None:
+            out = self.arrays["assimilated_obs"].copy()
+        else:
+            out[...] = self.arrays["assimilated_obs"]
+        if err_out is None:
+            err_out = self.arrays["err_assimilated_obs"].copy()
+        else:
+            err_out[...] = self.arrays["err_assimilated_obs"]
+        return out, err_out
+
+    @staticmethod
+    def _wait_for_worker(conn, worker) -> Optional[str]:
+        # The traceback of a failed tick, or None if the tick is done or the worker has exited
+        try:
+            wait([conn, worker.sentinel])
+            return conn.recv() if conn.poll() else None
+        except (EOFError, OSError):
+            return None
+
+    def _release(self, unlink: bool):
+        self.bank = None
+        self.arrays = None
+        self.segment.close()
+        if unlink:
+            self.segment.unlink()
+        self.segment = None
+
+    def close(self, unlink: Optional[bool] = None):
+        """
+        Stop the workers and release the shared memory segment
+
+        :param unlink: remove the segment (bool or None - only a temporary segment is removed,
+        a named one is kept for resuming)
+        """
+
+        if self.segment is None:
+            return
+
+        for conn, worker in zip(self.connections, self.workers):
+            if worker.is_alive():
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+        for conn, worker in zip(self.connections, self.workers):
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+            conn.close()
+
+        if unlink is None:
+            unlink = self.name is None
+        if unlink and self.name is not None:
+            # Unregistered when created, register for unlink to unregister it
+            resource_tracker.register(self.segment._name, "shared_memory")
+        self._release(unlink)
+
+    @staticmethod
+    def unlink(name: str):
+        """
+        Remove a persistent shared memory segment, e.g. left by a coordinator that exited abnormally
+
+        :param name: name of the segment (str)
+        """
+
+        segment = shared_memory.SharedMemory(name=name)
+        segment.close()
+        segment.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
@@ -0,0 +1,229 @@
+import bisect
+import heapq
+import itertools
+import math
+from datetime import datetime, timedelta
+from typing import Hashable, List, Optional, Sequence, Tuple, Union
+
+# An aligned slot of a stream: (key, slot time, values of the sources, NaN if missing)
+AlignedRow = Tuple[Hashable, datetime, List[float]]
+
+
+class _AlignedStream:
+    """
+    State of one keyed stream: per source, the buffered (valid time, value) pairs sorted by valid time
+    and the latest valid time received (watermark)
+    """
+
+    def __init__(self, n_sources: int, next_slot: datetime):
+        self.buffers: List[List[Tuple[datetime, float]]] = [
+            [] for _ in range(n_sources)
+        ]
+        self.watermarks: List[Optional[datetime]] = [None] * n_sources
+        self.next_slot: datetime = next_slot  # the earliest slot not emitted yet
+        self.has_deadline: bool = (
+            True  # the stream has an entry in the heap of deadlines
+        )
+
+
+class StreamAligner:
+    """
+    As-of join of independently arriving sources (e.g. station readings and SILAM values) of many keyed streams
+
+    Each stream is emitted on a regular grid of slots (e.g. hourly). A slot gets, from every source, the value
+    with the valid time nearest to the slot within the tolerance of the source. Sources are assumed to arrive
+    in the order of valid time, so a slot is emitted as soon as every source has sent a value at or after it.
+    Otherwise it is emitted when its deadline (slot time + max_delay) passes, see advance, with NaN for
+    the sources without a value, which DataSourceAR1 then imputes.
+
+    A stream whose sources have all sent nothing for max_delay after its latest value is idle: advance stops
+    emitting its slots (and drops its deadline) once the pending slot is later than the latest value by more
+    than max_delay. When a value arrives again, the slots of the gap are emitted as usual, with NaN for the missing
+    values, so the stream stays on its grid of slots.
+
+    Values too old for the pending slots are dropped and counted in late_drops.
+    Memory is bounded: buffers only keep values that can still be paired, at most buffer_size per source
+    and stream (when a buffer is full, the pending slots of the stream are emitted early), and the deadlines
+    are kept in a heap with one entry per stream.
+
+    :param n_sources: number of sources of every stream (int)
+    :param step: time between the slots (timedelta)
+    :param tolerance: largest distance between the valid time of a value and its slot
+    (timedelta, or a sequence of timedelta, one per source)
+    :param max_delay: time after a slot until it is emitted with missing values (timedelta)
+    :param buffer_size: largest number of values buffered per source and stream (int)
+    """
+
+    def __init__(
+        self,
+        n_sources: int = 2,
+        step: timedelta = timedelta(hours=1),
+        tolerance: Union[timedelta, Sequence[timedelta]] = timedelta(0),
+        max_delay: timedelta = timedelta(hours=1),
+        buffer_size: int = 256,
+    ):
+        self.n_sources: int = n_sources
+        self.step: timedelta = step
+        self.tolerances: List[timedelta] = (
+            [tolerance] * n_sources
+            if isinstance(tolerance, timedelta)
+            else list(tolerance)
+        )
+        if len(self.tolerances) != n_sources:
+            raise ValueError(
+                f"Tolerances must be given for {n_sources} sources, got {len(self.tolerances)}"
+            )
+        self.max_delay: timedelta = max_delay
+        self.buffer_size: int = buffer_size
+
+        self.streams: dict = {}
+        # (deadline of the earliest pending slot, insertion order, key), one entry per stream
+        self._deadlines: List[Tuple[datetime, int, Hashable]] = []
+        self._counter = itertools.count()
+        self.late_drops: int = 0  # values dropped as too old for the pending slots
+
+    def _get_first_slot(self, valid_time: datetime, tolerance: timedelta) -> datetime:
+        # The first slot the value can be paired with: the earliest slot at or after valid_time - tolerance,
+        # on the grid of steps from the start of the day
+        earliest = valid_time - tolerance
+        day_start = earliest.replace(hour=0, minute=0, second=0, microsecond=0)
+        n_steps = -((day_start - earliest) // self.step)
+        return day_start + n_steps * self.step
+
+    def _pick(
+        self, buffer: List[Tuple[datetime, float]], slot: datetime, tolerance: timedelta
+    ) -> float:
+        # The value nearest to the slot within the tolerance (the earlier one of equally near values)
+        i = bisect.bisect_left(buffer, (slot - tolerance,))
+        best = math.nan
+        best_distance = None
+        while i < len(buffer) and buffer[i][0] <= slot + tolerance:
+            distance = abs(buffer[i][0] - slot)
+            if best_distance is None or distance < best_distance:
+                best, best_distance = buffer[i][1], distance
+            i += 1
+        return best
+
+    def _emit(self, key: Hashable, stream: _AlignedStream) -> AlignedRow:
+        # Emit the earliest pending slot and drop the values no later slot can use
+        slot = stream.next_slot
+        values = [
+            self._pick(buffer, slot, tolerance)
+            for buffer, tolerance in zip(stream.buffers, self.tolerances)
+        ]
+        stream.next_slot = slot + self.step
+        for buffer, tolerance in zip(stream.buffers, self.tolerances):
+            del buffer[: bisect.bisect_left(buffer, (stream.next_slot - tolerance,))]
+        return key, slot, values
+
+    def _is_idle(self, stream: _AlignedStream) -> bool:
+        # No source has sent a value for max_delay before the earliest pending slot
+        latest = max(
+            (watermark for watermark in stream.watermarks if watermark is not None),
+            default=None,
+        )
+        return latest is None or stream.next_slot > latest + self.max_delay
+
+    def _is_complete(self, stream: _AlignedStream) -> bool:
+        # Every source has sent a value at or after the earliest pending slot
+        return all(
+            watermark is not None and watermark >= stream.next_slot
+            for watermark in stream.watermarks
+        )
+
+    def push(
+        self, key: Hashable, source: int, valid_time: datetime, value: float
+    ) -> List[AlignedRow]:
+        """
+        Add a value of a source of a stream
+
+        :param key: key of the stream, e.g. a station id (hashable)
+        :param source: index of the source (int)
+        :param valid_time: time the value is valid for (datetime)
+        :param value: the value (float, NaN or None if missing)
+        Returns the slots of the stream completed by the value (list of (key, slot time, values))
+        """
+
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = _AlignedStream(
+                self.n_sources,
+                self._get_first_slot(valid_time, self.tolerances[source]),
+            )
+            self.streams[key] = stream
+            heapq.heappush(
+                self._deadlines,
+                (stream.next_slot + self.max_delay, next(self._counter), key),
+            )
+        elif not stream.has_deadline:
+            # An idle stream receives values again
+            stream.has_deadline = True
+            heapq.heappush(
+                self._deadlines,
+                (stream.next_slot + self.max_delay, next(self._counter), key),
+            )
+
+        rows = []
+        tolerance = self.tolerances[source]
+        # Values too old for the pending slots are dropped
+        if valid_time >= stream.next_slot - tolerance:
+            buffer = stream.buffers[source]
+            bisect.insort(buffer, (valid_time, math.nan if value is None else value))
+            # A full buffer releases the pending slots until its oldest value is used up
+            while len(buffer) > self.buffer_size:
+                rows.append(self._emit(key, stream))
+        else:
+            self.late_drops += 1
+
+        watermark = stream.watermarks[source]
+        if watermark is None or valid_time > watermark:
+            stream.watermarks[source] = valid_time
+        while self._is_complete(stream):
+            rows.append(self._emit(key, stream))
+        return rows
+
+    def advance(self, now: datetime) -> List[AlignedRow]:
+        """
+        Emit the slots of all streams whose deadline has passed, with NaN for the missing values
+        (up to max_delay after the latest value of a stream, see StreamAligner)
+
+        :param now: the current time (datetime)
+        Returns the emitted slots, in the order of their deadlines (list of (key, slot time, values))
+        """
+
+        rows = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, key = heapq.heappop(self._deadlines)
+            stream = self.streams[key]
+            # The entry may be older than the pending slot if slots were completed in the meantime
+            while stream.next_slot + self.max_delay <= now and not self._is_idle(
+                stream
+            ):
+                rows.append(self._emit(key, stream))
+            if self._is_idle(stream):
+                # Not re-armed until the stream receives a value
+                stream.has_deadline = False
+                continue
+            heapq.heappush(
+                self._deadlines,
+                (stream.next_slot + self.max_delay, next(self._counter), key),
+            )
+        rows.sort(key=lambda row: row[1])
+        return rows
+
+    def flush(self) -> List[AlignedRow]:
+        """
+        Emit the pending slots of all streams up to the latest buffered valid time (e.g. at the end of the data)
+
+        Returns the emitted slots (list of (key, slot time, values))
+        """
+
+        rows = []
+        for key, stream in self.streams.items():
+            latest = max(
+                (watermark for watermark in stream.watermarks if watermark is not None),
+                default=None,
+            )
+            while latest is not None and stream.next_slot <= latest:
+                rows.append(self._emit(key, stream))
+        return rows
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Sequence, Tuple, Union
+
+from rls_assimilation.AssimilationStep import Step, make_assimilation_step
+from rls_assimilation.RLSAssimilation import RLSAssimilation
+from rls_assimilation.StreamAligner import AlignedRow, StreamAligner
+
+# An assimilated slot of a stream: (key, slot time, assimilated value, its uncertainty)
+AssimilatedRow = Tuple[Hashable, datetime, float, float]
+
+
+class StreamingRLSAssimilation:
+    """
+    Least-squares assimilation of 2 independently arriving data sources for many keyed streams (e.g. stations)
+
+    The values of both sources are aligned by valid time (see StreamAligner) and every aligned slot
+    is assimilated by the RLSAssimilation of its stream, created on the first value of the stream.
+    A source missing a slot gets NaN, which is imputed by its AR(1) model.
+
+    :param t_in1: temporal scale of source1 (str, "hourly" or "daily")
+    :param t_in2: temporal scale of source2 (str, "hourly" or "daily")
+    :param s_in1: spatial scale of source1 (str)
+    :param s_in2: spatial scale of source2 (str)
+    :param t_out: temporal scale of assimilation output (str, "hourly" or "daily")
+    :param s_out: spatial scale of assimilation output (str)
+    :param use_timestamps: assimilate the slots with their times, see RLSAssimilation (bool)
+    :param step: time between the slots (timedelta)
+    :param tolerance: largest distance between the valid time of a value and its slot
+    (timedelta, or a pair of timedelta, one per source)
+    :param max_delay: time after a slot until it is assimilated with missing values (timedelta)
+    :param buffer_size: largest number of values buffered per source and stream (int)
+    """
+
+    def __init__(
+        self,
+        t_in1: str,
+        t_in2: str,
+        s_in1: str,
+        s_in2: str,
+        t_out: str,
+        s_out: str,
+        use_timestamps: bool = False,
+        step: timedelta = timedelta(hours=1),
+        tolerance: Union[timedelta, Sequence[timedelta]] = timedelta(0),
+        max_delay: timedelta = timedelta(hours=1),
+        buffer_size: int = 256,
+    ):
+        self.config: Tuple[str, str, str, str, str, str] = (
+            t_in1,
+            t_in2,
+            s_in1,
+            s_in2,
+            t_out,
+            s_out,
+        )
+        self.use_timestamps: bool = use_timestamps
+        # Validate the configuration before any data arrives
+        RLSAssimilation(*self.config, use_timestamps)
+
+        self.aligner: StreamAligner = StreamAligner(
+            2, step, tolerance, max_delay, buffer_size
+        )
+        self.assimilators: Dict[Hashable, RLSAssimilation] = {}
+        self._steps: Dict[Hashable, Step] = {}
+
+    def _assimilate(self, rows: List[AlignedRow]) -> List[AssimilatedRow]:
+        results = []
+        for key, slot, (obs1, obs2) in rows:
+            step = self._steps.get(key)
+            if step is None:
+                self.assimilators[key], step = make_assimilation_step(
+                    *self.config, self.use_timestamps
+                )
+                self._steps[key] = step
+            assimilated_obs, err_assimilated_obs = step(
+                obs1, obs2, slot if self.use_timestamps else None
+            )
+            results.append((key, slot, assimilated_obs, err_assimilated_obs))
+        return results
+
+    def push(
+        self, key: Hashable, source: int, valid_time: datetime, value: float
+    ) -> List[AssimilatedRow]:
+        """
+        Add a value of a source of a stream and assimilate the slots it completes
+
+        :param key: key of the stream, e.g. a station id (hashable)
+        :param source: index of the source (int, 0 - source1, 1 - source2)
+        :param valid_time: time the value is valid for (datetime)
+        :param value: the value (float, NaN or None if missing)
+        Returns the assimilated slots (list of (key, slot time, assimilated value, uncertainty))
+        """
+
+        return self._assimilate(self.aligner.push(key, source, valid_time, value))
+
+    def advance(self, now: datetime) -> List[AssimilatedRow]:
+        """
+        Assimilate the slots of all streams whose deadline has passed (see StreamAligner.advance)
+
+        :param now: the current time (datetime)
+        Returns the assimilated slots (list of (key, slot time, assimilated value, uncertainty))
+        """
+
+        return self._assimilate(self.aligner.advance(now))
+
+    def flush(self) -> List[AssimilatedRow]:
+        """
+        Assimilate the pending slots of all streams up to their latest values (see StreamAligner.flush)
+
+        Returns the assimilated slots (list of (key, slot time, assimilated value, uncertainty))
+        """
+
+        return self._assimilate(self.aligner.flush())
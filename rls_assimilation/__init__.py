@@ -1 +1,43 @@
+# Bumped with every release that changes results (it is part of the keys of results_store.ResultsStore)
+__version__ = "0.2.0"
+
+from rls_assimilation.Backend import BACKEND
 from rls_assimilation.RLSAssimilation import RLSAssimilation
+from rls_assimilation.AssimilationStep import make_assimilation_step
+from rls_assimilation.StreamingRLSAssimilation import StreamingRLSAssimilation
+from rls_assimilation.ReorderBuffer import ReorderBuffer
+from rls_assimilation.ShardedStreamRegistry import ShardedStreamRegistry
+
+# Vectorised classes, which need numpy
+_VECTORISED_CLASSES = [
+    "MultiSourceRLSAssimilation",
+    "StationRLSAssimilation",
+    "GroupedRLSAssimilation",
+    "RLSAssimilationSweep",
+    "RLSInitialisationSearch",
+    "GriddedCorrection",
+    "SharedMemoryRLSAssimilation",
+]
+
+if BACKEND == "numpy":
+    from rls_assimilation.MultiSourceRLSAssimilation import MultiSourceRLSAssimilation
+    from rls_assimilation.StationRLSAssimilation import StationRLSAssimilation
+    from rls_assimilation.GroupedRLSAssimilation import GroupedRLSAssimilation
+    from rls_assimilation.RLSAssimilationSweep import RLSAssimilationSweep
+    from rls_assimilation.RLSInitialisationSearch import RLSInitialisationSearch
+    from rls_assimilation.GriddedCorrection import GriddedCorrection
+    from rls_assimilation.SharedMemoryRLSAssimilation import (
+        SharedMemoryRLSAssimilation,
+    )
+else:
+
+    def __getattr__(name):
+        # With the Python backend numpy is imported on the first use of a vectorised class
+        if name not in _VECTORISED_CLASSES:
+            raise AttributeError(f"module {__name__} has no attribute {name}")
+
+        import importlib
+
+        cls = getattr(importlib.import_module(f"{__name__}.{name}"), name)
+        globals()[name] = cls
+        return cls
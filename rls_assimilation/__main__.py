@@ -0,0 +1,242 @@
+"""
+Batch runner of the Europe AQ experiments (see example2.test_variable_Europe_AQ), sharded across machines
+
+    python -m rls_assimilation run data/Europe_AQ/combined_NO2 --variable NO2 \
+        --shard-index 0 --shard-count 4 --workers 8 --output shards/NO2-0.json
+    python -m rls_assimilation merge shards/NO2-*.json
+
+Each shard runs every shard-count-th station file (in sorted order) on a pool of worker processes and writes
+the ratios of its stations with their running statistics (JSON). merge combines the statistics of all shards
+and prints them as the experiments do. The stations are run with experiments.py of the repository root (the code of
+the experiments of example2.py without plotting, which needs pandas), so the runner neither imports matplotlib nor
+depends on the working directory, and the package itself stays free of pandas.
+"""
+
+import argparse
+import json
+import os
+from multiprocessing import Pool
+from typing import Dict, List, Sequence
+
+from rls_assimilation.Metrics import RunningStats
+
+SCALE_KEYS = ["t_in1", "t_in2", "s_in1", "s_in2", "t_out", "s_out"]
+RATIO_KEYS = ["da_ratio", "seq_ratio", "err_seq_da_ratio"]
+
+
+def get_data_paths(paths: Sequence[str]) -> List[str]:
+    """
+    Station files of data directories and files, directories are listed in sorted order
+
+    :param paths: data directories (of CSV files) or files (sequence of str)
+    Returns the paths of the files, without duplicates (list of str)
+    """
+
+    data_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            data_paths.extend(
+                os.path.join(path, filename)
+                for filename in sorted(os.listdir(path))
+                if filename.endswith(".csv")
+            )
+        else:
+            data_paths.append(path)
+    return list(dict.fromkeys(data_paths))
+
+
+def get_shard(data_paths: Sequence[str], shard_index: int, shard_count: int):
+    """
+    Files of a shard: every shard_count-th file, starting from shard_index
+
+    Returns the paths of the files of the shard (list of str)
+    """
+
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(
+            f"Shard index must be in [0, {shard_count}), got {shard_index}"
+        )
+    return list(data_paths[shard_index::shard_count])
+
+
+def _run_station(job):
+    from experiments import run_station_Europe_AQ
+
+    data_path, config = job
+    return run_station_Europe_AQ(
+        data_path, config["variable"], *(config[key] for key in SCALE_KEYS)
+    )
+
+
+def run_shard(
+    data_paths: Sequence[str],
+    config: Dict[str, str],
+    shard_index: int = 0,
+    shard_count: int = 1,
+    n_workers: int = 1,
+) -> dict:
+    """
+    Run the assimilation of the station files of a shard
+
+    :param data_paths: all station files (sequence of str)
+    :param config: variable and scales (dict with the keys variable and SCALE_KEYS)
+    :param shard_index: index of the shard (int)
+    :param shard_count: number of shards (int)
+    :param n_workers: number of worker processes (int)
+    Returns the partial results (dict: config, shard_index, shard_count, ratios of the stations,
+    stats - RunningStats of every ratio as dicts)
+    """
+
+    shard = get_shard(data_paths, shard_index, shard_count)
+    jobs = [(data_path, config) for data_path in shard]
+    if n_workers > 1:
+        with Pool(n_workers) as pool:
+            station_ratios = pool.map(_run_station, jobs, chunksize=1)
+    else:
+        station_ratios = [_run_station(job) for job in jobs]
+
+    stats = {key: RunningStats() for key in RATIO_KEYS}
+    for ratios in station_ratios:
+        for key in RATIO_KEYS:
+            stats[key].update(ratios[key])
+    return dict(
+        config=config,
+        shard_index=shard_index,
+        shard_count=shard_count,
+        stations=dict(zip(shard, station_ratios)),
+        stats={key: value.to_dict() for key, value in stats.items()},
+    )
+
+
+def merge_shards(partials: Sequence[dict]) -> dict:
+    """
+    Combine the partial results of the shards of a run
+
+    :param partials: partial results of all shards (sequence of dict, see run_shard)
+    Returns the results of the whole run (dict, as a partial result of a single shard)
+    """
+
+    if not partials:
+        raise ValueError("No partial results to merge")
+    config = partials[0]["config"]
+    shard_count = partials[0]["shard_count"]
+    for partial in partials:
+        if partial["config"] != config or partial["shard_count"] != shard_count:
+            raise ValueError(
+                f"Partial results of different runs: {partial['config']} "
+                f"({partial['shard_count']} shards) and {config} ({shard_count} shards)"
+            )
+    shard_indices = sorted(partial["shard_index"] for partial in partials)
+    if shard_indices != list(range(shard_count)):
+        raise ValueError(
+            f"Expected the shards 0..{shard_count - 1} once each, got {shard_indices}"
+        )
+
+    stats = {key: RunningStats() for key in RATIO_KEYS}
+    stations = {}
+    for partial in sorted(partials, key=lambda partial: partial["shard_index"]):
+        stations.update(partial["stations"])
+        for key in RATIO_KEYS:
+            stats[key].merge(RunningStats.from_dict(partial["stats"][key]))
+    return dict(
+        config=config,
+        shard_index=0,
+        shard_count=1,
+        stations=stations,
+        stats={key: value.to_dict() for key, value in stats.items()},
+    )
+
+
+def print_results(results: dict):
+    """
+    Print the statistics of the ratios as example2.test_variable_Europe_AQ
+    """
+
+    from experiments import print_ratio_stats
+
+    config = results["config"]
+    is_multi_t = (
+        config["t_in1"] != config["t_out"] or config["t_in2"] != config["t_out"]
+    )
+    print(
+        f"{config['variable']}: {len(results['stations'])} stations "
+        f"({', '.join(config[key] for key in SCALE_KEYS)})"
+    )
+    print_ratio_stats(
+        is_multi_t,
+        *(RunningStats.from_dict(results["stats"][key]) for key in RATIO_KEYS),
+    )
+
+
+def write_results(results: dict, output_path: str):
+    # Written to a temporary file first, so an interrupted run leaves no partial file
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(f"{output_path}.tmp", "w") as f:
+        json.dump(results, f, indent=1)
+    os.replace(f"{output_path}.tmp", output_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m rls_assimilation",
+        description="Run the assimilation of station files in shards and merge the results",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the stations of a shard")
+    run_parser.add_argument(
+        "data_paths", nargs="+", help="data directories or station files"
+    )
+    run_parser.add_argument("--variable", required=True)
+    run_parser.add_argument("--t-in1", default="hourly")
+    run_parser.add_argument("--t-in2", default="hourly")
+    run_parser.add_argument("--s-in1", default="obs")
+    run_parser.add_argument("--s-in2", default="model")
+    run_parser.add_argument("--t-out", default="hourly")
+    run_parser.add_argument("--s-out", default="obs")
+    run_parser.add_argument("--workers", type=int, default=1)
+    run_parser.add_argument("--shard-index", type=int, default=0)
+    run_parser.add_argument("--shard-count", type=int, default=1)
+    run_parser.add_argument(
+        "--output", required=True, help="JSON file of the partial results"
+    )
+
+    merge_parser = commands.add_parser(
+        "merge", help="merge the partial results of all shards"
+    )
+    merge_parser.add_argument("partial_paths", nargs="+")
+    merge_parser.add_argument(
+        "--output", default=None, help="JSON file of the merged results"
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        config = dict(variable=args.variable)
+        config.update((key, getattr(args, key)) for key in SCALE_KEYS)
+        data_paths = get_data_paths(args.data_paths)
+        try:
+            get_shard(data_paths, args.shard_index, args.shard_count)
+        except ValueError as e:
+            parser.error(str(e))
+        results = run_shard(
+            data_paths, config, args.shard_index, args.shard_count, args.workers
+        )
+        write_results(results, args.output)
+    else:
+        partials = []
+        for partial_path in args.partial_paths:
+            with open(partial_path) as f:
+                partials.append(json.load(f))
+        try:
+            results = merge_shards(partials)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.output:
+            write_results(results, args.output)
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import resource
+import numpy as np
+
+from experiments import prepare_daily_data_chunks, read_data_chunks, run_assimilation
+
+CHUNKSIZE = 10000  # rows per block
+
+
+def run_file_chunked(
+    data_path,
+    output_path,
+    variable,
+    t_in1,
+    t_in2,
+    s_in1,
+    s_in2,
+    t_out,
+    s_out,
+    chunksize=CHUNKSIZE,
+):
+    """
+    Run the assimilation of a station file too large for memory (see experiments.run_station_Europe_AQ)
+
+    The file is read in blocks of chunksize rows, and the results are written to output_path block by block,
+    so peak memory depends on the block size only. The results are the same as for the whole file.
+
+    :return: the ratios (dict)
+    """
+    is_multi_t = t_in1 != t_out or t_in2 != t_out
+
+    chunks = read_data_chunks(data_path, chunksize)
+    if is_multi_t:
+        chunks = prepare_daily_data_chunks(variable, chunks)
+    # Floating point errors of numpy raise, as in the experiments (see experiments.run_station_Europe_AQ)
+    with np.errstate(all="raise"):
+        da_ratio, seq_ratio, err_seq_da_ratio, _, _, _ = run_assimilation(
+            chunks,
+            variable,
+            t_in1,
+            t_in2,
+            s_in1,
+            s_in2,
+            t_out,
+            s_out,
+            keep_series=False,
+            output_path=output_path,
+        )
+    return dict(
+        da_ratio=float(da_ratio),
+        seq_ratio=float(seq_ratio) if seq_ratio is not None else None,
+        err_seq_da_ratio=float(err_seq_da_ratio),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Assimilate a large station file block by block"
+    )
+    parser.add_argument("data_path")
+    parser.add_argument("output_path")
+    parser.add_argument("variable")
+    parser.add_argument("--t-in1", default="hourly")
+    parser.add_argument("--t-in2", default="hourly")
+    parser.add_argument("--s-in1", default="obs")
+    parser.add_argument("--s-in2", default="model")
+    parser.add_argument("--t-out", default="hourly")
+    parser.add_argument("--s-out", default="obs")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = parser.parse_args()
+
+    ratios = run_file_chunked(
+        args.data_path,
+        args.output_path,
+        args.variable,
+        args.t_in1,
+        args.t_in2,
+        args.s_in1,
+        args.s_in2,
+        args.t_out,
+        args.s_out,
+        args.chunksize,
+    )
+    print(ratios)
+    print(
+        f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB"
+    )
@@ -0,0 +1,318 @@
+import os
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Stations are generated in blocks with their own random streams, so any range of stations
+# gets the same values as in the whole workload
+STATION_BLOCK = 4096
+# Random streams of a block: station parameters, station anomalies, station noise, model noise,
+# random missing values, outages and long gaps
+N_STREAMS = 7
+
+
+class SyntheticWorkload:
+    """
+    Seeded synthetic station/model pairs for scale and stress tests of the assimilators
+
+    The "true" hourly concentration of a station is its mean level with a diurnal cycle and an AR(1) anomaly.
+    The station (source 1) observes it with noise, the model (source 2) with a station-specific gain and bias
+    (the scale difference between a station and a model grid cell) and its own noise. Values go missing
+    at random, in bursty outages (a Markov chain of outage starts and ends) and in long gaps. The long gaps
+    are a fixed fraction of the workload, so the expected share of missing values does not depend on n_hours:
+    with the defaults, about 8% of the station values (2% at random, 2% in outages, 4% in a gap)
+    and 0.3% of the model values are missing.
+
+    The data is generated in chunks of hours with the state carried over, and the values do not depend on
+    the chunk size or on the range of stations generated, so workloads of millions of stations x hours
+    can be streamed or split between workers and are reproducible from the seed.
+
+    :param n_stations: number of stations (int)
+    :param n_hours: number of hours (int)
+    :param seed: seed of the random streams (int)
+    :param dtype: floating point type of the values (numpy dtype, float64 or float32)
+    :param phi_range: range of the AR(1) coefficients of the anomalies (tuple of 2 floats)
+    :param anomaly_std: standard deviation of the innovations of the anomalies (float)
+    :param mean_range: range of the mean levels of the stations (tuple of 2 floats)
+    :param daily_amplitude: amplitude of the diurnal cycle relative to the mean level (float)
+    :param noise_std: standard deviations of the noise of the station and the model (tuple of 2 floats)
+    :param gain_range: range of the gains of the model against the station (tuple of 2 floats)
+    :param bias_range: range of the biases of the model against the station (tuple of 2 floats)
+    :param missing_rate: probabilities of a value missing at random, per source (tuple of 2 floats)
+    :param outage_rate: probabilities of an outage starting in an hour, per source (tuple of 2 floats)
+    :param outage_hours: mean lengths of the outages in hours, per source (tuple of 2 floats)
+    :param n_gaps: numbers of long gaps per station, per source (tuple of 2 int)
+    :param gap_fraction: lengths of the long gaps as fractions of n_hours, per source (tuple of 2 floats,
+    e.g. 0.04 - two weeks of a year); a gap lies within the workload
+    """
+
+    def __init__(
+        self,
+        n_stations: int,
+        n_hours: int,
+        seed: int = 0,
+        dtype=np.float64,
+        phi_range: Tuple[float, float] = (0.7, 0.95),
+        anomaly_std: float = 3.0,
+        mean_range: Tuple[float, float] = (5.0, 50.0),
+        daily_amplitude: float = 0.3,
+        noise_std: Tuple[float, float] = (1.0, 2.0),
+        gain_range: Tuple[float, float] = (0.5, 1.5),
+        bias_range: Tuple[float, float] = (-5.0, 5.0),
+        missing_rate: Tuple[float, float] = (0.02, 0.0),
+        outage_rate: Tuple[float, float] = (0.002, 0.0005),
+        outage_hours: Tuple[float, float] = (12.0, 6.0),
+        n_gaps: Tuple[int, int] = (1, 0),
+        gap_fraction: Tuple[float, float] = (0.04, 0.02),
+    ):
+        self.n_stations: int = n_stations
+        self.n_hours: int = n_hours
+        self.seed: int = seed
+        self.dtype: np.dtype = np.dtype(dtype)
+        self.phi_range = phi_range
+        self.anomaly_std = anomaly_std
+        self.mean_range = mean_range
+        self.daily_amplitude = daily_amplitude
+        self.noise_std = noise_std
+        self.gain_range = gain_range
+        self.bias_range = bias_range
+        self.missing_rate = missing_rate
+        self.outage_rate = outage_rate
+        self.outage_hours = outage_hours
+        self.n_gaps = n_gaps
+        self.gap_fraction = gap_fraction
+        # Lengths of the long gaps in hours
+        self.gap_hours: Tuple[int, ...] = tuple(
+            min(round(fraction * n_hours), n_hours) for fraction in gap_fraction
+        )
+
+    def _get_streams(self, block: int):
+        # Independent random streams of a block of stations
+        seed_sequence = np.random.SeedSequence([self.seed, block])
+        return [np.random.default_rng(s) for s in seed_sequence.spawn(N_STREAMS)]
+
+    def _init_blocks(self, start: int, stop: int):
+        # Parameters and random streams of the blocks covering the stations [start, stop)
+        blocks = []
+        for block in range(start // STATION_BLOCK, -(-stop // STATION_BLOCK)):
+            block_start = block * STATION_BLOCK
+            size = min(STATION_BLOCK, self.n_stations - block_start)
+            streams = self._get_streams(block)
+            params_rng = streams[0]
+            params = dict(
+                phi=params_rng.uniform(*self.phi_range, size),
+                mean=params_rng.uniform(*self.mean_range, size),
+                phase=params_rng.uniform(0, 24, size),
+                gain=params_rng.uniform(*self.gain_range, size),
+                bias=params_rng.uniform(*self.bias_range, size),
+            )
+            # Long gaps: start hours per station and source, so that the gaps end within the workload
+            gap_starts = [
+                params_rng.integers(0, self.n_hours - gap_hours + 1, (size, n_gaps))
+                for n_gaps, gap_hours in zip(self.n_gaps, self.gap_hours)
+            ]
+            # Keep only the stations in [start, stop) of the block
+            lo = max(start - block_start, 0)
+            hi = min(stop - block_start, size)
+            blocks.append(
+                dict(
+                    lo=lo,
+                    hi=hi,
+                    size=size,
+                    params={name: value[lo:hi] for name, value in params.items()},
+                    gap_starts=[starts[lo:hi] for starts in gap_starts],
+                    streams=streams[1:],
+                )
+            )
+        return blocks
+
+    def _draw(self, blocks, stream: int, n_hours: int, draw) -> np.ndarray:
+        # Draws of a random stream for all blocks, (n_hours, n_stations), whole blocks are drawn
+        # so that the streams advance in the same way for any range of stations
+        return np.concatenate(
+            [
+                draw(block["streams"][stream], (n_hours, block["size"]))[
+                    :, block["lo"] : block["hi"]
+                ]
+                for block in blocks
+            ],
+            axis=1,
+        )
+
+    def chunks(
+        self,
+        chunk_hours: int = 24 * 7,
+        stations: Optional[Tuple[int, int]] = None,
+        daily: bool = False,
+    ) -> Iterator[np.ndarray]:
+        """
+        Generate the workload in chunks of hours
+
+        :param chunk_hours: number of hours per chunk (int)
+        :param stations: range of stations to generate (tuple (start, stop) or None - all stations)
+        :param daily: add the daily variant (bool): the mean of the previous day of each source,
+        forward-filled over the hours of the day and over days without values (as helpers.prepare_daily_data)
+        :return: chunks of values (iterator of numpy arrays, shape (chunk_hours, n_stations, 2),
+        or (chunk_hours, n_stations, 4) with the daily means of the sources after the hourly values, NaN if missing)
+        """
+
+        start, stop = (0, self.n_stations) if stations is None else stations
+        blocks = self._init_blocks(start, stop)
+        params = (
+            {
+                name: np.concatenate([block["params"][name] for block in blocks])
+                for name in blocks[0]["params"]
+            }
+            if blocks
+            else {}
+        )
+        gap_starts = (
+            [
+                np.concatenate([block["gap_starts"][source] for block in blocks])
+                for source in range(2)
+            ]
+            if blocks
+            else []
+        )
+        n_stations = stop - start
+
+        # State carried over between chunks
+        anomaly = np.zeros(n_stations)
+        is_outage = np.zeros((2, n_stations), dtype=bool)
+        day_sums = np.zeros((2, n_stations))
+        day_counts = np.zeros((2, n_stations))
+        previous_day_means = np.full((2, n_stations), np.nan)
+
+        for chunk_start in range(0, self.n_hours, chunk_hours):
+            n_hours = min(chunk_hours, self.n_hours - chunk_start)
+            hours = np.arange(chunk_start, chunk_start + n_hours)
+
+            # True values: mean level, diurnal cycle and AR(1) anomalies
+            innovations = self.anomaly_std * self._draw(
+                blocks, 0, n_hours, lambda rng, size: rng.standard_normal(size)
+            )
+            anomalies = np.empty((n_hours, n_stations))
+            for i in range(n_hours):
+                anomaly = params["phi"] * anomaly + innovations[i]
+                anomalies[i] = anomaly
+            cycle = np.sin(2 * np.pi * (hours[:, None] + params["phase"]) / 24)
+            truth = params["mean"] * (1 + self.daily_amplitude * cycle) + anomalies
+
+            values = np.empty((n_hours, n_stations, 2))
+            values[..., 0] = truth + self.noise_std[0] * self._draw(
+                blocks, 1, n_hours, lambda rng, size: rng.standard_normal(size)
+            )
+            values[..., 1] = (
+                params["gain"] * truth
+                + params["bias"]
+                + self.noise_std[1]
+                * self._draw(
+                    blocks, 2, n_hours, lambda rng, size: rng.standard_normal(size)
+                )
+            )
+
+            # Missing values: random, bursty outages and long gaps
+            uniforms = self._draw(
+                blocks, 3, n_hours, lambda rng, size: rng.random((*size, 2))
+            )
+            transitions = self._draw(
+                blocks, 4, n_hours, lambda rng, size: rng.random((*size, 2))
+            )
+            is_missing = uniforms < np.array(self.missing_rate)
+            for i in range(n_hours):
+                is_outage = np.where(
+                    is_outage,
+                    transitions[i].T >= 1 / np.array(self.outage_hours)[:, None],
+                    transitions[i].T < np.array(self.outage_rate)[:, None],
+                )
+                is_missing[i] |= is_outage.T
+            for source in range(2):
+                gap_offsets = hours[:, None, None] - gap_starts[source][None]
+                is_missing[..., source] |= (
+                    (gap_offsets >= 0) & (gap_offsets < self.gap_hours[source])
+                ).any(axis=-1)
+            values[is_missing] = np.nan
+
+            if daily:
+                daily_values = np.empty_like(values)
+                for i, hour in enumerate(hours):
+                    if hour % 24 == 0 and hour > 0:
+                        with np.errstate(invalid="ignore"):
+                            day_means = day_sums / day_counts
+                        previous_day_means = np.where(
+                            day_counts > 0, day_means, previous_day_means
+                        )
+                        day_sums[...] = 0
+                        day_counts[...] = 0
+                    is_valid = ~np.isnan(values[i].T)
+                    day_sums += np.where(is_valid, values[i].T, 0)
+                    day_counts += is_valid
+                    daily_values[i] = previous_day_means.T
+                values = np.concatenate([values, daily_values], axis=-1)
+
+            yield values.astype(self.dtype, copy=False)
+
+    def generate(
+        self, stations: Optional[Tuple[int, int]] = None, daily: bool = False
+    ) -> np.ndarray:
+        """
+        Generate the whole workload as one array (see chunks)
+
+        :return: values (numpy array, shape (n_hours, n_stations, 2), or (n_hours, n_stations, 4) if daily)
+        """
+
+        return np.concatenate(list(self.chunks(stations=stations, daily=daily)), axis=0)
+
+    def get_coordinates(self) -> (np.ndarray, np.ndarray):
+        """
+        Latitudes and longitudes of the stations, in Europe
+
+        Returns (lats (numpy array), lons (numpy array))
+        """
+
+        rng = np.random.default_rng(np.random.SeedSequence([self.seed, -1 % 2**32]))
+        return (
+            rng.uniform(35, 70, self.n_stations),
+            rng.uniform(-10, 30, self.n_stations),
+        )
+
+    def write_station_files(
+        self,
+        data_path_dir: str,
+        variable: str = "NO2",
+        start_time: datetime = datetime(2022, 1, 1, 1),
+        chunk_hours: int = 24 * 7,
+    ):
+        """
+        Write the workload as station files of the Europe_AQ datasets ("lat;lon.csv" with the columns
+        time, variable and variable_model), chunk by chunk
+
+        :param data_path_dir: directory of the files (str)
+        :param variable: name of the variable (str)
+        :param start_time: time of the first hour (datetime)
+        :param chunk_hours: number of hours per chunk (int)
+        """
+
+        os.makedirs(data_path_dir, exist_ok=True)
+        lats, lons = self.get_coordinates()
+        paths = [
+            os.path.join(data_path_dir, f"{lat:.6f};{lon:.6f}.csv")
+            for lat, lon in zip(lats, lons)
+        ]
+        for chunk_idx, values in enumerate(self.chunks(chunk_hours)):
+            times = pd.date_range(
+                start_time + timedelta(hours=chunk_idx * chunk_hours),
+                periods=len(values),
+                freq="H",
+            )
+            for station, path in enumerate(paths):
+                pd.DataFrame(
+                    {
+                        variable: values[:, station, 0],
+                        f"{variable}_model": values[:, station, 1],
+                    },
+                    index=pd.Index(times, name="time"),
+                ).to_csv(
+                    path, mode="w" if chunk_idx == 0 else "a", header=chunk_idx == 0
+                )
@@ -0,0 +1,97 @@
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+from rls_assimilation import RLSAssimilation
+from rls_assimilation.AssimilationStep import make_assimilation_step
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = {
+    "DA2": ("hourly", "hourly", "obs", "obs", "hourly", "obs"),
+    "DA3 (Model -> Station)": ("hourly", "hourly", "obs", "model", "hourly", "obs"),
+    "DA3 (Station -> Model)": ("hourly", "hourly", "obs", "model", "hourly", "model"),
+    "DA4 (Model -> Station)": ("hourly", "daily", "obs", "model", "hourly", "obs"),
+    "DA4 (Station -> Model)": ("daily", "hourly", "obs", "model", "hourly", "model"),
+    "DA4 daily": ("hourly", "daily", "obs", "model", "daily", "obs"),
+}
+
+
+def generate_observations(n_steps, seed=0):
+    # Hourly values with a daily cycle and gaps, daily model values repeated for a day, timestamps with a gap
+    rng = random.Random(seed)
+    obs = []
+    day_x = 20
+    start = datetime(2024, 1, 1, 5)
+    for i in range(n_steps):
+        x = 20 + 10 * math.sin(2 * math.pi * i / 24) + rng.gauss(0, 2)
+        if i % 24 == 0:
+            day_x = 20 + rng.gauss(0, 1)
+        timestamp = start + timedelta(hours=i + 30 * (i >= n_steps // 2))
+        obs.append((x if rng.random() > 0.05 else math.nan, 1.3 * day_x + 4, timestamp))
+    return obs
+
+
+def get_metrics_state(metrics):
+    return {name: vars(accumulator) for name, accumulator in vars(metrics).items()}
+
+
+def run_scenario(config, use_timestamps):
+    """
+    Results of the generic and the specialised steps: (outputs, metrics) of each, with outputs as lists of floats
+    """
+    obs = generate_observations(300)
+    generic = RLSAssimilation(*config, use_timestamps=use_timestamps)
+    assimilator, step = make_assimilation_step(*config, use_timestamps=use_timestamps)
+    results = []
+    for assimilate, state in [(generic.assimilate, generic), (step, assimilator)]:
+        outputs = []
+        for obs1, obs2, timestamp in obs:
+            x, err = assimilate(obs1, obs2, timestamp if use_timestamps else None)
+            outputs.append([float(x), float(err)])
+        results.append((outputs, get_metrics_state(state.metrics)))
+    return results
+
+
+def assert_same(actual, expected):
+    # Equal values, with NaN equal to NaN
+    assert json.dumps(actual) == json.dumps(expected)
+
+
+@pytest.mark.parametrize("use_timestamps", [False, True])
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_step_matches_generic(scenario, use_timestamps):
+    generic, specialised = run_scenario(SCENARIOS[scenario], use_timestamps)
+    assert_same(specialised, generic)
+
+
+def test_python_backend_matches_numpy_backend():
+    # The backend is selected at import, so the python backend runs in another process
+    script = (
+        "import json, sys; "
+        f"sys.path[:0] = [{TESTS_DIR!r}, {os.path.dirname(TESTS_DIR)!r}]; "
+        "from test_assimilation_step import SCENARIOS, run_scenario; "
+        "print(json.dumps({name: [run_scenario(config, use_timestamps) for use_timestamps in (False, True)] "
+        "for name, config in SCENARIOS.items()}))"
+    )
+    env = dict(os.environ, RLS_ASSIMILATION_BACKEND="python")
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    python_results = json.loads(output)
+
+    for name, config in SCENARIOS.items():
+        for use_timestamps, (generic, specialised) in zip(
+            (False, True), python_results[name]
+        ):
+            assert_same(specialised, generic)
+            assert_same(generic, run_scenario(config, use_timestamps)[0])
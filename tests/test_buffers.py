@@ -0,0 +1,102 @@
+from array import array
+
+import numpy as np
+import pytest
+
+from rls_assimilation import MultiSourceRLSAssimilation, RLSAssimilation
+from rls_assimilation.Buffers import as_output_array
+from rls_assimilation.SequentialRLSAssimilation import (
+    SequentialRLSAssimilationOneSource,
+    SequentialRLSAssimilationTwoSources,
+)
+
+DA3 = ("hourly", "hourly", "obs", "model", "hourly", "obs")
+DA4 = ("hourly", "daily", "obs", "model", "hourly", "obs")
+
+
+def make_series(n_steps, seed=0):
+    rng = np.random.default_rng(seed)
+    station = 20 + rng.normal(0, 2, n_steps)
+    station[rng.random(n_steps) < 0.1] = np.nan
+    model = np.repeat(rng.normal(30, 1, n_steps // 24 + 1), 24)[:n_steps]
+    return station, model
+
+
+@pytest.mark.parametrize("config", [DA3, DA4])
+@pytest.mark.parametrize(
+    "assimilator_class", [RLSAssimilation, SequentialRLSAssimilationTwoSources]
+)
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_assimilate_buffer_matches_assimilate(assimilator_class, config, dtype):
+    station, model = (series.astype(dtype) for series in make_series(100))
+    stepped = assimilator_class(*config)
+    expected = [
+        stepped.assimilate(obs1, obs2)
+        for obs1, obs2 in zip(station.tolist(), model.tolist())
+    ]
+
+    out = np.empty(100, dtype=dtype)
+    err_out = array("d", bytes(800))
+    result = assimilator_class(*config).assimilate_buffer(
+        memoryview(station), model, out, err_out
+    )
+
+    assert result[0] is out and result[1] is err_out
+    np.testing.assert_array_equal(out, np.array(expected, dtype=dtype)[:, 0])
+    np.testing.assert_array_equal(err_out, np.array(expected)[:, 1])
+
+
+def test_one_source_assimilate_buffer_matches_assimilate():
+    station, _ = make_series(100)
+    stepped = SequentialRLSAssimilationOneSource()
+    expected = [stepped.assimilate(obs) for obs in station.tolist()]
+
+    out, err_out = SequentialRLSAssimilationOneSource().assimilate_buffer(station)
+
+    assert isinstance(out, array) and isinstance(err_out, array)
+    np.testing.assert_array_equal(np.array([out, err_out]).T, expected)
+
+
+def test_assimilate_buffer_rejects_bad_buffers():
+    assimilator = RLSAssimilation(*DA3)
+    with pytest.raises(TypeError):
+        assimilator.assimilate_buffer(array("i", [1, 2]), array("d", [1.0, 2.0]))
+    with pytest.raises(ValueError):
+        assimilator.assimilate_buffer(array("d", [1.0, 2.0]), array("d", [1.0]))
+    with pytest.raises(ValueError):
+        assimilator.assimilate_buffer(
+            array("d", [1.0, 2.0]),
+            array("d", [1.0, 2.0]),
+            out=memoryview(bytes(16)).cast("d"),
+        )
+
+
+def test_as_output_array_writes_into_the_buffer():
+    buffer = bytearray(48)
+    values = as_output_array(memoryview(buffer).cast("d"), (3, 2))
+    values[...] = 1.5
+    np.testing.assert_array_equal(np.frombuffer(buffer), np.full(6, 1.5))
+
+
+@pytest.mark.parametrize(
+    "buffer, error",
+    [
+        ([0.0] * 6, TypeError),  # no buffer protocol, numpy would copy
+        (np.zeros(6, dtype=np.int64), TypeError),
+        (bytearray(48), TypeError),  # bytes, not floats
+        (memoryview(bytes(48)).cast("d"), ValueError),  # read-only
+        (np.zeros(5), ValueError),
+        (np.zeros((2, 6))[:, :3], ValueError),  # not contiguous
+    ],
+)
+def test_as_output_array_rejects_copies(buffer, error):
+    with pytest.raises(error):
+        as_output_array(buffer, (3, 2))
+
+
+def test_bank_rejects_list_output():
+    bank = MultiSourceRLSAssimilation(
+        ["hourly", "hourly"], ["obs", "model"], "hourly", "obs", shape=(3,)
+    )
+    with pytest.raises(TypeError):
+        bank.assimilate(np.ones((3, 2)), out=[0.0] * 3)
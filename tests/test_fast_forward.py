@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+import pytest
+
+from rls_assimilation import RLSAssimilation
+from rls_assimilation.SequentialRLSAssimilation import (
+    SequentialRLSAssimilationOneSource,
+    SequentialRLSAssimilationTwoSources,
+)
+
+DA3 = ("hourly", "hourly", "obs", "model", "hourly", "obs")
+DA4 = ("hourly", "daily", "obs", "model", "hourly", "obs")
+
+
+def make_series(n_steps, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_steps)
+    station = 20 + 5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 1, n_steps)
+    model = 1.2 * station + 3 + rng.normal(0, 1, n_steps)
+    return station, model
+
+
+@pytest.mark.parametrize("config", [DA3, DA4])
+@pytest.mark.parametrize("offline", [(True, False), (False, True), (True, True)])
+@pytest.mark.parametrize(
+    "assimilator_class", [RLSAssimilation, SequentialRLSAssimilationTwoSources]
+)
+def test_fast_forward_matches_stepping(assimilator_class, config, offline):
+    station, model = make_series(200)
+    stepped = assimilator_class(*config)
+    fast = assimilator_class(*config)
+    for obs1, obs2 in zip(station[:100], model[:100]):
+        stepped.assimilate(obs1, obs2)
+        fast.assimilate(obs1, obs2)
+
+    gap1 = None if offline[0] else station[100:150]
+    gap2 = None if offline[1] else model[100:150]
+    expected = [
+        stepped.assimilate(
+            math.nan if gap1 is None else gap1[i], math.nan if gap2 is None else gap2[i]
+        )
+        for i in range(50)
+    ]
+    assimilated_obs, err_assimilated_obs = fast.fast_forward(50, gap1, gap2)
+
+    np.testing.assert_allclose(assimilated_obs, [x for x, _ in expected], rtol=1e-12)
+    np.testing.assert_allclose(
+        err_assimilated_obs, [e for _, e in expected], rtol=1e-12
+    )
+    for obs1, obs2 in zip(station[150:], model[150:]):
+        assert fast.assimilate(obs1, obs2) == pytest.approx(
+            stepped.assimilate(obs1, obs2), rel=1e-12
+        )
+    assert fast.metrics.err_assimilated.mean == pytest.approx(
+        stepped.metrics.err_assimilated.mean, rel=1e-12
+    )
+
+
+@pytest.mark.parametrize("online", [False, True])
+def test_one_source_fast_forward_matches_stepping(online):
+    station, _ = make_series(200)
+    stepped = SequentialRLSAssimilationOneSource()
+    fast = SequentialRLSAssimilationOneSource()
+    for obs in station[:100]:
+        stepped.assimilate(obs)
+        fast.assimilate(obs)
+
+    gap = station[100:150] if online else None
+    expected = [stepped.assimilate(gap[i] if online else math.nan) for i in range(50)]
+    assimilated_obs, err_assimilated_obs = fast.fast_forward(50, gap)
+
+    np.testing.assert_allclose(assimilated_obs, [x for x, _ in expected], rtol=1e-12)
+    np.testing.assert_allclose(
+        err_assimilated_obs, [e for _, e in expected], rtol=1e-12
+    )
+    assert fast.metrics.rmse_source1.count == stepped.metrics.rmse_source1.count
+
+
+@pytest.mark.parametrize(
+    "assimilator",
+    [
+        RLSAssimilation(*DA3),
+        SequentialRLSAssimilationTwoSources(*DA3),
+        SequentialRLSAssimilationTwoSources(*DA4),
+    ],
+)
+def test_fast_forward_rejects_wrong_lengths(assimilator):
+    with pytest.raises(ValueError, match="obs1 must have 3 values"):
+        assimilator.fast_forward(3, [1.0, 2.0], None)
+    with pytest.raises(ValueError, match="obs2 must have 3 values"):
+        assimilator.fast_forward(3, None, [1.0] * 4)
+
+
+def test_one_source_fast_forward_rejects_wrong_length():
+    with pytest.raises(ValueError, match="obs must have 3 values"):
+        SequentialRLSAssimilationOneSource().fast_forward(3, [1.0, 2.0])
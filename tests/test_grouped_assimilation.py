@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from rls_assimilation import MultiSourceRLSAssimilation
+from rls_assimilation.GroupedRLSAssimilation import GroupedRLSAssimilation
+
+# Stations (source 0) and a model (source 1) shared by the stations in the same grid cell
+S_INS = ["obs", "model"]
+CELLS = ["a", "a", "b", "c", "c", "c"]
+
+
+def make_observations(n_steps, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_steps)[:, None]
+    cell_ids = np.unique(CELLS, return_inverse=True)[1]
+    model = 20 + 5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 1, (n_steps, 3))
+    model = model[:, cell_ids]
+    station = 0.8 * model - 2 + rng.normal(0, 1, model.shape)
+    station[rng.random(station.shape) < 0.1] = np.nan
+    return np.stack([station, model], axis=-1)
+
+
+@pytest.mark.parametrize("s_out", ["obs", "model"])
+@pytest.mark.parametrize(
+    "t_ins, t_out",
+    [
+        (["hourly", "hourly"], "hourly"),
+        (["hourly", "daily"], "hourly"),
+        (["hourly", "daily"], "daily"),
+    ],
+)
+def test_initial_states_match_multi_source(t_ins, t_out, s_out):
+    # The group estimators start from the initial states of the per-stream models
+    P_init = np.array([10.0, 0.5])
+    w_init = np.array([[1.0, 0.5], [2.0, 0.9]])
+    grouped = GroupedRLSAssimilation(
+        t_ins, S_INS, t_out, s_out, [None, CELLS], P_init=P_init, w_init=w_init
+    )
+    multi = MultiSourceRLSAssimilation(
+        t_ins, S_INS, t_out, s_out, (len(CELLS),), P_init=P_init, w_init=w_init
+    )
+    default = GroupedRLSAssimilation(t_ins, S_INS, t_out, s_out, [None, CELLS])
+
+    differs = False
+    for obs in make_observations(100):
+        x, err = grouped.assimilate(obs)
+        x_multi, err_multi = multi.assimilate(obs)
+        np.testing.assert_allclose(x, x_multi, rtol=1e-12)
+        np.testing.assert_allclose(err, err_multi, rtol=1e-12)
+        differs |= not np.allclose(default.assimilate(obs)[1], err)
+    assert differs
@@ -0,0 +1,121 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from rls_assimilation import RLSAssimilation
+from rls_assimilation.Metrics import AssimilationMetrics, RunningRMSE, RunningStats
+
+DA3 = ("hourly", "hourly", "obs", "model", "hourly", "obs")
+
+
+def make_values(n_values, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(10, 3, n_values).tolist()
+    for i in range(0, n_values, 7):
+        values[i] = None if i % 2 else math.nan
+    return values
+
+
+def rmse_of(values1, values2):
+    rmse = RunningRMSE()
+    rmse.update_many(values1, values2)
+    return rmse
+
+
+def assert_stats_close(stats, values):
+    values = np.array([x for x in values if x is not None and not math.isnan(x)])
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert stats.std == pytest.approx(np.std(values), rel=1e-12)
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_running_stats_skip_missing_values():
+    values = make_values(100)
+    stats = RunningStats()
+    for x in values:
+        stats.update(x)
+    assert_stats_close(stats, values)
+
+    batch = RunningStats()
+    batch.update_many(values)
+    assert_stats_close(batch, values)
+
+
+def test_running_stats_merge_is_associative():
+    # Chunks of different sizes, including an empty one, merged in different orders
+    values = make_values(300)
+    chunks = [values[:1], values[1:120], [], values[120:]]
+    accumulators = []
+    for chunk in chunks:
+        stats = RunningStats()
+        stats.update_many(chunk)
+        accumulators.append(stats.to_dict())
+
+    left = RunningStats()
+    for state in accumulators:
+        left.merge(RunningStats.from_dict(state))
+    right = RunningStats()
+    for state in reversed(accumulators):
+        right = RunningStats.from_dict(state).merge(right)
+
+    assert_stats_close(left, values)
+    assert_stats_close(right, values)
+
+
+def test_running_stats_empty():
+    stats = RunningStats().merge(RunningStats())
+    assert stats.count == 0
+    assert math.isnan(stats.std)
+    assert json.loads(json.dumps(stats.to_dict()))["count"] == 0
+
+
+def test_running_rmse_merge():
+    values1 = make_values(100, seed=1)
+    values2 = make_values(100, seed=2)
+    rmse = RunningRMSE()
+    rmse.update_many(values1, values2)
+    merged = RunningRMSE()
+    merged.update_many(values1[:50], values2[:50])
+    merged.merge(RunningRMSE()).merge(rmse_of(values1[50:], values2[50:]))
+
+    pairs = np.array(
+        [
+            (x1, x2)
+            for x1, x2 in zip(values1, values2)
+            if x1 is not None and x2 is not None
+        ]
+    )
+    pairs = pairs[~np.isnan(pairs).any(axis=1)]
+    expected = np.sqrt(np.mean((pairs[:, 0] - pairs[:, 1]) ** 2))
+    assert rmse.rmse == pytest.approx(expected, rel=1e-12)
+    assert merged.rmse == pytest.approx(expected, rel=1e-12)
+    assert math.isnan(RunningRMSE().rmse)
+
+
+def test_assimilation_metrics_of_stations_merge():
+    # The metrics of two stations merged equal those of the steps of both stations
+    rng = np.random.default_rng(0)
+    station = 20 + rng.normal(0, 2, (2, 100))
+    model = 1.2 * station + 3 + rng.normal(0, 1, (2, 100))
+    station[:, ::9] = np.nan
+    assimilators = [RLSAssimilation(*DA3) for _ in range(2)]
+    steps = AssimilationMetrics()
+    for assimilator, obs1, obs2 in zip(assimilators, station, model):
+        for x1, x2 in zip(obs1.tolist(), obs2.tolist()):
+            x, err = assimilator.assimilate(x1, x2)
+            steps.rmse_sources.update(x1, x2)
+            steps.rmse_source1.update(x1, x)
+            steps.err_assimilated.update(abs(err))
+
+    merged = AssimilationMetrics()
+    for assimilator in assimilators:
+        merged.merge(assimilator.metrics)
+
+    assert merged.rmse_sources.count == steps.rmse_sources.count
+    assert merged.rmse_sources.rmse == pytest.approx(steps.rmse_sources.rmse)
+    assert merged.rmse_source1.rmse == pytest.approx(steps.rmse_source1.rmse)
+    assert merged.err_assimilated.mean == pytest.approx(steps.err_assimilated.mean)
+    assert merged.err_assimilated.std == pytest.approx(steps.err_assimilated.std)
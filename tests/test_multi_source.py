@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from rls_assimilation import (
+    MultiSourceRLSAssimilation,
+    RLSAssimilation,
+    StationRLSAssimilation,
+)
+
+CONFIGS = {
+    "DA2": ("hourly", "hourly", "obs", "obs", "hourly", "obs"),
+    "DA3": ("hourly", "hourly", "obs", "model", "hourly", "obs"),
+    "DA4": ("hourly", "daily", "obs", "model", "hourly", "obs"),
+    "DA4 daily": ("hourly", "daily", "obs", "model", "daily", "obs"),
+}
+VARIABLES = ["CO", "NO2", "O3", "SO2", "PM25", "PM10"]
+
+
+def make_observations(n_steps, n_streams, seed=0):
+    # (n_steps, n_streams) of each source: stations with gaps and a biased model with daily values repeated
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_steps)[:, None]
+    station = (
+        20 + 5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 2, (n_steps, n_streams))
+    )
+    daily = np.repeat(rng.normal(20, 1, (n_steps // 24 + 1, n_streams)), 24, axis=0)
+    model = 1.3 * daily[:n_steps] + 4
+    station[rng.random(station.shape) < 0.1] = np.nan
+    return station, model
+
+
+def assimilate_objects(config, station, model):
+    assimilators = [RLSAssimilation(*config) for _ in range(station.shape[1])]
+    results = [
+        [
+            assimilator.assimilate(obs1, obs2)
+            for assimilator, obs1, obs2 in zip(
+                assimilators, row1.tolist(), row2.tolist()
+            )
+        ]
+        for row1, row2 in zip(station, model)
+    ]
+    return np.array(results)  # (n_steps, n_streams, 2)
+
+
+@pytest.mark.parametrize("name", list(CONFIGS))
+def test_two_sources_match_rls_assimilation(name):
+    t_in1, t_in2, s_in1, s_in2, t_out, s_out = CONFIGS[name]
+    station, model = make_observations(200, 3)
+    bank = MultiSourceRLSAssimilation(
+        [t_in1, t_in2], [s_in1, s_in2], t_out, s_out, shape=(3,)
+    )
+    results = np.array(
+        [
+            bank.assimilate(np.stack([obs1, obs2], axis=-1))
+            for obs1, obs2 in zip(station, model)
+        ]
+    ).transpose(0, 2, 1)
+
+    np.testing.assert_allclose(
+        results, assimilate_objects(CONFIGS[name], station, model), rtol=1e-12
+    )
+
+
+@pytest.mark.parametrize("name", list(CONFIGS))
+def test_station_matches_rls_assimilation(name):
+    station, model = make_observations(200, len(VARIABLES))
+    bank = StationRLSAssimilation(VARIABLES, *CONFIGS[name])
+    out = np.empty(len(VARIABLES))
+    err_out = np.empty(len(VARIABLES))
+    results = []
+    for obs1, obs2 in zip(station, model):
+        x, err = bank.assimilate(obs1.tolist(), memoryview(obs2), out, err_out)
+        assert np.shares_memory(x, out) and np.shares_memory(err, err_out)
+        results.append((x.copy(), err.copy()))
+    results = np.array(results).transpose(0, 2, 1)
+
+    np.testing.assert_allclose(
+        results, assimilate_objects(CONFIGS[name], station, model), rtol=1e-12
+    )
+
+
+def test_station_missing_values():
+    # None and NaN are missing values, also in the reused observation array
+    bank = StationRLSAssimilation(["CO", "NO2"], *CONFIGS["DA3"])
+    assimilator = RLSAssimilation(*CONFIGS["DA3"])
+    for obs1, obs2 in [(1.0, 2.0), (None, 2.5), (1.5, None), (2.0, 3.0), (None, None)]:
+        x, err = bank.assimilate([obs1, obs1], [obs2, obs2])
+        expected = assimilator.assimilate(
+            np.nan if obs1 is None else obs1, np.nan if obs2 is None else obs2
+        )
+        np.testing.assert_allclose(x, expected[0], rtol=1e-12)
+        np.testing.assert_allclose(err, expected[1], rtol=1e-12)
@@ -0,0 +1,55 @@
+import math
+from datetime import datetime, timedelta
+
+from rls_assimilation import ReorderBuffer
+
+START = datetime(2024, 1, 1)
+
+
+def hours(n):
+    return START + timedelta(hours=n)
+
+
+def test_earlier_first_value_within_lateness_is_released_in_order():
+    reorder = ReorderBuffer(step=timedelta(hours=1), lateness=timedelta(hours=3))
+
+    assert reorder.push(hours(2), 2.0) == []
+    assert reorder.push(hours(1), 1.0) == []
+    assert reorder.flush() == [(hours(1), 1.0), (hours(2), 2.0)]
+    assert reorder.late_drops == 0
+
+
+def test_first_values_are_released_after_lateness():
+    reorder = ReorderBuffer(step=timedelta(hours=1), lateness=timedelta(hours=3))
+
+    assert reorder.push(hours(2), 2.0) == []
+    assert reorder.push(hours(1), 1.0) == []
+    assert reorder.advance(hours(4)) == [(hours(1), 1.0), (hours(2), 2.0)]
+    assert reorder.push(hours(3), 3.0) == [(hours(3), 3.0)]
+
+
+def test_values_older_than_lateness_are_dropped():
+    reorder = ReorderBuffer(step=timedelta(hours=1), lateness=timedelta(hours=3))
+
+    reorder.push(hours(5), 5.0)
+    assert reorder.push(hours(1), 1.0) == []
+    assert reorder.late_drops == 1
+
+    released = reorder.push(hours(8), 8.0)
+    assert [slot_time for slot_time, _ in released] == [hours(5)]
+    assert reorder.push(hours(2), 2.0) == []
+    assert reorder.late_drops == 2
+
+
+def test_empty_slots_expire_with_nan():
+    reorder = ReorderBuffer(step=timedelta(hours=1), lateness=timedelta(hours=2))
+
+    released = reorder.push(hours(0), 0.0)
+    released.extend(reorder.push(hours(2), 2.0))
+    released.extend(reorder.push(hours(4), 4.0))
+    released.extend(reorder.flush())
+
+    assert [slot_time for slot_time, _ in released] == [hours(n) for n in range(5)]
+    values = [value for _, value in released]
+    assert math.isnan(values[1]) and math.isnan(values[3])
+    assert values[::2] == [0.0, 2.0, 4.0]
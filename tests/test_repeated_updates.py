@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from rls_assimilation.BatchRLS import BatchRLS
+from rls_assimilation.DataSource import DataSourceAR1
+from rls_assimilation.PureRLS import PureRLS
+from rls_assimilation.RLS import RLS
+
+
+@pytest.mark.parametrize("model_class", [RLS, PureRLS])
+@pytest.mark.parametrize("n_updates", [0, 1, 24])
+def test_update_repeated_matches_update(model_class, n_updates):
+    repeated = model_class(P_init=2.0, w_init=(1.0, 0.5))
+    stepped = model_class(P_init=2.0, w_init=(1.0, 0.5))
+    for model in (repeated, stepped):
+        model.update(3.0, 4.0)
+
+    errors = repeated.update_repeated(5.0, 5.0, n_updates)
+    expected_errors = []
+    for _ in range(n_updates):
+        stepped.update(5.0, 5.0)
+        expected_errors.append(float(stepped.error))
+
+    assert list(errors) == expected_errors
+    np.testing.assert_array_equal(np.array(repeated.P), np.array(stepped.P))
+    np.testing.assert_array_equal(np.ravel(repeated.w), np.ravel(stepped.w))
+    assert repeated.error == stepped.error
+
+
+def test_batch_update_repeated_matches_update():
+    # A number of updates per lane, with a masked lane that keeps its state
+    x = np.array([1.0, 2.0, 3.0, 4.0])
+    y = np.array([1.5, 2.0, 2.5, 4.0])
+    n_updates = np.array([0, 1, 5, 3])
+    mask = np.array([True, True, True, False])
+    repeated = BatchRLS((4,))
+    stepped = BatchRLS((4,))
+
+    repeated.update_repeated(x, y, n_updates, mask=mask)
+    for i in range(n_updates.max()):
+        stepped.update(x, y, mask=mask & (n_updates > i))
+
+    np.testing.assert_array_equal(repeated.P, stepped.P)
+    np.testing.assert_array_equal(repeated.w, stepped.w)
+
+
+def test_estimate_many_matches_estimate():
+    # Runs of equal values (forward-filled daily values), also at the start and after gaps
+    values = [5.0, 5.0, 5.0, 6.0, np.nan, np.nan, 6.0, 6.0, 7.5, 7.5, 7.5, 7.5, 3.0]
+    values = np.array(values * 5)
+    many = DataSourceAR1()
+    stepped = DataSourceAR1()
+
+    x_corr, err = many.estimate_many(values)
+    expected = np.array([stepped.estimate(x) for x in values])
+
+    np.testing.assert_allclose(x_corr, expected[:, 0], rtol=1e-12)
+    np.testing.assert_allclose(err, expected[:, 1], rtol=1e-12)
+    assert len(many.x_all) == len(stepped.x_all)
+    np.testing.assert_allclose(many.x_corr_all, stepped.x_corr_all, rtol=1e-12)
+    np.testing.assert_allclose(many.ar_errors, stepped.ar_errors, rtol=1e-12)
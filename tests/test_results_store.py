@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import results_store
+from results_store import ResultsStore
+
+CONFIG = {"variable": "NO2", "scenario": "DA3", "s_out": "obs"}
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    path = tmp_path / "station.csv"
+    path.write_text("time,obs,model\n0,1.0,2.0\n")
+    return str(path)
+
+
+def test_key_changes_with_data_config_version_and_sources(
+    data_path, tmp_path, monkeypatch
+):
+    key = ResultsStore.get_key(data_path, CONFIG)
+    assert ResultsStore.get_key(data_path, dict(CONFIG)) == key
+
+    other_path = tmp_path / "other.csv"
+    other_path.write_text("time,obs,model\n0,1.0,2.5\n")
+    keys = {
+        ResultsStore.get_key(str(other_path), CONFIG),
+        ResultsStore.get_key(data_path, dict(CONFIG, s_out="model")),
+    }
+    monkeypatch.setattr(results_store, "__version__", "0.0.0")
+    keys.add(ResultsStore.get_key(data_path, CONFIG))
+    monkeypatch.undo()
+    monkeypatch.setattr(results_store, "get_source_hash", lambda: "0" * 64)
+    keys.add(ResultsStore.get_key(data_path, CONFIG))
+
+    assert key not in keys and len(keys) == 4
+
+
+def test_outdated_entry_is_replaced(tmp_path):
+    store = ResultsStore(str(tmp_path / "store"))
+    series = {"assimilated": np.arange(3.0)}
+    store.put("station", "old", series, {"da_ratio": 0.5})
+    assert store.get_scalars("station", "new") is None
+
+    store.put("station", "new", series, {"da_ratio": 0.4})
+    reopened = ResultsStore(str(tmp_path / "store"))
+    assert reopened.get_scalars("station", "new") == {"da_ratio": 0.4}
+    np.testing.assert_array_equal(
+        reopened.get_series("new")["assimilated"], series["assimilated"]
+    )
+    assert not (tmp_path / "store" / "old.npz").exists()
+
+
+def test_series_of_different_lengths_are_rejected(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put("station", "key", {"a": np.zeros(2), "b": np.zeros(3)}, {})
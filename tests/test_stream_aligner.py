@@ -0,0 +1,51 @@
+import math
+from datetime import datetime, timedelta
+
+from rls_assimilation.StreamAligner import StreamAligner
+
+START = datetime(2024, 1, 1)
+
+
+def hours(n):
+    return START + timedelta(hours=n)
+
+
+def slot_times(rows):
+    return [slot_time for _, slot_time, _ in rows]
+
+
+def test_idle_stream_stops_emitting_after_max_delay():
+    aligner = StreamAligner(2, max_delay=timedelta(hours=1))
+    aligner.push("station", 0, hours(0), 1.0)
+    aligner.push("station", 1, hours(0), 2.0)
+
+    rows = []
+    for n in range(1, 48):
+        rows.extend(aligner.advance(hours(n)))
+
+    # Only the slot within max_delay of the latest value expires
+    assert slot_times(rows) == [hours(1)]
+    assert all(math.isnan(value) for value in rows[0][2])
+    assert aligner.advance(hours(100)) == []
+
+
+def test_idle_stream_resumes_on_its_grid():
+    aligner = StreamAligner(2, max_delay=timedelta(hours=1))
+    aligner.push("station", 0, hours(0), 1.0)
+    aligner.push("station", 1, hours(0), 2.0)
+    aligner.advance(hours(10))
+
+    rows = aligner.push("station", 0, hours(5), 3.0)
+    rows.extend(aligner.push("station", 1, hours(5), 4.0))
+
+    assert slot_times(rows) == [hours(n) for n in range(2, 6)]
+    assert rows[-1][2] == [3.0, 4.0]
+    assert slot_times(aligner.advance(hours(7))) == [hours(6)]
+
+
+def test_stream_starts_at_first_slot_within_tolerance():
+    aligner = StreamAligner(2, tolerance=timedelta(minutes=10))
+    aligner.push("station", 0, hours(0) - timedelta(minutes=5), 1.0)
+    aligner.push("station", 1, hours(0), 2.0)
+
+    assert aligner.advance(hours(1)) == [("station", hours(0), [1.0, 2.0])]
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from rls_assimilation import RLSAssimilation
+from rls_assimilation.RLSAssimilationSweep import RLSAssimilationSweep
+from rls_assimilation.SequentialRLSAssimilation import (
+    SequentialRLSAssimilationOneSource,
+    SequentialRLSAssimilationTwoSources,
+)
+
+CONFIGS = [
+    ("hourly", "hourly", "obs", "obs", "hourly", "obs"),
+    ("hourly", "hourly", "obs", "model", "hourly", "obs"),
+    ("hourly", "hourly", "obs", "model", "hourly", "model"),
+    ("hourly", "daily", "obs", "model", "hourly", "obs"),
+    ("daily", "hourly", "obs", "model", "hourly", "model"),
+]
+
+
+def make_observations(n_steps, seed=0):
+    # Series by temporal scale, daily values forward-filled to hours
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_steps)
+    station = 20 + 5 * np.sin(2 * np.pi * hours / 24) + rng.normal(0, 2, n_steps)
+    station[rng.random(n_steps) < 0.1] = np.nan
+    model = 1.3 * station + 4 + rng.normal(0, 1, n_steps)
+    model[rng.random(n_steps) < 0.05] = np.nan
+
+    def daily(series):
+        return np.repeat(np.nanmean(series.reshape(-1, 24), axis=1), 24)
+
+    obs1 = {"hourly": station, "daily": daily(station)}
+    obs2 = {"hourly": model, "daily": daily(model)}
+    return obs1, obs2
+
+
+@pytest.mark.parametrize("sequential", [False, True])
+def test_sweep_matches_stepping(sequential):
+    obs1, obs2 = make_observations(240)
+    results = RLSAssimilationSweep(CONFIGS, sequential=sequential).run(obs1, obs2)
+
+    for config, result in zip(CONFIGS, results):
+        t_in1, t_in2, s_in1, _, t_out, s_out = config
+        series1 = obs1[t_in1].tolist()
+        series2 = obs2[t_in2].tolist()
+        assimilator = RLSAssimilation(*config)
+        expected = [assimilator.assimilate(x1, x2) for x1, x2 in zip(series1, series2)]
+        np.testing.assert_allclose(np.array(result[:2]).T, expected, rtol=1e-12)
+        assert result[2].metrics.rmse_source1.rmse == pytest.approx(
+            assimilator.metrics.rmse_source1.rmse, rel=1e-12
+        )
+        if not sequential:
+            assert len(result) == 3
+            continue
+
+        if t_in1 == t_in2 == t_out:
+            # The one-source sequential assimilation of the source in the output scale
+            seq_assimilator = SequentialRLSAssimilationOneSource()
+            series = series1 if s_out == s_in1 else series2
+            expected = [seq_assimilator.assimilate(x) for x in series]
+        else:
+            seq_assimilator = SequentialRLSAssimilationTwoSources(*config)
+            expected = [
+                seq_assimilator.assimilate(x1, x2) for x1, x2 in zip(series1, series2)
+            ]
+        np.testing.assert_allclose(np.array(result[3:5]).T, expected, rtol=1e-12)
+        assert result[5].metrics.err_assimilated.mean == pytest.approx(
+            seq_assimilator.metrics.err_assimilated.mean, rel=1e-12
+        )
+
+
+def test_sweep_validates_configs():
+    with pytest.raises(ValueError):
+        RLSAssimilationSweep(
+            [CONFIGS[0], ("hourly", "hourly", "obs", "obs", "hourly", "model")]
+        )
@@ -0,0 +1,72 @@
+import argparse
+import time
+from collections import Counter
+import numpy as np
+
+from rls_assimilation import RLSInitialisationSearch
+from compare_precision import load_stations
+
+P_INITS = [0.01, 0.1, 1, 10, 100, 1000]
+W_INITS = [(0, 0), (0, 1)]
+
+
+def tune_variable(variable, t_in1, t_in2, s_in1, s_in2, t_out, s_out, P_inits, w_inits):
+    """
+    Score a grid of initial states of the RLS models on all stations of a variable in one vectorised run
+
+    Prints the median scores of every grid point over the stations and how often each grid point
+    has the lowest RMSE from the source in s_out.
+
+    :return: the search with the metrics of all stations and grid points (RLSInitialisationSearch)
+    """
+    obs = load_stations(variable)
+    search = RLSInitialisationSearch(
+        [t_in1, t_in2],
+        [s_in1, s_in2],
+        t_out,
+        s_out,
+        P_inits,
+        w_inits,
+        n_streams=obs.shape[1],
+    )
+    start = time.perf_counter()
+    scores = search.run(obs)
+    elapsed = time.perf_counter() - start
+
+    rmse = scores["rmse"][..., 0 if s_out == s_in1 else 1]
+    best_counts = Counter(search.best(rmse))
+    print(
+        f"{variable}: {obs.shape[1]} stations x {len(search.grid)} grid points "
+        f"in {elapsed:.2f} s"
+    )
+    for i, (P_init, w_init) in enumerate(search.grid):
+        print(
+            f"  P_init {P_init:g}, w_init {w_init}: "
+            f"RMSE {np.nanmedian(rmse[:, i]):.4f}, "
+            f"MAU {np.nanmedian(scores['mau'][:, i]):.4f}, "
+            f"best for {best_counts[(P_init, w_init)]} stations"
+        )
+    return search
+
+
+# Grid search of the initial state of the RLS models on the Europe_AQ datasets
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score initial states of the RLS models on all stations of a variable"
+    )
+    parser.add_argument("variable")
+    parser.add_argument("--s-out", default="obs")
+    parser.add_argument("--P-inits", type=float, nargs="+", default=P_INITS)
+    args = parser.parse_args()
+
+    tune_variable(
+        args.variable,
+        "hourly",
+        "hourly",
+        "obs",
+        "model",
+        "hourly",
+        args.s_out,
+        args.P_inits,
+        W_INITS,
+    )